@@ -0,0 +1,246 @@
+# audit_log.py
+import os
+import json
+import time
+import queue
+import atexit
+import datetime
+import threading
+import data_utils
+from data_utils import file_lock
+
+AUDIT_FILE = "audit.log"  # 当前写入的文件，写满后改名为 audit_<时间>.log
+AUDIT_MAX_BYTES = 4 * 1024 * 1024
+AUDIT_KEEP_FILES = 20  # 保留的已轮转文件数
+FLUSH_INTERVAL = 1.0  # 后台线程攒批写入的最长等待时间（秒）
+MAX_BATCH = 500
+REDACTED_FIELDS = ("password", "id_card")
+ACTION_LABELS = {
+    "login": "登录",
+    "login_failed": "登录失败",
+    "logout": "注销",
+    "register": "注册用户",
+    "add_book": "添加图书",
+    "edit_book": "修改图书",
+    "delete_book": "删除图书",
+    "undelete_book": "撤销删除图书",
+    "import_books": "批量导入图书",
+    "delete_user": "删除用户",
+    "undelete_user": "撤销删除用户",
+    "import_data": "导入数据",
+    "restore": "恢复数据",
+    "repair_records": "修复借阅记录",
+    "bulk_renew": "批量续借",
+}
+
+
+def redact(value):
+    """去掉密码、身份证号等敏感字段后的副本（列表逐项处理）"""
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    if isinstance(value, dict):
+        return {k: ("***" if k in REDACTED_FIELDS else v) for k, v in value.items()}
+    return value
+
+
+class AuditLog:
+    """只追加的审计日志：谁在什么时间做了什么，以及修改前后的值
+
+    记录时只把条目放入内存队列（微秒级），由后台线程攒批后一次写入，写入时持有
+    跨进程写锁。当前文件超过 AUDIT_MAX_BYTES 后改名轮转，只保留最近 AUDIT_KEEP_FILES 个。
+    """
+
+    def __init__(self, audit_dir=None):
+        self.audit_dir = audit_dir or os.path.join(data_utils.DATA_DIR, "audit")
+        self.file_path = os.path.join(self.audit_dir, AUDIT_FILE)
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, actor, action, target="", before=None, after=None, detail=""):
+        """记录一次操作，不做磁盘读写"""
+        self.queue.put({
+            "ts": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+            "actor": actor,
+            "action": action,
+            "target": target,
+            "before": redact(before),
+            "after": redact(after),
+            "detail": detail,
+        })
+        if self.thread is None:
+            self.start()
+
+    def start(self):
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="audit-writer", daemon=True)
+                self.thread.start()
+
+    def flush(self, timeout=5):
+        """等待队列中已有的条目写入文件（退出程序前调用）"""
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def run(self):
+        while True:
+            batch, waiters = [], []
+            item = self.queue.get()
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break  # 有人等待刷新时立即写入
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= MAX_BATCH or remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.write(batch)
+                except OSError:
+                    pass  # 审计写入失败不影响业务操作，下一批照常写入
+            for done in waiters:
+                done.set()
+
+    def write(self, batch):
+        os.makedirs(self.audit_dir, exist_ok=True)
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch).encode("utf-8")
+        with file_lock(self.file_path):
+            with open(self.file_path, 'ab') as f:
+                f.write(data)
+                size = f.tell()
+            if size >= AUDIT_MAX_BYTES:
+                self.rotate()
+
+    def rotate(self):
+        """当前文件改名为带时间的轮转文件，并删除超出保留数量的旧文件（调用方持有写锁）"""
+        stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        os.replace(self.file_path, os.path.join(self.audit_dir, f"audit_{stamp}.log"))
+        rotated = [name for name in audit_files(self.audit_dir) if name != AUDIT_FILE]
+        for name in rotated[:-AUDIT_KEEP_FILES]:
+            os.remove(os.path.join(self.audit_dir, name))
+
+
+def audit_files(audit_dir):
+    """审计日志文件名，从旧到新，当前文件在最后"""
+    try:
+        names = os.listdir(audit_dir)
+    except OSError:
+        return []
+    rotated = sorted(n for n in names if n.startswith("audit_") and n.endswith(".log"))
+    return rotated + ([AUDIT_FILE] if AUDIT_FILE in names else [])
+
+
+class AuditIndex:
+    """审计日志查看索引
+
+    每条日志只在内存中保留时间、操作人、操作、对象、说明和所在文件的字节偏移，并按操作人、
+    操作类型建立倒排表；修改前后的完整内容在查看时按偏移读取。已轮转的文件不再变化，
+    只索引一次；当前文件只追加，刷新时从上次的位置继续索引。
+    """
+
+    def __init__(self, audit_dir=None):
+        self.audit_dir = audit_dir or os.path.join(data_utils.DATA_DIR, "audit")
+        self.clear()
+
+    def clear(self):
+        self.indexed = {}  # 文件名 -> 已索引到的字节偏移
+        self.entries = []  # [(时间, 操作人, 操作, 对象, 说明, 文件名, 偏移)]，从旧到新
+        self.by_actor = {}  # 操作人 -> [条目序号]
+        self.by_action = {}  # 操作 -> [条目序号]
+
+    def refresh(self):
+        names = audit_files(self.audit_dir)
+        current = os.path.join(self.audit_dir, AUDIT_FILE)
+        if AUDIT_FILE in self.indexed and (not os.path.exists(current) or
+                                           os.path.getsize(current) < self.indexed[AUDIT_FILE]):
+            self.clear()  # 当前文件已轮转，重新索引（只在轮转后发生）
+        if any(name not in names for name in self.indexed):
+            self.clear()  # 旧文件已被清理
+        rotated = [n for n in names if n != AUDIT_FILE and n not in self.indexed]
+        if rotated and AUDIT_FILE in self.indexed:
+            self.clear()  # 保持条目从旧到新，新轮转出的文件排在当前文件之前
+        for name in names:
+            self.index_file(name)
+
+    def index_file(self, name):
+        path = os.path.join(self.audit_dir, name)
+        start = self.indexed.get(name, 0)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return
+        with f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 其他进程正在写入的半行，下次再索引
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                pos = len(self.entries)
+                actor, action = entry.get("actor", ""), entry.get("action", "")
+                self.entries.append((entry.get("ts", ""), actor, action, entry.get("target", ""),
+                                     entry.get("detail", ""), name, offset))
+                self.by_actor.setdefault(actor, []).append(pos)
+                self.by_action.setdefault(action, []).append(pos)
+                offset += len(line)
+        self.indexed[name] = offset
+
+    def query(self, actor=None, action=None, keyword="", limit=None):
+        """按条件筛选（关键字匹配操作人、对象和说明），返回条目序号，从新到旧"""
+        if actor is not None and action is not None:
+            actions = set(self.by_action.get(action, ()))
+            positions = [p for p in self.by_actor.get(actor, ()) if p in actions]
+        elif actor is not None:
+            positions = self.by_actor.get(actor, [])
+        elif action is not None:
+            positions = self.by_action.get(action, [])
+        else:
+            positions = range(len(self.entries))
+        keyword = keyword.lower()
+        result = []
+        for pos in reversed(positions):
+            if keyword and not any(keyword in text.lower() for text in self.entries[pos][1:5]):
+                continue
+            result.append(pos)
+            if limit and len(result) >= limit:
+                break
+        return result
+
+    def load(self, pos):
+        """读取一条日志的完整内容（含修改前后的值），文件已不存在时返回None"""
+        name, offset = self.entries[pos][5:]
+        try:
+            with open(os.path.join(self.audit_dir, name), 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+
+_audit_log = None
+
+
+def get_audit_log():
+    """获取进程内共享的审计日志实例"""
+    global _audit_log
+    if _audit_log is None:
+        _audit_log = AuditLog()
+    return _audit_log
+
+
+def audit(actor, action, target="", before=None, after=None, detail=""):
+    get_audit_log().record(actor, action, target, before, after, detail)
@@ -0,0 +1,110 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QComboBox,
+                             QLabel, QTextEdit, QSplitter, QAbstractItemView)
+from PyQt5.QtCore import Qt
+import json
+from audit_log import AuditIndex, ACTION_LABELS, get_audit_log
+
+VIEW_LIMIT = 2000  # 表格中最多显示的条数（最新的）
+
+
+class AuditLogDialog(QDialog):
+    """审计日志查看（管理员）：按操作人、操作类型和关键字筛选，选中一条查看修改前后的值"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index = AuditIndex()
+        self.positions = []
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        self.setWindowTitle("审计日志")
+        self.resize(900, 600)
+        layout = QVBoxLayout(self)
+
+        filter_layout = QHBoxLayout()
+        self.actor_combo = QComboBox()
+        self.action_combo = QComboBox()
+        self.action_combo.addItem("全部操作", None)
+        for action, label in ACTION_LABELS.items():
+            self.action_combo.addItem(label, action)
+        self.keyword_edit = QLineEdit()
+        self.keyword_edit.setPlaceholderText("操作人、对象或说明")
+        self.search_btn = QPushButton("筛选")
+        self.refresh_btn = QPushButton("刷新")
+        self.actor_combo.currentIndexChanged.connect(self.show_entries)
+        self.action_combo.currentIndexChanged.connect(self.show_entries)
+        self.keyword_edit.returnPressed.connect(self.show_entries)
+        self.search_btn.clicked.connect(self.show_entries)
+        self.refresh_btn.clicked.connect(self.refresh)
+        filter_layout.addWidget(self.actor_combo)
+        filter_layout.addWidget(self.action_combo)
+        filter_layout.addWidget(self.keyword_edit)
+        filter_layout.addWidget(self.search_btn)
+        filter_layout.addWidget(self.refresh_btn)
+        layout.addLayout(filter_layout)
+
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["时间", "操作人", "操作", "对象", "说明"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.itemSelectionChanged.connect(self.show_detail)
+        splitter.addWidget(self.table)
+        self.detail_edit = QTextEdit()
+        self.detail_edit.setReadOnly(True)
+        splitter.addWidget(self.detail_edit)
+        layout.addWidget(splitter)
+
+    def refresh(self):
+        """写入缓冲中的日志先落盘，再增量索引新增的日志"""
+        get_audit_log().flush()
+        self.index.refresh()
+        actor = self.actor_combo.currentData()
+        self.actor_combo.blockSignals(True)
+        self.actor_combo.clear()
+        self.actor_combo.addItem("全部操作人", None)
+        for name in sorted(self.index.by_actor):
+            self.actor_combo.addItem(name, name)
+        self.actor_combo.setCurrentIndex(max(self.actor_combo.findData(actor), 0))
+        self.actor_combo.blockSignals(False)
+        self.show_entries()
+
+    def show_entries(self):
+        total = self.index.query(self.actor_combo.currentData(), self.action_combo.currentData(),
+                                 self.keyword_edit.text().strip())
+        self.positions = total[:VIEW_LIMIT]
+        self.count_label.setText(f"共 {len(total)} 条" + (f"，显示最近 {VIEW_LIMIT} 条" if len(total) > VIEW_LIMIT else ""))
+        self.table.setRowCount(len(self.positions))
+        for row, pos in enumerate(self.positions):
+            ts, actor, action, target, detail, _, _ = self.index.entries[pos]
+            self.table.setItem(row, 0, QTableWidgetItem(ts[:19]))
+            self.table.setItem(row, 1, QTableWidgetItem(actor))
+            self.table.setItem(row, 2, QTableWidgetItem(ACTION_LABELS.get(action, action)))
+            self.table.setItem(row, 3, QTableWidgetItem(target))
+            self.table.setItem(row, 4, QTableWidgetItem(detail))
+        self.detail_edit.clear()
+
+    def show_detail(self):
+        rows = {item.row() for item in self.table.selectedItems()}
+        if len(rows) != 1:
+            return
+        entry = self.index.load(self.positions[rows.pop()])
+        if entry is None:
+            self.detail_edit.setPlainText("日志文件已被清理")
+            return
+        parts = [f"时间: {entry.get('ts', '')}", f"操作人: {entry.get('actor', '')}",
+                 f"操作: {ACTION_LABELS.get(entry.get('action'), entry.get('action', ''))}",
+                 f"对象: {entry.get('target', '')}"]
+        if entry.get("detail"):
+            parts.append(f"说明: {entry['detail']}")
+        for key, title in (("before", "修改前"), ("after", "修改后")):
+            if entry.get(key) is not None:
+                parts.append(f"{title}:\n{json.dumps(entry[key], ensure_ascii=False, indent=2)}")
+        self.detail_edit.setPlainText("\n".join(parts))
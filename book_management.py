@@ -1,12 +1,66 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
                              QPushButton, QTableWidget, QTableWidgetItem,
                              QHeaderView, QMessageBox, QFileDialog, QDialog,
-                             QFormLayout, QLabel, QLineEdit as QLE)
+                             QFormLayout, QLabel, QLineEdit as QLE, QToolButton, QMenu, QCheckBox)
+from PyQt5.QtCore import pyqtSignal, Qt, QSize, QTimer
+from PyQt5.QtGui import QIcon, QPixmap
 import csv
-from data_utils import load_json, save_json, load_csv
+from data_utils import load_json, update_json
+from facet_index import FacetIndex, FACET_FIELDS
+from isbn_index import IsbnIndex, is_valid_isbn, normalize_isbn
+from search_index import SearchIndex, fuzzy_option
+from holdings import get_holdings, parse_copies, format_copies
+from sort_index import SortIndex, SortState, collation_key
+from audit_log import audit
+from tombstones import get_tombstones
+from recycle_bin import RecycleBinDialog
+from cover_store import get_cover_store, THUMB_SIZE
+from cover_loader import get_cover_loader
+from recommend import get_co_borrow_index
 
 BOOKS_FILE = 'data/books.json'
 BORROW_RECORDS_FILE = 'data/borrow_records.csv'
+STATUS_COLUMN = 6
+TITLE_COLUMN = 1  # 封面缩略图显示在书名列
+COVER_PREVIEW_SIZE = (120, 160)
+
+
+def book_sort_columns(holdings):
+    """图书表格各列的排序键：编号、ISBN按原文，文本列按拼音，状态列按可借数量"""
+    return [
+        lambda b: b.get("id", ""),
+        lambda b: collation_key(b.get("title", "")),
+        lambda b: collation_key(b.get("author", "")),
+        lambda b: b.get("isbn", ""),
+        lambda b: collation_key(b.get("publisher", "")),
+        lambda b: collation_key(b.get("location", "")),
+        lambda b: holdings.available_count(b.get("id", "")),
+    ]
+
+
+def set_sort_indicator(table, sort):
+    header = table.horizontalHeader()
+    header.setSortIndicatorShown(True)
+    header.setSortIndicator(sort.column, Qt.DescendingOrder if sort.descending else Qt.AscendingOrder)
+
+
+def append_books(books, new_books, skipped):
+    """在文件中读到的图书后追加新书，编号已在文件中的放入 skipped"""
+    existing = {b.get("id", "") for b in books}
+    for book in new_books:
+        if book["id"] in existing:
+            skipped.append(book)
+    return books + [b for b in new_books if b["id"] not in existing]
+
+
+def replace_book(books, book_id, updated_book):
+    """按编号替换文件中的图书；图书已被删除或新编号已被占用时抛出ValueError"""
+    ids = [b.get("id", "") for b in books]
+    if book_id not in ids:
+        raise ValueError("该图书已被其他终端删除")
+    if updated_book["id"] != book_id and updated_book["id"] in ids:
+        raise ValueError("图书编号已存在")
+    return [updated_book if b.get("id", "") == book_id else b for b in books]
 
 
 class BookManagementTab(QWidget):
@@ -15,6 +69,14 @@ class BookManagementTab(QWidget):
         self.user = user
         self.books = []
         self.book_ids = set()  # 新增：用于快速校验图书编号唯一性
+        self.holdings = get_holdings()  # 副本及可借数量，随借还增量更新
+        self.facet_index = FacetIndex()
+        self.isbn_index = IsbnIndex()  # 规范化ISBN精确索引
+        self.search_index = SearchIndex()  # 拼音/模糊检索索引
+        self.sort = SortState()
+        self.sort_index = SortIndex(book_sort_columns(self.holdings), lambda b: b.get("id", ""))  # 各列有序索引
+        self.cover_loader = get_cover_loader()
+        self.cover_loader.loaded.connect(self.on_cover_loaded)
         self.init_ui()
 
     def init_ui(self):
@@ -28,12 +90,21 @@ class BookManagementTab(QWidget):
         self.search_btn.clicked.connect(self.search_books)
         self.refresh_btn = QPushButton("刷新")
         self.refresh_btn.clicked.connect(self.load_books)
+        fuzzy_text, fuzzy_tip = fuzzy_option()
+        self.fuzzy_check = QCheckBox(fuzzy_text)
+        self.fuzzy_check.setToolTip(fuzzy_tip)
 
         search_layout.addWidget(self.search_edit)
+        search_layout.addWidget(self.fuzzy_check)
         search_layout.addWidget(self.search_btn)
         search_layout.addWidget(self.refresh_btn)
         layout.addLayout(search_layout)
 
+        # 分面筛选（分类、馆藏位置、出版社）
+        self.facet_bar = FacetFilterBar()
+        self.facet_bar.changed.connect(self.filter_books)
+        layout.addWidget(self.facet_bar)
+
         # 管理员操作按钮
         if self.user["role"] == "admin":
             btn_layout = QHBoxLayout()
@@ -41,16 +112,22 @@ class BookManagementTab(QWidget):
             self.edit_btn = QPushButton("修改图书")
             self.delete_btn = QPushButton("删除图书")
             self.import_btn = QPushButton("批量导入")
+            self.isbn_report_btn = QPushButton("ISBN查重")
+            self.recycle_btn = QPushButton("回收站")
 
             self.add_btn.clicked.connect(self.add_book)
             self.edit_btn.clicked.connect(self.edit_book)
             self.delete_btn.clicked.connect(self.delete_book)
             self.import_btn.clicked.connect(self.import_books)
+            self.isbn_report_btn.clicked.connect(self.show_isbn_report)
+            self.recycle_btn.clicked.connect(self.show_recycle_bin)
 
             btn_layout.addWidget(self.add_btn)
             btn_layout.addWidget(self.edit_btn)
             btn_layout.addWidget(self.delete_btn)
             btn_layout.addWidget(self.import_btn)
+            btn_layout.addWidget(self.isbn_report_btn)
+            btn_layout.addWidget(self.recycle_btn)
             layout.addLayout(btn_layout)
 
         # 图书表格
@@ -59,46 +136,222 @@ class BookManagementTab(QWidget):
         self.book_table.setHorizontalHeaderLabels(["图书编号", "书名", "作者", "ISBN",
                                                    "出版社", "馆藏位置", "状态"])
         self.book_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.book_table.horizontalHeader().sectionClicked.connect(self.sort_books)
+        self.book_table.setIconSize(QSize(*THUMB_SIZE))
+        self.book_table.verticalHeader().setDefaultSectionSize(THUMB_SIZE[1] + 4)
+        self.book_table.itemSelectionChanged.connect(self.show_related)
         layout.addWidget(self.book_table)
 
+        # 选中一本书时显示“借过这本书的读者还借了”
+        self.related_label = QLabel()
+        self.related_label.setWordWrap(True)
+        self.related_label.hide()
+        layout.addWidget(self.related_label)
+
+        # 只为可见行加载封面：滚动或表格内容变化后稍作合并再请求
+        self.cover_timer = QTimer(self)
+        self.cover_timer.setSingleShot(True)
+        self.cover_timer.setInterval(50)
+        self.cover_timer.timeout.connect(self.load_visible_covers)
+        self.book_table.verticalScrollBar().valueChanged.connect(self.cover_timer.start)
+
         self.setLayout(layout)
 
     def load_books(self):
         """加载图书数据（优化：同步更新图书编号集合）"""
         self.books = load_json(BOOKS_FILE)
         self.book_ids = {book["id"] for book in self.books}  # 用集合存储编号，优化查询速度
-        self.update_book_table(self.books)
+        self.facet_index = FacetIndex(self.books)
+        self.isbn_index = IsbnIndex(self.books)
+        self.search_index = SearchIndex(self.books)
+        self.holdings.set_books(self.books)
+        self.sort_index.rebuild(self.books)
+        self.filter_books()
+
+    def sort_books(self, column):
+        """点击表头按该列排序，再次点击切换升降序"""
+        self.sort.click(column)
+        set_sort_indicator(self.book_table, self.sort)
+        self.filter_books()
 
     def update_book_table(self, books):
-        """更新图书表格"""
+        """更新图书表格，已选择排序列时按该列的有序索引输出"""
+        if self.sort.column is not None:
+            visible = None if len(books) == len(self.sort_index) else {b.get("id", "") for b in books}
+            books = self.sort_index.ordered(self.sort.column, self.sort.descending, visible)
         self.book_table.setRowCount(len(books))
-        borrow_records = load_csv(BORROW_RECORDS_FILE)
-        borrowed_ids = [r["book_id"] for r in borrow_records if not r["actual_return_time"]]
-
         for row, book in enumerate(books):
-            self.book_table.setItem(row, 0, QTableWidgetItem(book.get("id", "")))
-            self.book_table.setItem(row, 1, QTableWidgetItem(book.get("title", "")))
-            self.book_table.setItem(row, 2, QTableWidgetItem(book.get("author", "")))
-            self.book_table.setItem(row, 3, QTableWidgetItem(book.get("isbn", "")))
-            self.book_table.setItem(row, 4, QTableWidgetItem(book.get("publisher", "")))
-            self.book_table.setItem(row, 5, QTableWidgetItem(book.get("location", "")))
-
-            # 状态判断（在库/已借出）
-            status = "已借出" if book["id"] in borrowed_ids else "在库"
-            self.book_table.setItem(row, 6, QTableWidgetItem(status))
+            self.set_book_row(row, book)
+        self.cover_timer.start()
+
+    def set_book_row(self, row, book):
+        """填充表格中的一行图书信息"""
+        self.book_table.setItem(row, 0, QTableWidgetItem(book.get("id", "")))
+        title_item = QTableWidgetItem(book.get("title", ""))
+        pixmap = self.cover_loader.pixmap(book.get("cover"))  # 只取内存缓存，未加载的等可见时异步加载
+        if pixmap is not None:
+            title_item.setIcon(QIcon(pixmap))
+        self.book_table.setItem(row, 1, title_item)
+        self.book_table.setItem(row, 2, QTableWidgetItem(book.get("author", "")))
+        self.book_table.setItem(row, 3, QTableWidgetItem(book.get("isbn", "")))
+        self.book_table.setItem(row, 4, QTableWidgetItem(book.get("publisher", "")))
+        self.book_table.setItem(row, 5, QTableWidgetItem(book.get("location", "")))
+
+        # 状态判断（在库/已借出，多副本显示可借数量）
+        self.book_table.setItem(row, 6, QTableWidgetItem(self.holdings.status_text(book.get("id", ""))))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.cover_timer.start()
+
+    def visible_rows(self):
+        """表格视口中当前可见的行号范围"""
+        first = self.book_table.rowAt(0)
+        if first < 0:
+            return range(0)
+        last = self.book_table.rowAt(self.book_table.viewport().height() - 1)
+        return range(first, (last if last >= 0 else self.book_table.rowCount() - 1) + 1)
+
+    def visible_covers(self):
+        """可见行 -> 封面文件名"""
+        covers = {}
+        for row in self.visible_rows():
+            item = self.book_table.item(row, 0)
+            book = self.sort_index.items.get(item.text()) if item else None
+            if book and book.get("cover"):
+                covers[row] = book["cover"]
+        return covers
+
+    def load_visible_covers(self):
+        if self.isVisible():
+            self.cover_loader.request(set(self.visible_covers().values()))
+
+    def on_cover_loaded(self, name):
+        pixmap = self.cover_loader.pixmap(name)
+        for row, cover in self.visible_covers().items():
+            if cover == name and pixmap is not None:
+                self.book_table.item(row, TITLE_COLUMN).setIcon(QIcon(pixmap))
+
+    def show_related(self):
+        rows = {item.row() for item in self.book_table.selectedItems()}
+        text = ""
+        if len(rows) == 1:
+            book_id = self.book_table.item(rows.pop(), 0).text()
+            text = get_co_borrow_index().related_text(book_id)
+        self.related_label.setText(f"借过这本书的读者还借了: {text}" if text else "")
+        self.related_label.setVisible(bool(text))
+
+    def match_keyword(self, book, keyword):
+        """判断图书是否匹配搜索关键词"""
+        return (keyword in book.get("title", "").lower() or
+                keyword in book.get("author", "").lower() or
+                keyword in book.get("isbn", "").lower() or
+                (is_valid_isbn(keyword) and normalize_isbn(book.get("isbn", "")) == normalize_isbn(keyword)))
 
     def search_books(self):
         """搜索图书"""
         keyword = self.search_edit.text().lower().strip()
-        if not keyword:
+        if not keyword and not self.facet_bar.has_selection():
             self.load_books()
             return
+        self.filter_books()
+
+    def filter_books(self):
+        """按关键词和分面条件筛选图书，并刷新分面计数"""
+        selections = self.facet_bar.selections
+        base = self.keyword_mask()
+        self.facet_bar.set_counts(self.facet_index.counts(selections, base))
+        if base is None and not self.facet_bar.has_selection():
+            self.update_book_table(self.books)
+        else:
+            self.update_book_table(self.facet_index.books_in(self.facet_index.match(selections, base)))
+
+    def keyword_mask(self):
+        """关键词命中图书的位图，无关键词时返回None"""
+        keyword = self.search_edit.text().lower().strip()
+        if not keyword:
+            return None
+        if is_valid_isbn(keyword):
+            # 扫码枪输入的ISBN直接走精确索引，不扫描全部图书
+            return self.facet_index.mask_of(b["id"] for b in self.isbn_index.lookup(keyword))
+        if self.fuzzy_check.isChecked():
+            return self.facet_index.mask_of(self.search_index.search(keyword))
+        return self.facet_index.mask_of(b["id"] for b in self.books if self.match_keyword(b, keyword))
+
+    def table_rows(self):
+        """当前表格中 图书编号 -> 行号"""
+        return {self.book_table.item(row, 0).text(): row
+                for row in range(self.book_table.rowCount()) if self.book_table.item(row, 0)}
+
+    def apply_book_delta(self, added, changed, removed):
+        """应用外部修改产生的图书增量，只更新受影响的表格行"""
+        removed_ids = {b.get("id", "") for b in removed}
+        updated = {b.get("id", ""): b for b in added + changed}
+        if removed_ids:
+            self.books = [b for b in self.books if b["id"] not in removed_ids]
+        positions = {b["id"]: i for i, b in enumerate(self.books)}
+        for book_id, book in updated.items():
+            if book_id in positions:
+                self.books[positions[book_id]] = book
+            else:
+                self.books.append(book)
+        self.book_ids = {book["id"] for book in self.books}
+        for book_id in removed_ids:
+            self.facet_index.remove(book_id)
+            self.isbn_index.remove(book_id)
+            self.search_index.remove(book_id)
+            self.holdings.remove_book(book_id)
+            self.sort_index.remove(book_id)
+        for book in updated.values():
+            self.facet_index.add(book)
+            self.isbn_index.add(book)
+            self.search_index.add(book)
+            self.holdings.add_book(book)
+            self.sort_index.add(book)
+        if self.sort.column is not None:
+            # 排序状态下新增/修改的行位置会变化，按已更新的有序索引重新输出当前视图
+            self.filter_books()
+            return
 
-        filtered = [b for b in self.books if
-                    keyword in b.get("title", "").lower() or
-                    keyword in b.get("author", "").lower() or
-                    keyword in b.get("isbn", "").lower()]
-        self.update_book_table(filtered)
+        rows = self.table_rows()
+        for row in sorted((rows[i] for i in removed_ids if i in rows), reverse=True):
+            self.book_table.removeRow(row)
+        rows = self.table_rows()
+        keyword = self.search_edit.text().lower().strip()
+        selections = self.facet_bar.selections
+        fuzzy_hits = set(self.search_index.search(keyword)) if keyword and self.fuzzy_check.isChecked() else None
+        for book_id, book in updated.items():
+            if fuzzy_hits is not None:
+                keyword_matched = book_id in fuzzy_hits
+            else:
+                keyword_matched = not keyword or self.match_keyword(book, keyword)
+            matched = keyword_matched and self.facet_index.accepts(book, selections)
+            if book_id in rows:
+                if matched:
+                    self.set_book_row(rows[book_id], book)
+                else:
+                    self.book_table.removeRow(rows[book_id])
+                    rows = self.table_rows()
+            elif matched:
+                row = self.book_table.rowCount()
+                self.book_table.insertRow(row)
+                self.set_book_row(row, book)
+        self.facet_bar.set_counts(self.facet_index.counts(selections, self.keyword_mask()))
+        self.cover_timer.start()
+
+    def apply_record_delta(self, added, changed, removed):
+        """借阅记录变化时只刷新相关图书的状态列"""
+        affected = {self.holdings.title_of(r.get("book_id", "")) for r in added + changed + removed}
+        for book_id in affected:
+            self.sort_index.refresh(book_id)
+        if self.sort.column == STATUS_COLUMN:
+            self.filter_books()
+            return
+        rows = self.table_rows()
+        for book_id in affected:
+            if book_id in rows:
+                self.book_table.setItem(rows[book_id], STATUS_COLUMN,
+                                        QTableWidgetItem(self.holdings.status_text(book_id)))
 
     def add_book(self):
         """添加图书（优化：高效校验+异常处理）"""
@@ -112,19 +365,56 @@ class BookManagementTab(QWidget):
             if book_id in self.book_ids:
                 QMessageBox.warning(self, "警告", "图书编号已存在")
                 return
+            if not self.confirm_barcodes(new_book) or not self.confirm_isbn(new_book):
+                return
 
             try:
-                # 优化：增量更新数据，减少文件IO操作
-                self.books.append(new_book)
-                self.book_ids.add(book_id)  # 同步更新集合
-                save_json(BOOKS_FILE, self.books)  # 保持原存储格式，符合需求3.3数据存储约束
-
-                self.load_books()  # 刷新表格
+                # 在写锁内读取文件后追加，不覆盖其他终端刚保存的修改
+                skipped = []
+                update_json(BOOKS_FILE, lambda books: append_books(books, [new_book], skipped))
+                if skipped:
+                    QMessageBox.warning(self, "警告", "图书编号已存在（其他终端刚刚添加）")
+                    return
+                audit(self.user["username"], "add_book", book_id, after=new_book)
+
+                # 各索引增量加入新书，表格只插入这一行
+                self.apply_book_delta([new_book], [], [])
                 QMessageBox.information(self, "成功", "图书添加成功")
             except Exception as e:
                 # 新增：异常捕获，避免程序退出
                 QMessageBox.critical(self, "错误", f"添加失败：{str(e)}")
 
+    def confirm_barcodes(self, book):
+        """副本条码不能与其他图书的编号或条码重复"""
+        conflicts = self.holdings.barcode_conflicts(book)
+        if conflicts:
+            QMessageBox.warning(self, "警告", f"以下副本条码已被其他图书使用：{', '.join(conflicts[:5])}")
+            return False
+        return True
+
+    def confirm_isbn(self, book):
+        """校验ISBN，格式错误或与已有图书冲突时请用户确认"""
+        isbn = book.get("isbn", "")
+        if isbn and not is_valid_isbn(isbn):
+            if QMessageBox.question(self, "确认", f"ISBN“{isbn}”格式或校验位不正确，确定继续保存吗？",
+                                    QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
+                return False
+        conflicts = self.isbn_index.conflicts_with(book)
+        if conflicts:
+            detail = "\n".join(f"{b['id']}: {b.get('title', '')} / {b.get('author', '')}" for b in conflicts[:5])
+            if QMessageBox.question(self, "确认", f"以下图书ISBN相同但书名或作者不同：\n{detail}\n确定继续保存吗？",
+                                    QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
+                return False
+        return True
+
+    def show_isbn_report(self):
+        """显示ISBN重复/冲突报告"""
+        report = self.isbn_index.report()
+        if not report:
+            QMessageBox.information(self, "ISBN查重", "没有发现重复的ISBN")
+            return
+        IsbnReportDialog(report).exec_()
+
     def import_books(self):
         """批量导入图书（支持多种编码，兼容WPS保存的CSV）"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -137,6 +427,7 @@ class BookManagementTab(QWidget):
         encodings = ['utf-8-sig', 'gbk', 'gb2312', 'utf-8', 'cp936']
         imported_books = []
         duplicate_ids = []
+        conflict_ids = []  # ISBN与已有图书冲突的编号
         success = False
 
         for enc in encodings:
@@ -165,14 +456,22 @@ class BookManagementTab(QWidget):
                             "location": row.get('location', ''),
                             "category": row.get('category', ''),
                         }
+                        if row.get('copies'):
+                            book["copies"] = parse_copies(row['copies'])
+                        if self.isbn_index.conflicts_with(book):
+                            conflict_ids.append(row['id'])
                         imported_books.append(book)
                         self.book_ids.add(row['id'])
+                        self.isbn_index.add(book)  # 同一批次内的ISBN冲突也能检出
 
                     success = True
                     break  # 成功读取并处理，跳出编码循环
 
             except UnicodeDecodeError:
                 continue  # 编码不对，尝试下一个
+            except ValueError as e:
+                QMessageBox.warning(self, "错误", f"副本信息格式错误：{str(e)}")
+                return
             except Exception as e:
                 # 其他异常（如字段缺失）已在上面处理，这里兜底
                 QMessageBox.critical(self, "错误", f"读取CSV时发生未知错误：{str(e)}")
@@ -183,9 +482,14 @@ class BookManagementTab(QWidget):
                                 "无法识别CSV文件的编码，请确保文件为UTF-8（含BOM）或GBK编码")
             return
 
-        # 保存到JSON文件
-        self.books.extend(imported_books)
-        save_json(BOOKS_FILE, self.books)
+        # 在写锁内读取文件后追加，其他终端刚导入的同编号图书同样跳过
+        skipped = []
+        update_json(BOOKS_FILE, lambda books: append_books(books, imported_books, skipped))
+        if skipped:
+            duplicate_ids.extend(b["id"] for b in skipped)
+            imported_books = [b for b in imported_books if b not in skipped]
+        audit(self.user["username"], "import_books", file_path, after=[b["id"] for b in imported_books],
+              detail=f"导入 {len(imported_books)} 本，跳过重复 {len(duplicate_ids)} 本")
 
         # 显示导入结果
         success_count = len(imported_books)
@@ -194,9 +498,11 @@ class BookManagementTab(QWidget):
         if dup_count > 0:
             msg += f"\n{dup_count} 本图书因ID重复被跳过"
             msg += f"\n重复ID: {', '.join(duplicate_ids[:5])}" + ("..." if dup_count > 5 else "")
+        if conflict_ids:
+            msg += f"\n{len(conflict_ids)} 本图书的ISBN与已有图书冲突（书名或作者不同），可通过“ISBN查重”查看"
 
+        self.apply_book_delta(imported_books, [], [])
         QMessageBox.information(self, "导入完成", msg)
-        self.load_books()
 
     # 其他方法保持不变...
     def edit_book(self):
@@ -216,13 +522,16 @@ class BookManagementTab(QWidget):
             dialog = BookDialog(book_to_edit)
             if dialog.exec_():
                 updated_book = dialog.get_book_data()
-                for i, b in enumerate(self.books):
-                    if b["id"] == book_id:
-                        self.books[i] = updated_book
-                        break
-
-                save_json(BOOKS_FILE, self.books)
-                self.load_books()
+                if updated_book["id"] != book_id and updated_book["id"] in self.book_ids:
+                    QMessageBox.warning(self, "警告", "图书编号已存在")
+                    return
+                if not self.confirm_barcodes(updated_book) or not self.confirm_isbn(updated_book):
+                    return
+                update_json(BOOKS_FILE, lambda books: replace_book(books, book_id, updated_book))
+                audit(self.user["username"], "edit_book", book_id, before=book_to_edit, after=updated_book)
+                # 各索引只更新这本书，表格只刷新对应的行；修改了编号时移除旧编号
+                removed = [book_to_edit] if updated_book["id"] != book_id else []
+                self.apply_book_delta([], [updated_book], removed)
                 QMessageBox.information(self, "成功", "图书修改成功")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"修改失败：{str(e)}")
@@ -235,24 +544,133 @@ class BookManagementTab(QWidget):
                 return
 
             if QMessageBox.question(self, "确认",
-                                    "确定要删除选中的图书吗？\n删除后不可恢复，相关借阅记录不受影响",
+                                    "确定要删除选中的图书吗？\n删除后可在回收站中恢复，相关借阅记录不受影响",
                                     QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
                 return
 
-            book_ids = [self.book_table.item(row, 0).text() for row in selected_rows]
-            self.books = [b for b in self.books if b["id"] not in book_ids]
-            self.book_ids = {book["id"] for book in self.books}  # 同步更新集合
-            save_json(BOOKS_FILE, self.books)
-            self.load_books()
-            QMessageBox.information(self, "成功", "图书删除成功")
+            book_ids = {self.book_table.item(row, 0).text() for row in selected_rows}
+            deleted = [b for b in self.books if b["id"] in book_ids]
+            # 只追加墓碑，不重写图书文件；表格按增量移除对应行
+            get_tombstones(BOOKS_FILE).delete(deleted, self.user["username"])
+            for book in deleted:
+                audit(self.user["username"], "delete_book", book["id"], before=book)
+            self.apply_book_delta([], [], deleted)
+            QMessageBox.information(self, "成功", "图书删除成功，可在回收站中撤销")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"删除失败：{str(e)}")
 
+    def show_recycle_bin(self):
+        """回收站：撤销尚未压缩的图书删除"""
+        dialog = RecycleBinDialog(BOOKS_FILE, [("图书编号", "id"), ("书名", "title"), ("作者", "author")],
+                                  self.user["username"], "图书回收站", self)
+        dialog.restored.connect(self.on_books_restored)
+        dialog.exec_()
+
+    def on_books_restored(self, books):
+        for book in books:
+            audit(self.user["username"], "undelete_book", book["id"], after=book)
+        self.apply_book_delta(books, [], [])
+
+
+class FacetFilterBar(QWidget):
+    """分面筛选栏：同一字段内多选为“或”，不同字段之间为“且”，菜单中显示实时命中数量"""
+    changed = pyqtSignal()
+    FIELD_LABELS = {"category": "分类", "location": "馆藏位置", "publisher": "出版社"}
+
+    def __init__(self):
+        super().__init__()
+        self.selections = {field: set() for field in FACET_FIELDS}
+        self.buttons = {}
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        for field in FACET_FIELDS:
+            btn = QToolButton()
+            btn.setText(self.FIELD_LABELS[field])
+            btn.setPopupMode(QToolButton.InstantPopup)
+            btn.setMenu(QMenu(btn))
+            self.buttons[field] = btn
+            layout.addWidget(btn)
+        self.clear_btn = QPushButton("清除筛选")
+        self.clear_btn.clicked.connect(self.clear)
+        layout.addWidget(self.clear_btn)
+        layout.addStretch()
+        self.setLayout(layout)
+
+    def has_selection(self):
+        return any(self.selections.values())
+
+    def set_counts(self, counts):
+        """根据分面计数重建各字段的下拉菜单"""
+        for field, btn in self.buttons.items():
+            menu = btn.menu()
+            menu.clear()
+            selected = self.selections[field]
+            values = counts.get(field, {})
+            for value in sorted(set(values) | selected, key=lambda v: (-values.get(v, 0), v)):
+                action = menu.addAction(f"{value or '(空)'} ({values.get(value, 0)})")
+                action.setCheckable(True)
+                action.setChecked(value in selected)
+                action.triggered.connect(lambda checked, f=field, v=value: self.toggle(f, v, checked))
+            label = self.FIELD_LABELS[field]
+            btn.setText(f"{label} ({len(selected)})" if selected else label)
+
+    def toggle(self, field, value, checked):
+        if checked:
+            self.selections[field].add(value)
+        else:
+            self.selections[field].discard(value)
+        self.changed.emit()
+
+    def clear(self):
+        if self.has_selection():
+            for values in self.selections.values():
+                values.clear()
+            self.changed.emit()
+
+
+class IsbnReportDialog(QDialog):
+    """ISBN重复/冲突报告"""
+
+    def __init__(self, report):
+        super().__init__()
+        self.report = report
+        self.init_ui()
+        self.resize(700, 400)
+
+    def init_ui(self):
+        self.setWindowTitle("ISBN查重")
+        layout = QVBoxLayout()
+        conflicts = sum(1 for _, _, conflict in self.report if conflict)
+        layout.addWidget(QLabel(f"共 {len(self.report)} 个ISBN对应多本图书，其中 {conflicts} 个书名或作者不一致"))
+
+        table = QTableWidget()
+        table.setColumnCount(5)
+        table.setHorizontalHeaderLabels(["ISBN", "类型", "图书编号", "书名", "作者"])
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        rows = [(isbn, "冲突" if conflict else "多副本", book) for isbn, books, conflict in self.report for book in books]
+        table.setRowCount(len(rows))
+        for row, (isbn, kind, book) in enumerate(rows):
+            table.setItem(row, 0, QTableWidgetItem(isbn))
+            table.setItem(row, 1, QTableWidgetItem(kind))
+            table.setItem(row, 2, QTableWidgetItem(book.get("id", "")))
+            table.setItem(row, 3, QTableWidgetItem(book.get("title", "")))
+            table.setItem(row, 4, QTableWidgetItem(book.get("author", "")))
+        layout.addWidget(table)
+
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        self.setLayout(layout)
+
 
 class BookDialog(QDialog):
     def __init__(self, book=None):
         super().__init__()
         self.book = book
+        self.cover = (book or {}).get("cover", "")
         self.init_ui()
         self.setMinimumWidth(450)
 
@@ -266,6 +684,8 @@ class BookDialog(QDialog):
         self.publisher_edit = QLE()
         self.location_edit = QLE()
         self.category_edit = QLE()
+        self.copies_edit = QLE()
+        self.copies_edit.setPlaceholderText("多个副本用逗号分隔，如 B1-1, B1-2:维修；留空表示单本")
 
         if self.book:
             self.id_edit.setText(self.book.get("id", ""))
@@ -275,6 +695,7 @@ class BookDialog(QDialog):
             self.publisher_edit.setText(self.book.get("publisher", ""))
             self.location_edit.setText(self.book.get("location", ""))
             self.category_edit.setText(self.book.get("category", ""))
+            self.copies_edit.setText(format_copies(self.book.get("copies", [])))
 
         layout.addRow(QLabel("图书编号:"), self.id_edit)
         layout.addRow(QLabel("书名:"), self.title_edit)
@@ -283,12 +704,29 @@ class BookDialog(QDialog):
         layout.addRow(QLabel("出版社:"), self.publisher_edit)
         layout.addRow(QLabel("馆藏位置:"), self.location_edit)
         layout.addRow(QLabel("分类:"), self.category_edit)
+        layout.addRow(QLabel("副本条码:"), self.copies_edit)
+
+        # 封面：选择后立即存入封面存储，图书只保存封面文件名
+        cover_layout = QHBoxLayout()
+        self.cover_label = QLabel()
+        self.cover_label.setFixedSize(*COVER_PREVIEW_SIZE)
+        self.cover_label.setAlignment(Qt.AlignCenter)
+        self.cover_label.setStyleSheet("border: 1px solid #ccc")
+        cover_btn = QPushButton("选择封面")
+        clear_cover_btn = QPushButton("清除封面")
+        cover_btn.clicked.connect(self.choose_cover)
+        clear_cover_btn.clicked.connect(self.clear_cover)
+        cover_layout.addWidget(self.cover_label)
+        cover_layout.addWidget(cover_btn)
+        cover_layout.addWidget(clear_cover_btn)
+        layout.addRow(QLabel("封面:"), cover_layout)
+        self.show_cover()
 
         btn_layout = QHBoxLayout()
         ok_btn = QPushButton("确定")
         cancel_btn = QPushButton("取消")
 
-        ok_btn.clicked.connect(self.accept)
+        ok_btn.clicked.connect(self.check_and_accept)
         cancel_btn.clicked.connect(self.reject)
 
         btn_layout.addWidget(ok_btn)
@@ -297,8 +735,45 @@ class BookDialog(QDialog):
 
         self.setLayout(layout)
 
+    def show_cover(self):
+        """预览当前封面（只加载一张图片，直接在界面线程读取）"""
+        path = get_cover_store().path_of(self.cover)
+        pixmap = QPixmap(path) if path else QPixmap()
+        if pixmap.isNull():
+            self.cover_label.setPixmap(QPixmap())
+            self.cover_label.setText("无封面")
+            return
+        self.cover_label.setPixmap(pixmap.scaled(*COVER_PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def choose_cover(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择封面图片", "",
+                                                   "图片 (*.png *.jpg *.jpeg *.bmp *.gif *.webp)")
+        if not file_path:
+            return
+        if QPixmap(file_path).isNull():
+            QMessageBox.warning(self, "警告", "无法识别的图片文件")
+            return
+        try:
+            self.cover = get_cover_store().put(file_path)
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self, "警告", f"保存封面失败：{str(e)}")
+            return
+        self.show_cover()
+
+    def clear_cover(self):
+        self.cover = ""
+        self.show_cover()
+
+    def check_and_accept(self):
+        try:
+            parse_copies(self.copies_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        self.accept()
+
     def get_book_data(self):
-        return {
+        book = {
             "id": self.id_edit.text(),
             "title": self.title_edit.text(),
             "author": self.author_edit.text(),
@@ -306,4 +781,10 @@ class BookDialog(QDialog):
             "publisher": self.publisher_edit.text(),
             "location": self.location_edit.text(),
             "category": self.category_edit.text()
-        }
\ No newline at end of file
+        }
+        copies = parse_copies(self.copies_edit.text())
+        if copies:
+            book["copies"] = copies
+        if self.cover:
+            book["cover"] = self.cover
+        return book
\ No newline at end of file
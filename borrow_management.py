@@ -1,11 +1,35 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTabWidget, QHBoxLayout,
                              QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
-                             QHeaderView, QMessageBox, QDialog, QGroupBox, QLabel, QInputDialog)
+                             QHeaderView, QMessageBox, QDialog, QGroupBox, QLabel, QInputDialog, QCheckBox,
+                             QApplication, QAbstractItemView)
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFont
 import datetime
-from data_utils import load_json, load_csv, save_csv
+from data_utils import load_json, record_key
+from record_store import get_record_store
+from facet_index import FacetIndex
+from isbn_index import IsbnIndex, is_valid_isbn
+from search_index import SearchIndex, fuzzy_option
+from book_management import FacetFilterBar, book_sort_columns, set_sort_indicator
+from hold_queue import get_hold_queue
+from holdings import get_holdings
+from sort_index import SortIndex, SortState, collation_key
+from scan_checkout import ScanCheckout
+from renewal import renew_check, bulk_renew
+from recommend import get_co_borrow_index
+from audit_log import audit
 
 BOOKS_FILE = 'data/books.json'
 BORROW_RECORDS_FILE = 'data/borrow_records.csv'
+HOLD_CHECK_INTERVAL = 60 * 1000  # 检查预约到期的间隔（毫秒）
+QUEUE_COLUMN = 5
+BULK_RENEW_PREVIEW_ROWS = 2000  # 预览表格最多显示的行数
+RENEW_REFUSALS = {
+    "overdue": "图书已过期，无法续借",
+    "renewed": "图书已续借过一次，无法再次续借",
+    "on_hold": "该书已有读者预约，无法续借",
+    "bad_time": "借阅记录的时间格式错误，无法续借",
+}
 
 
 class BorrowManagementTab(QWidget):
@@ -15,8 +39,34 @@ class BorrowManagementTab(QWidget):
         self.books = []
         self.available_books = []
         self.borrowed_books = []
-        self.all_borrowed_records = []  # 用于存储所有已借出记录，支持搜索功能
+        self.facet_index = FacetIndex()
+        self.isbn_index = IsbnIndex()
+        self.search_index = SearchIndex()
+        self.available_mask = 0  # 可借图书在分面索引中的位图
+        self.holds = get_hold_queue()
+        self.holdings = get_holdings()  # 副本及可借数量，随借还增量更新
+        self.book_sort = SortState()
+        self.book_sort_index = SortIndex(book_sort_columns(self.holdings), lambda b: b.get("id", ""))
+        # 已借出列表默认按借阅时间倒序；预约人数随预约变化，不建索引，排序时现取
+        self.borrowed_sort = SortState(2, True)
+        self.borrowed_sort_index = SortIndex([
+            lambda r: r.get("book_id", ""),
+            lambda r: collation_key(r.get("book_title", "")),
+            lambda r: r.get("borrow_time", ""),
+            lambda r: r.get("due_time", ""),
+            lambda r: collation_key(r.get("borrower", "")),
+            lambda r: self.holds.queue_length(self.holdings.title_of(r.get("book_id", ""))),
+        ], record_key, live_columns=[QUEUE_COLUMN])
+        self.store = get_record_store(BORROW_RECORDS_FILE)
         self.init_ui()
+        self.load_borrowed_books()
+        # 已借出记录的有序索引随借还事件插入/删除，借还后不再重新读取记录
+        self.store.subscribe(self.on_record_event)
+
+        # 定时处理到期未取的预约，只弹出到期的堆顶，无到期预约时几乎没有开销
+        self.hold_timer = QTimer(self)
+        self.hold_timer.timeout.connect(self.check_expired_holds)
+        self.hold_timer.start(HOLD_CHECK_INTERVAL)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -36,18 +86,28 @@ class BorrowManagementTab(QWidget):
         self.search_btn.clicked.connect(self.search_books)
         self.refresh_btn = QPushButton("刷新")
         self.refresh_btn.clicked.connect(self.load_available_books)
+        fuzzy_text, fuzzy_tip = fuzzy_option()
+        self.fuzzy_check = QCheckBox(fuzzy_text)
+        self.fuzzy_check.setToolTip(fuzzy_tip)
 
         search_layout.addWidget(self.search_edit)
+        search_layout.addWidget(self.fuzzy_check)
         search_layout.addWidget(self.search_btn)
         search_layout.addWidget(self.refresh_btn)
         borrow_layout.addLayout(search_layout)
 
+        # 分面筛选
+        self.facet_bar = FacetFilterBar()
+        self.facet_bar.changed.connect(self.search_books)
+        borrow_layout.addWidget(self.facet_bar)
+
         # 可借阅图书表格
         self.book_table = QTableWidget()
-        self.book_table.setColumnCount(6)
+        self.book_table.setColumnCount(7)
         self.book_table.setHorizontalHeaderLabels(["图书编号", "书名", "作者", "ISBN",
-                                                   "出版社", "馆藏位置"])
+                                                   "出版社", "馆藏位置", "可借数量"])
         self.book_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.book_table.horizontalHeader().sectionClicked.connect(self.sort_books)
         borrow_layout.addWidget(self.book_table)
 
         # 操作按钮
@@ -55,6 +115,13 @@ class BorrowManagementTab(QWidget):
         self.borrow_btn = QPushButton("借阅选中图书")
         self.borrow_btn.clicked.connect(self.borrow_book)
         btn_layout.addWidget(self.borrow_btn)
+        if self.user["role"] == "admin":
+            self.scan_btn = QPushButton("扫码借书")
+            self.scan_btn.clicked.connect(self.scan_checkout)
+            btn_layout.addWidget(self.scan_btn)
+            self.bulk_renew_btn = QPushButton("批量续借")
+            self.bulk_renew_btn.clicked.connect(self.bulk_renew)
+            btn_layout.addWidget(self.bulk_renew_btn)
         borrow_layout.addLayout(btn_layout)
 
         # 添加标签页
@@ -66,12 +133,18 @@ class BorrowManagementTab(QWidget):
         btn_layout = QHBoxLayout()
         self.return_btn = QPushButton("归还图书")
         self.renew_btn = QPushButton("续借图书")
+        self.hold_btn = QPushButton("预约图书")
+        self.hold_list_btn = QPushButton("预约列表")
 
         self.return_btn.clicked.connect(self.return_book)
         self.renew_btn.clicked.connect(self.renew_book)
+        self.hold_btn.clicked.connect(self.place_hold)
+        self.hold_list_btn.clicked.connect(self.show_holds)
 
         btn_layout.addWidget(self.return_btn)
         btn_layout.addWidget(self.renew_btn)
+        btn_layout.addWidget(self.hold_btn)
+        btn_layout.addWidget(self.hold_list_btn)
         layout.addLayout(btn_layout)
 
         # 已借出图书标签页
@@ -94,11 +167,13 @@ class BorrowManagementTab(QWidget):
         borrowed_layout.addLayout(borrowed_search_layout)
 
         self.borrowed_table = QTableWidget()
-        self.borrowed_table.setColumnCount(5)
+        self.borrowed_table.setColumnCount(6)
         self.borrowed_table.setHorizontalHeaderLabels(
-            ["图书编号", "书名", "借阅时间", "应还时间", "借阅人"]
+            ["图书编号", "书名", "借阅时间", "应还时间", "借阅人", "预约人数"]
         )
         self.borrowed_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.borrowed_table.horizontalHeader().sectionClicked.connect(self.sort_borrowed_books)
+        set_sort_indicator(self.borrowed_table, self.borrowed_sort)
         borrowed_layout.addWidget(self.borrowed_table)
         self.borrowed_group.setLayout(borrowed_layout)
         layout.addWidget(self.borrowed_group)
@@ -108,16 +183,34 @@ class BorrowManagementTab(QWidget):
     def load_available_books(self):
         """加载可借阅图书"""
         self.books = load_json(BOOKS_FILE)
-        borrow_records = load_csv(BORROW_RECORDS_FILE)
-        borrowed_ids = {r["book_id"] for r in borrow_records if not r["actual_return_time"]}
-
-        self.available_books = [b for b in self.books if b["id"] not in borrowed_ids]
-        self.borrowed_books = [b for b in self.books if b["id"] in borrowed_ids]
-        self.update_book_table(self.available_books)
-        self.load_borrowed_books()
+        self.holdings.set_books(self.books)
+
+        # 可借判断直接读取每种图书的可借副本计数，不统计借阅记录
+        self.available_books = [b for b in self.books if self.holdings.is_available(b["id"])]
+        self.borrowed_books = [b for b in self.books if not self.holdings.is_available(b["id"])]
+        self.facet_index = FacetIndex(self.books)
+        self.isbn_index = IsbnIndex(self.books)
+        self.search_index = SearchIndex(self.books)
+        self.book_sort_index.rebuild(self.books)
+        self.available_mask = self.facet_index.mask_of(b["id"] for b in self.available_books)
+        self.search_books()
+
+    def sort_books(self, column):
+        """点击表头按该列排序，再次点击切换升降序"""
+        self.book_sort.click(column)
+        set_sort_indicator(self.book_table, self.book_sort)
+        self.search_books()
+
+    def sort_borrowed_books(self, column):
+        self.borrowed_sort.click(column)
+        set_sort_indicator(self.borrowed_table, self.borrowed_sort)
+        self.search_borrowed_books()
 
     def update_book_table(self, books):
-        """更新图书表格"""
+        """更新图书表格，已选择排序列时按该列的有序索引输出"""
+        if self.book_sort.column is not None:
+            books = self.book_sort_index.ordered(self.book_sort.column, self.book_sort.descending,
+                                                 {b["id"] for b in books})
         self.book_table.setRowCount(len(books))
         for row, book in enumerate(books):
             self.book_table.setItem(row, 0, QTableWidgetItem(book["id"]))
@@ -126,22 +219,34 @@ class BorrowManagementTab(QWidget):
             self.book_table.setItem(row, 3, QTableWidgetItem(book.get("isbn", "")))
             self.book_table.setItem(row, 4, QTableWidgetItem(book.get("publisher", "")))
             self.book_table.setItem(row, 5, QTableWidgetItem(book.get("location", "")))
+            book_id = book["id"]
+            self.book_table.setItem(row, 6, QTableWidgetItem(
+                f"{self.holdings.available_count(book_id)}/{self.holdings.copy_count(book_id)}"))
 
     def load_borrowed_books(self):
-        """加载当前已借出的图书"""
-        records = load_csv(BORROW_RECORDS_FILE)
-        user_borrowed = [r for r in records if not r["actual_return_time"]]
-
-        # 按借阅时间倒序排序
-        user_borrowed.sort(key=lambda r: r["borrow_time"], reverse=True)
-
-        # 保存原始数据用于搜索
-        self.all_borrowed_records = user_borrowed
-
-        self.update_borrowed_table(user_borrowed)
+        """加载当前已借出的记录（由记录索引找出未归还记录，只读取这些行）"""
+        # 显示顺序由有序索引决定，搜索也在索引中的记录上进行
+        self.borrowed_sort_index.rebuild(self.store.open_records())
+        self.search_borrowed_books()
+
+    def on_record_event(self, event, record, old):
+        """借还事件：维护已借出记录的有序索引和可借数量排序键（二分插入/删除，不重新排序）"""
+        if event == "reset":
+            self.book_sort_index.rebuild(self.books)
+            self.load_borrowed_books()
+            return
+        if old is not None and record_key(old) != record_key(record):
+            self.borrowed_sort_index.remove(record_key(old))
+        if record.get("actual_return_time"):
+            self.borrowed_sort_index.remove(record_key(record))
+        else:
+            self.borrowed_sort_index.add(record)
+        self.book_sort_index.refresh(self.holdings.title_of(record.get("book_id", "")))
 
     def update_borrowed_table(self, records):
-        """更新已借出图书表格"""
+        """更新已借出图书表格，按当前排序列的有序索引输出"""
+        visible = None if len(records) == len(self.borrowed_sort_index) else {record_key(r) for r in records}
+        records = self.borrowed_sort_index.ordered(self.borrowed_sort.column, self.borrowed_sort.descending, visible)
         self.borrowed_table.setRowCount(len(records))
         for row, r in enumerate(records):
             self.borrowed_table.setItem(row, 0, QTableWidgetItem(r["book_id"]))
@@ -149,34 +254,79 @@ class BorrowManagementTab(QWidget):
             self.borrowed_table.setItem(row, 2, QTableWidgetItem(r["borrow_time"]))
             self.borrowed_table.setItem(row, 3, QTableWidgetItem(r["due_time"]))
             self.borrowed_table.setItem(row, 4, QTableWidgetItem(r["borrower"]))
+            queued = self.holds.queue_length(self.holdings.title_of(r["book_id"]))
+            self.borrowed_table.setItem(row, 5, QTableWidgetItem(str(queued)))
 
     def search_books(self):
-        """搜索可借阅图书"""
+        """搜索可借阅图书（关键词与分面条件组合）"""
         keyword = self.search_edit.text().lower().strip()
-        if not keyword:
+        selections = self.facet_bar.selections
+        base = self.available_mask
+        if is_valid_isbn(keyword):
+            # 扫码枪输入的ISBN直接走精确索引
+            base &= self.facet_index.mask_of(b["id"] for b in self.isbn_index.lookup(keyword))
+        elif keyword and self.fuzzy_check.isChecked():
+            base &= self.facet_index.mask_of(self.search_index.search(keyword))
+        elif keyword:
+            base &= self.facet_index.mask_of(
+                b["id"] for b in self.available_books if
+                keyword in b.get("title", "").lower() or
+                keyword in b.get("author", "").lower() or
+                keyword in b.get("isbn", "").lower())
+        self.facet_bar.set_counts(self.facet_index.counts(selections, base))
+        if not keyword and not self.facet_bar.has_selection():
             self.update_book_table(self.available_books)
             return
 
-        filtered = [b for b in self.available_books if
-                    keyword in b.get("title", "").lower() or
-                    keyword in b.get("author", "").lower() or
-                    keyword in b.get("isbn", "").lower()]
-        self.update_book_table(filtered)
+        self.update_book_table(self.facet_index.books_in(self.facet_index.match(selections, base)))
 
     def search_borrowed_books(self):
         """搜索已借出图书（支持书名和借阅人）"""
         keyword = self.borrowed_search_edit.text().lower().strip()
+        records = list(self.borrowed_sort_index.items.values())
         if not keyword:
-            self.update_borrowed_table(self.all_borrowed_records)
+            self.update_borrowed_table(records)
             return
 
         # 过滤包含关键词的记录（书名或借阅人）
-        filtered = [r for r in self.all_borrowed_records if
+        filtered = [r for r in records if
                     keyword in r.get("book_title", "").lower() or
                     keyword in r.get("borrower", "").lower()]
 
         self.update_borrowed_table(filtered)
 
+    def apply_book_delta(self, added, changed, removed):
+        """应用外部修改产生的图书增量（不重新读取文件）"""
+        removed_ids = {b.get("id", "") for b in removed}
+        updated = {b.get("id", ""): b for b in added + changed}
+        books = [updated.pop(b["id"], b) for b in self.books if b["id"] not in removed_ids]
+        self.books = books + list(updated.values())
+        for book_id in removed_ids:
+            self.facet_index.remove(book_id)
+            self.isbn_index.remove(book_id)
+            self.search_index.remove(book_id)
+            self.holdings.remove_book(book_id)
+            self.book_sort_index.remove(book_id)
+        for book in added + changed:
+            self.facet_index.add(book)
+            self.isbn_index.add(book)
+            self.search_index.add(book)
+            self.holdings.add_book(book)
+            self.book_sort_index.add(book)
+        self.refresh_views()
+
+    def apply_record_delta(self, added, changed, removed):
+        """借阅记录变化后刷新列表（有序索引已随记录存储的事件更新），保持当前搜索条件"""
+        self.refresh_views()
+
+    def refresh_views(self):
+        """根据内存中的数据重新计算可借列表，并保持当前搜索条件"""
+        self.available_books = [b for b in self.books if self.holdings.is_available(b["id"])]
+        self.borrowed_books = [b for b in self.books if not self.holdings.is_available(b["id"])]
+        self.available_mask = self.facet_index.mask_of(b["id"] for b in self.available_books)
+        self.search_books()
+        self.search_borrowed_books()
+
     def borrow_book(self):
         """借阅图书"""
         selected_rows = set(item.row() for item in self.book_table.selectedItems())
@@ -194,27 +344,59 @@ class BorrowManagementTab(QWidget):
             QMessageBox.warning(self, "警告", "未输入有效的借阅人名称")
             return
 
+        self.store.sync()  # 输入借阅人期间其他终端可能已借出该书的副本
+        # 已为其他预约读者保留的副本不能借出（仍有其他可借副本时不受影响）
+        reserved_for = self.holds.reserved_for(book_id)
+        if borrower not in reserved_for and self.holdings.available_count(book_id) <= len(reserved_for):
+            QMessageBox.warning(self, "警告", f"该书已为预约读者 {'、'.join(reserved_for)} 保留，暂不能借给其他读者")
+            return
+        barcode = self.holdings.pick_copy(book_id)
+        if barcode is None:
+            QMessageBox.warning(self, "警告", "该书当前没有可借的副本")
+            self.refresh_views()
+            return
+
         # 创建借阅记录
         borrow_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         due_time = (datetime.datetime.now() + datetime.timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
 
         new_record = {
             "borrower": borrower,
-            "book_id": book_id,
+            "book_id": barcode,  # 借阅记录中保存副本条码
             "book_title": book_title,
             "borrow_time": borrow_time,
             "due_time": due_time,
             "actual_return_time": ""
         }
 
-        records = load_csv(BORROW_RECORDS_FILE)
-        records.append(new_record)
-        save_csv(BORROW_RECORDS_FILE, records)
+        # 持锁确认副本仍可借后追加写入，无需重写整个记录文件
+        if self.store.lend(new_record) is None:
+            QMessageBox.warning(self, "警告", f"副本 {barcode} 刚被其他终端借出，请重新选择")
+            self.refresh_views()
+            return
+        if borrower in reserved_for:
+            self.holds.fulfil(book_id, borrower)
 
         # 刷新界面
-        self.load_available_books()
-        QMessageBox.information(self, "成功",
-                                f"借阅成功\n借阅人: {borrower}\n借阅日期: {borrow_time}\n应还日期: {due_time}")
+        self.refresh_views()
+        copy_info = f"\n副本条码: {barcode}" if barcode != book_id else ""
+        related = get_co_borrow_index().related_text(book_id)
+        related_info = f"\n\n借过这本书的读者还借了: {related}" if related else ""
+        QMessageBox.information(self, "成功", f"借阅成功\n借阅人: {borrower}{copy_info}\n借阅日期: {borrow_time}\n"
+                                            f"应还日期: {due_time}{related_info}")
+
+    def scan_checkout(self):
+        """扫码借书（柜台模式），关闭后刷新可借列表"""
+        dialog = ScanCheckoutDialog(self.books, self)
+        dialog.exec_()
+        self.refresh_views()
+
+    def bulk_renew(self):
+        """批量续借（预览后执行），关闭后刷新已借列表"""
+        dialog = BulkRenewDialog(self.user["username"], self)
+        dialog.exec_()
+        if dialog.renewed:
+            self.search_borrowed_books()
 
     def return_book(self):
         """归还图书"""
@@ -231,20 +413,65 @@ class BorrowManagementTab(QWidget):
             book_id = self.borrowed_table.item(row, 0).text()
             borrow_time = self.borrowed_table.item(row, 2).text()
 
-            # 更新借阅记录
-            records = load_csv(BORROW_RECORDS_FILE)
-            for r in records:
-                if r["book_id"] == book_id and r["borrow_time"] == borrow_time and not r["actual_return_time"]:
-                    r["actual_return_time"] = return_time
-                    break
-
-            save_csv(BORROW_RECORDS_FILE, records)
-            self.load_available_books()  # 刷新可借和已借列表
-            QMessageBox.information(self, "成功", f"归还成功\n归还时间: {return_time}")
+            # 通过偏移索引直接定位并更新借阅记录
+            store = get_record_store(BORROW_RECORDS_FILE)
+            record = store.get(book_id, borrow_time)
+            if record is None or record["actual_return_time"]:
+                QMessageBox.warning(self, "警告", "未找到该借阅记录，可能已被归还")
+                self.refresh_views()
+                return
+            store.update(book_id, borrow_time, actual_return_time=return_time)
+            title_id = self.holdings.title_of(book_id)
+            hold = self.holds.on_return(title_id, available=self.holdings.available_count(title_id))
+            self.refresh_views()  # 可借数量和已借列表已随借还事件更新
+            message = f"归还成功\n归还时间: {return_time}"
+            if hold:
+                message += f"\n该书已有预约，请为读者 {hold['borrower']} 保留至 {hold['expire_time']}"
+            QMessageBox.information(self, "成功", message)
 
         except Exception as e:
             QMessageBox.critical(self, "错误", f"归还失败: {str(e)}")
 
+    def place_hold(self):
+        """预约图书：选中已借出的图书，或已为其他读者保留的可借图书"""
+        selected_rows = set(item.row() for item in self.borrowed_table.selectedItems())
+        if len(selected_rows) == 1:
+            row = list(selected_rows)[0]
+            book_id = self.holdings.title_of(self.borrowed_table.item(row, 0).text())
+            book_title = self.borrowed_table.item(row, 1).text()
+        else:
+            selected_rows = set(item.row() for item in self.book_table.selectedItems())
+            if len(selected_rows) != 1:
+                QMessageBox.warning(self, "警告", "请选择一本图书进行预约")
+                return
+            row = list(selected_rows)[0]
+            book_id = self.book_table.item(row, 0).text()
+            book_title = self.book_table.item(row, 1).text()
+            if self.holdings.available_count(book_id) > len(self.holds.reserved_for(book_id)):
+                QMessageBox.information(self, "提示", "该书在馆可借，无需预约")
+                return
+
+        borrower, ok = QInputDialog.getText(self, "输入预约人名称", f"预约《{book_title}》，请输入预约人名称:")
+        if not ok or not borrower:
+            return
+        position = self.holds.place(book_id, borrower)
+        if position is None:
+            QMessageBox.warning(self, "警告", f"{borrower} 已预约过该书")
+            return
+        self.search_borrowed_books()
+        QMessageBox.information(self, "成功", f"预约成功\n预约人: {borrower}\n当前排队第 {position} 位")
+
+    def show_holds(self):
+        """查看和取消预约"""
+        dialog = HoldListDialog(self.holds, {b["id"]: b["title"] for b in self.books}, self)
+        dialog.exec_()
+        self.search_borrowed_books()
+
+    def check_expired_holds(self):
+        """处理到期未取的预约，顺延给队列中的下一位读者"""
+        if self.holds.expire():
+            self.search_borrowed_books()
+
     def renew_book(self):
         """续借图书（最多续借1次，延长15天）"""
         try:
@@ -258,39 +485,84 @@ class BorrowManagementTab(QWidget):
             borrow_time = self.borrowed_table.item(row, 2).text()
             current_due_time = self.borrowed_table.item(row, 3).text()
 
-            # 解析日期
-            due_time_obj = datetime.datetime.strptime(current_due_time, "%Y-%m-%d %H:%M:%S")
-            today = datetime.datetime.now()
-
-            # 检查是否已过期
-            if due_time_obj < today:
-                QMessageBox.warning(self, "警告", "图书已过期，无法续借")
+            # 未逾期、未续借过（原借期30天）且无读者预约时才能续借，延长15天
+            has_holds = bool(self.holds.queue_length(self.holdings.title_of(book_id)))
+            new_due_time, reason = renew_check(borrow_time, current_due_time, has_holds, datetime.datetime.now())
+            if reason:
+                QMessageBox.warning(self, "警告", RENEW_REFUSALS[reason])
                 return
 
-            # 检查是否已续借过（简单判断：原借阅周期30天，若已延长则不再续借）
-            original_borrow_time = datetime.datetime.strptime(borrow_time, "%Y-%m-%d %H:%M:%S")
-            if (due_time_obj - original_borrow_time).days > 30:
-                QMessageBox.warning(self, "警告", "图书已续借过一次，无法再次续借")
+            # 更新记录（应还时间长度不变，直接原地写入）
+            store = get_record_store(BORROW_RECORDS_FILE)
+            record = store.get(book_id, borrow_time)
+            if record is None or record["actual_return_time"]:
+                QMessageBox.warning(self, "警告", "未找到该借阅记录，可能已被归还")
+                self.search_borrowed_books()
                 return
-
-            # 延长15天
-            new_due_time = (due_time_obj + datetime.timedelta(days=15)).strftime("%Y-%m-%d %H:%M:%S")
-
-            # 更新记录
-            records = load_csv(BORROW_RECORDS_FILE)
-            for r in records:
-                if r["book_id"] == book_id and r["borrow_time"] == borrow_time and not r["actual_return_time"]:
-                    r["due_time"] = new_due_time
-                    break
-
-            save_csv(BORROW_RECORDS_FILE, records)
-            self.load_borrowed_books()  # 刷新已借列表
+            store.update(book_id, borrow_time, due_time=new_due_time)
+            self.search_borrowed_books()  # 刷新已借列表
             QMessageBox.information(self, "成功", f"续借成功\n新应还日期: {new_due_time}")
 
         except Exception as e:
             QMessageBox.critical(self, "错误", f"续借失败: {str(e)}")
 
 
+class HoldListDialog(QDialog):
+    """预约列表，可取消选中的预约"""
+
+    def __init__(self, holds, titles, parent=None):
+        super().__init__(parent)
+        self.holds = holds
+        self.titles = titles
+        self.setWindowTitle("预约列表")
+        self.resize(700, 400)
+        self.init_ui()
+        self.load_holds()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["图书编号", "书名", "预约人", "预约时间", "状态"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        self.cancel_hold_btn = QPushButton("取消选中预约")
+        self.close_btn = QPushButton("关闭")
+        self.cancel_hold_btn.clicked.connect(self.cancel_hold)
+        self.close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.cancel_hold_btn)
+        btn_layout.addWidget(self.close_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+    def load_holds(self):
+        self.entries = sorted(self.holds.all_holds(), key=lambda e: (e[0], e[2]))
+        self.table.setRowCount(len(self.entries))
+        for row, (book_id, hold, position) in enumerate(self.entries):
+            status = f"待取，保留至 {hold['expire_time']}" if position == 0 else f"排队第 {position} 位"
+            self.table.setItem(row, 0, QTableWidgetItem(book_id))
+            self.table.setItem(row, 1, QTableWidgetItem(self.titles.get(book_id, "")))
+            self.table.setItem(row, 2, QTableWidgetItem(hold["borrower"]))
+            self.table.setItem(row, 3, QTableWidgetItem(hold["placed_time"]))
+            self.table.setItem(row, 4, QTableWidgetItem(status))
+
+    def cancel_hold(self):
+        selected_rows = set(item.row() for item in self.table.selectedItems())
+        if len(selected_rows) != 1:
+            QMessageBox.warning(self, "警告", "请选择一条预约")
+            return
+        book_id, hold, _ = self.entries[list(selected_rows)[0]]
+        if QMessageBox.question(self, "确认取消", f"确定取消 {hold['borrower']} 对该书的预约吗？",
+                                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        assigned = self.holds.cancel(book_id, hold["borrower"])
+        if assigned:
+            QMessageBox.information(self, "提示", f"该书已顺延保留给读者 {assigned['borrower']}")
+        self.load_holds()
+
+
 class BorrowerDialog(QDialog):
     def __init__(self):
         super().__init__()
@@ -322,6 +594,154 @@ class BorrowerDialog(QDialog):
         return self.borrower_edit.text().strip()
 
 
+class ScanCheckoutDialog(QDialog):
+    """扫码借书：先扫读者证，再逐本扫描图书条码，每扫一本立即借出；回车空行结束当前读者"""
+
+    def __init__(self, books, parent=None):
+        super().__init__(parent)
+        self.checkout = ScanCheckout(books=books)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("扫码借书")
+        self.resize(640, 480)
+        layout = QVBoxLayout(self)
+
+        self.patron_label = QLabel("请扫描读者证")
+        font = QFont()
+        font.setPointSize(14)
+        self.patron_label.setFont(font)
+        layout.addWidget(self.patron_label)
+
+        self.scan_edit = QLineEdit()
+        self.scan_edit.setFont(font)
+        self.scan_edit.setPlaceholderText("扫描读者证或图书条码/ISBN，空行回车结束当前读者")
+        self.scan_edit.returnPressed.connect(self.on_scan)
+        layout.addWidget(self.scan_edit)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.related_label = QLabel()
+        self.related_label.setWordWrap(True)
+        layout.addWidget(self.related_label)
+
+        self.loan_table = QTableWidget()
+        self.loan_table.setColumnCount(4)
+        self.loan_table.setHorizontalHeaderLabels(["借阅人", "副本条码", "书名", "应还时间"])
+        self.loan_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.loan_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.loan_table)
+
+        close_btn = QPushButton("关闭")
+        close_btn.setAutoDefault(False)  # 扫描枪的回车不能触发关闭
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        self.scan_edit.setFocus()
+
+    def on_scan(self):
+        result = self.checkout.scan(self.scan_edit.text())
+        self.scan_edit.clear()
+        error = result["kind"] == "error"
+        if error:
+            QApplication.beep()
+        self.status_label.setStyleSheet("color: red" if error else "color: green")
+        self.status_label.setText(f"{result['message']}（{result['elapsed_ms']:.1f} ms）")
+        self.patron_label.setText(f"当前读者: {self.checkout.patron}" if self.checkout.patron else "请扫描读者证")
+        record = result["record"]
+        if result["kind"] in ("patron", "end"):
+            self.related_label.clear()
+        if record:
+            # 按本次已借的书推荐（在扫码计时之外计算）
+            session = {self.checkout.holdings.title_of(r["book_id"]) for r in self.checkout.session}
+            related = get_co_borrow_index().related_text(session)
+            self.related_label.setText(f"推荐: {related}" if related else "")
+            # 最近借出的显示在最上方
+            self.loan_table.insertRow(0)
+            for col, field in enumerate(("borrower", "book_id", "book_title", "due_time")):
+                self.loan_table.setItem(0, col, QTableWidgetItem(record[field]))
+
+
+class BulkRenewDialog(QDialog):
+    """批量续借：对某位读者或全部读者的未归还记录按续借规则预览，确认后一次写入"""
+
+    def __init__(self, actor, parent=None):
+        super().__init__(parent)
+        self.actor = actor
+        self.renewed = 0
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("批量续借")
+        self.resize(720, 480)
+        layout = QVBoxLayout(self)
+
+        scope_layout = QHBoxLayout()
+        self.borrower_edit = QLineEdit()
+        self.borrower_edit.setPlaceholderText("借阅人（留空表示全部读者）")
+        self.preview_btn = QPushButton("预览")
+        self.preview_btn.clicked.connect(self.preview)
+        scope_layout.addWidget(self.borrower_edit)
+        scope_layout.addWidget(self.preview_btn)
+        layout.addLayout(scope_layout)
+
+        self.summary_label = QLabel("点击“预览”查看可续借的记录")
+        layout.addWidget(self.summary_label)
+
+        self.plan_table = QTableWidget()
+        self.plan_table.setColumnCount(5)
+        self.plan_table.setHorizontalHeaderLabels(["副本条码", "借阅时间", "借阅人", "原应还时间", "新应还时间"])
+        self.plan_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.plan_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.plan_table)
+
+        btn_layout = QHBoxLayout()
+        self.apply_btn = QPushButton("执行续借")
+        self.apply_btn.setEnabled(False)
+        self.apply_btn.clicked.connect(self.apply)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.apply_btn)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def borrower(self):
+        return self.borrower_edit.text().strip() or None
+
+    def preview(self):
+        plan = bulk_renew(self.borrower(), dry_run=True)
+        items = plan.items[:BULK_RENEW_PREVIEW_ROWS]
+        self.plan_table.setRowCount(len(items))
+        for row, item in enumerate(items):
+            for col, value in enumerate(item):
+                self.plan_table.setItem(row, col, QTableWidgetItem(value))
+        summary = f"可续借 {len(plan)} 条"
+        if plan.skipped:
+            summary += f"；不可续借: {plan.skip_text()}"
+        if len(plan) > len(items):
+            summary += f"（仅显示前 {len(items)} 条）"
+        self.summary_label.setText(summary)
+        self.apply_btn.setEnabled(len(plan) > 0)
+
+    def apply(self):
+        scope = self.borrower() or "全部读者"
+        reply = QMessageBox.question(self, "确认", f"确定为{scope}续借预览中的记录吗？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            # 重新按当前数据生成计划，预览之后被归还或续借的记录不会重复处理
+            plan = bulk_renew(self.borrower())
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"批量续借失败: {str(e)}")
+            return
+        self.renewed += plan.renewed
+        detail = f"续借 {plan.renewed} 条" + (f"；跳过: {plan.skip_text()}" if plan.skipped else "")
+        audit(self.actor, "bulk_renew", scope, detail=detail)
+        QMessageBox.information(self, "成功", detail)
+        self.preview()
+
+
 class ReturnDialog(QDialog):
     def __init__(self, records):
         super().__init__()
@@ -0,0 +1,106 @@
+# change_log.py
+import os
+import json
+import datetime
+import data_utils
+from data_utils import file_lock
+
+LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# 各数据文件在日志中的名称及主键字段；借阅记录的主键为 [图书编号, 借阅时间]
+KEY_FIELDS = {"books": "id", "users": "username"}
+
+
+def change_log_path():
+    return os.path.join(data_utils.DATA_DIR, "change_log.jsonl")
+
+
+def logged_kind(file_path):
+    """数据文件对应的日志名称，不需要记录日志的文件返回None"""
+    path = os.path.abspath(file_path)
+    if path == os.path.abspath(data_utils.BOOKS_FILE):
+        return "books"
+    if path == os.path.abspath(data_utils.USERS_FILE):
+        return "users"
+    return None
+
+
+def record_log_key(record):
+    return [record.get("book_id", ""), record.get("borrow_time", "")]
+
+
+def put_entry(kind, key, row):
+    return {"file": kind, "op": "put", "key": key, "row": row}
+
+
+def delete_entry(kind, key):
+    return {"file": kind, "op": "delete", "key": key}
+
+
+def log_changes(entries, log_path=None):
+    """追加变更日志，每条为按主键写入整行(put)或删除(delete)，重放时与顺序无关的重复应用结果相同"""
+    if not entries:
+        return
+    log_path = log_path or change_log_path()
+    ts = datetime.datetime.now().strftime(LOG_TIME_FORMAT)
+    data = "".join(json.dumps(dict(entry, ts=ts), ensure_ascii=False) + "\n" for entry in entries)
+    with file_lock(log_path):
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(data)
+
+
+def document_changes(kind, old, new):
+    """对比JSON数据文件保存前后的内容，生成变更日志条目"""
+    field = KEY_FIELDS[kind]
+    old_rows = {row.get(field): row for row in old}
+    new_rows = {row.get(field): row for row in new}
+    entries = [put_entry(kind, key, row) for key, row in new_rows.items() if old_rows.get(key) != row]
+    entries.extend(delete_entry(kind, key) for key in old_rows if key not in new_rows)
+    return entries
+
+
+def log_json_save(file_path, old, new):
+    kind = logged_kind(file_path)
+    if kind:
+        log_changes(document_changes(kind, old, new))
+
+
+def iter_changes(start=None, end=None, log_path=None):
+    """按写入顺序读取时间在[start, end]内的变更，时间精确到秒即可"""
+    log_path = log_path or change_log_path()
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 进程异常退出时可能留下半行
+            ts = entry.get("ts", "")
+            if start is not None and ts[:len(start)] < start:
+                continue
+            if end is not None and ts[:len(end)] > end:
+                continue
+            yield entry
+
+
+def truncate_changes(before, log_path=None):
+    """删除时间早于before的日志（更早的时间点已没有可用的备份），返回删除条数"""
+    log_path = log_path or change_log_path()
+    if not os.path.exists(log_path):
+        return 0
+    removed = 0
+    tmp_path = log_path + ".tmp"
+    with file_lock(log_path):
+        with open(log_path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                try:
+                    ts = json.loads(line).get("ts", "")
+                except ValueError:
+                    removed += 1
+                    continue
+                if ts[:len(before)] < before:
+                    removed += 1
+                else:
+                    dst.write(line)
+        os.replace(tmp_path, log_path)
+    return removed
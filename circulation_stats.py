@@ -0,0 +1,216 @@
+# circulation_stats.py
+import os
+import json
+import datetime
+import data_utils
+from data_utils import load_json
+from record_store import get_record_store
+from holdings import book_copies
+
+TOP_N = 10
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def loan_seconds(record):
+    """已归还记录的借阅时长（秒），时间格式错误时返回None"""
+    try:
+        borrow_time = datetime.datetime.strptime(record["borrow_time"], TIME_FORMAT)
+        return_time = datetime.datetime.strptime(record["actual_return_time"], TIME_FORMAT)
+    except (KeyError, ValueError):
+        return None
+    return max(0.0, (return_time - borrow_time).total_seconds())
+
+
+class CirculationStats:
+    """流通统计：物化的聚合结果，随借阅、归还、导入增量更新
+
+    聚合项包括每本书、每个借阅人、每个分类、每天的借阅次数，借阅次数最多的前N本书
+    以及平均借阅时长。结果缓存在 circulation_stats.json 中，记录文件被外部整体改写时
+    自动重新统计。
+    """
+
+    def __init__(self, store=None, stats_path=None, books_file=None):
+        self.store = store or get_record_store()
+        self.stats_path = stats_path or os.path.join(os.path.dirname(self.store.file_path), "circulation_stats.json")
+        self.books_file = books_file or data_utils.BOOKS_FILE
+        self.categories = {}  # 图书编号 -> 分类
+        self.title_ids = {}  # 副本条码 -> 图书编号（单本图书的条码即图书编号）
+        self.reset()
+        if not self.load():
+            self.rebuild()
+        self.store.subscribe(self.on_record_event)
+
+    def reset(self):
+        self.total_loans = 0
+        self.open_loans = 0
+        self.returned_loans = 0
+        self.total_loan_seconds = 0.0
+        self.per_book = {}  # 图书编号 -> 借阅次数
+        self.titles = {}  # 图书编号 -> 书名
+        self.per_borrower = {}
+        self.per_category = {}
+        self.per_day = {}  # YYYY-MM-DD -> 借阅次数
+        self.top = []  # [[借阅次数, 图书编号], ...] 按次数降序
+
+    def load_categories(self):
+        books = load_json(self.books_file)
+        self.categories = {b.get("id", ""): b.get("category", "") for b in books}
+        self.title_ids = {c["barcode"]: b.get("id", "") for b in books for c in book_copies(b)}
+
+    def apply_book_delta(self, added, changed, removed):
+        """图书入库、修改或删除后更新分类和副本条码映射，不重新读取图书文件"""
+        for book in removed:
+            book_id = book.get("id", "")
+            self.categories.pop(book_id, None)
+            for copy in book_copies(book):
+                if self.title_ids.get(copy["barcode"]) == book_id:
+                    del self.title_ids[copy["barcode"]]
+        for book in added + changed:
+            book_id = book.get("id", "")
+            self.categories[book_id] = book.get("category", "")
+            for copy in book_copies(book):
+                self.title_ids[copy["barcode"]] = book_id
+
+    def rebuild(self):
+        """流式扫描全部借阅记录重新统计"""
+        self.reset()
+        self.load_categories()
+        for record in self.store.iter_records():
+            self.add_loan(record)
+
+    # ---------- 增量更新 ----------
+
+    def on_record_event(self, event, record, old):
+        if event == "append":
+            self.add_loan(record)
+        elif event == "update":
+            returned = bool(record.get("actual_return_time"))
+            if old.get("actual_return_time"):
+                # 归还时间被清空（撤销归还）或改写时，先扣除原来计入的归还
+                self.remove_return(old, reopened=not returned)
+            if returned:
+                self.add_return(record, opened=not old.get("actual_return_time"))
+        elif event == "reset":
+            self.rebuild()
+
+    def add_loan(self, record):
+        # 多副本图书按图书编号汇总；已删除的图书按记录中的编号计，分类映射随图书变化事件更新
+        book_id = self.title_ids.get(record.get("book_id", ""), record.get("book_id", ""))
+        self.total_loans += 1
+        count = self.per_book.get(book_id, 0) + 1
+        self.per_book[book_id] = count
+        self.titles[book_id] = record.get("book_title", "")
+        borrower = record.get("borrower", "")
+        self.per_borrower[borrower] = self.per_borrower.get(borrower, 0) + 1
+        category = self.categories.get(book_id, "")
+        self.per_category[category] = self.per_category.get(category, 0) + 1
+        day = record.get("borrow_time", "")[:10]
+        self.per_day[day] = self.per_day.get(day, 0) + 1
+        self.update_top(book_id, count)
+        if record.get("actual_return_time"):
+            self.add_return(record, opened=False)
+        else:
+            self.open_loans += 1
+
+    def add_return(self, record, opened=True):
+        if opened:
+            self.open_loans -= 1
+        seconds = loan_seconds(record)
+        if seconds is not None:
+            self.returned_loans += 1
+            self.total_loan_seconds += seconds
+
+    def remove_return(self, record, reopened=True):
+        if reopened:
+            self.open_loans += 1
+        seconds = loan_seconds(record)
+        if seconds is not None:
+            self.returned_loans -= 1
+            self.total_loan_seconds -= seconds
+
+    def update_top(self, book_id, count):
+        """维护借阅次数前N名：次数只增不减，未上榜的书只有超过榜尾时才能进入"""
+        for entry in self.top:
+            if entry[1] == book_id:
+                entry[0] = count
+                break
+        else:
+            if len(self.top) < TOP_N or count > self.top[-1][0]:
+                self.top.append([count, book_id])
+            else:
+                return
+        self.top.sort(key=lambda e: (-e[0], e[1]))
+        del self.top[TOP_N:]
+
+    # ---------- 查询 ----------
+
+    def summary(self):
+        """汇总指标，直接读取物化结果"""
+        average_days = self.total_loan_seconds / self.returned_loans / 86400 if self.returned_loans else 0.0
+        return {
+            "total_loans": self.total_loans,
+            "open_loans": self.open_loans,
+            "returned_loans": self.returned_loans,
+            "average_loan_days": average_days,
+            "books": len(self.per_book),
+            "borrowers": len(self.per_borrower),
+        }
+
+    def top_books(self):
+        """借阅次数最多的图书 [(图书编号, 书名, 次数)]"""
+        return [(book_id, self.titles.get(book_id, ""), count) for count, book_id in self.top]
+
+    def book_loans(self, book_id):
+        return self.per_book.get(book_id, 0)
+
+    def borrower_loans(self, borrower):
+        return self.per_borrower.get(borrower, 0)
+
+    # ---------- 持久化 ----------
+
+    def save(self):
+        """保存物化结果，并记录对应的记录文件状态用于下次校验"""
+        data = {
+            "source": [self.store.size, self.store.mtime_ns],
+            "total_loans": self.total_loans,
+            "open_loans": self.open_loans,
+            "returned_loans": self.returned_loans,
+            "total_loan_seconds": self.total_loan_seconds,
+            "per_book": self.per_book,
+            "titles": self.titles,
+            "per_borrower": self.per_borrower,
+            "per_category": self.per_category,
+            "per_day": self.per_day,
+            "top": self.top,
+        }
+        tmp_path = self.stats_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.stats_path)
+
+    def load(self):
+        """读取缓存的统计结果，记录文件已变化时返回False"""
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.store.sync()
+        if data.get("source") != [self.store.size, self.store.mtime_ns]:
+            return False
+        for name in ("total_loans", "open_loans", "returned_loans", "total_loan_seconds", "per_book", "titles",
+                     "per_borrower", "per_category", "per_day", "top"):
+            setattr(self, name, data[name])
+        self.load_categories()
+        return True
+
+
+_stats = None
+
+
+def get_circulation_stats():
+    """获取进程内共享的流通统计实例"""
+    global _stats
+    if _stats is None:
+        _stats = CirculationStats()
+    return _stats
@@ -0,0 +1,98 @@
+import os
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from cover_store import get_cover_store, LruCache, THUMB_SIZE
+
+LOADER_THREADS = 2  # 后台解码缩略图的线程数，不占满CPU以免影响界面
+
+
+class ThumbnailSignals(QObject):
+    done = pyqtSignal(str, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """在线程池中读取磁盘上的缩略图，没有时由原图生成并保存（QImage可在非界面线程中使用）"""
+
+    def __init__(self, store, name, size, signals):
+        super().__init__()
+        self.store = store
+        self.name = name
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        thumb_path = self.store.thumb_path(self.name, self.size)
+        image = QImage(thumb_path) if thumb_path and os.path.exists(thumb_path) else QImage()
+        if image.isNull():
+            image = self.generate(thumb_path)
+        self.signals.done.emit(self.name, image)
+
+    def generate(self, thumb_path):
+        path = self.store.path_of(self.name)
+        image = QImage(path) if path else QImage()
+        if image.isNull():
+            return image
+        image = image.scaled(self.size[0], self.size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = f"{thumb_path}.{os.getpid()}.tmp"  # 多个终端可能同时生成同一缩略图
+        if image.save(tmp_path, "PNG"):
+            os.replace(tmp_path, thumb_path)
+        return image
+
+
+class CoverLoader(QObject):
+    """封面缩略图的异步加载器
+
+    缩略图在线程池中解码，完成后在界面线程转换为QPixmap放入按字节数限制的LRU缓存，
+    并通过 loaded 信号通知；表格只为可见行请求，滚动后不再可见的排队任务会被取消。
+    """
+    loaded = pyqtSignal(str)
+
+    def __init__(self, store=None, size=THUMB_SIZE, parent=None):
+        super().__init__(parent)
+        self.store = store or get_cover_store()
+        self.size = size
+        self.cache = LruCache()
+        self.pending = {}  # 封面文件名 -> 排队或执行中的任务
+        self.failed = set()  # 无法解码的封面，不再重复加载
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(LOADER_THREADS)
+        self.signals = ThumbnailSignals()
+        self.signals.done.connect(self.on_done)
+
+    def pixmap(self, name):
+        """已缓存的缩略图，没有时返回None（不做任何磁盘读写）"""
+        return self.cache.get(name)
+
+    def request(self, names):
+        """请求一组（当前可见的）封面：已缓存的直接跳过，不在本组中的排队任务取消"""
+        names = {name for name in names if name and name not in self.failed}
+        for name in list(self.pending):
+            if name not in names and self.pool.tryTake(self.pending[name]):
+                del self.pending[name]
+        for name in names:
+            if name in self.cache or name in self.pending:
+                continue
+            task = ThumbnailTask(self.store, name, self.size, self.signals)
+            task.setAutoDelete(False)  # 保留引用以便取消
+            self.pending[name] = task
+            self.pool.start(task)
+
+    def on_done(self, name, image):
+        self.pending.pop(name, None)
+        if image.isNull():
+            self.failed.add(name)
+            return
+        self.cache.put(name, QPixmap.fromImage(image), image.sizeInBytes())
+        self.loaded.emit(name)
+
+
+_cover_loader = None
+
+
+def get_cover_loader():
+    """获取进程内共享的封面加载器（需在创建QApplication之后调用）"""
+    global _cover_loader
+    if _cover_loader is None:
+        _cover_loader = CoverLoader()
+    return _cover_loader
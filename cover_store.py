@@ -0,0 +1,134 @@
+# cover_store.py
+import os
+import re
+import hashlib
+import time
+import shutil
+from collections import OrderedDict
+import data_utils
+
+COVER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+MAX_COVER_BYTES = 10 * 1024 * 1024
+THUMB_SIZE = (36, 48)  # 表格中缩略图的宽、高
+CACHE_BYTES = 32 * 1024 * 1024  # 内存中缩略图缓存的上限（按解码后的像素字节数计算）
+PRUNE_GRACE = 24 * 3600  # 清理时保留最近写入的原图：可能是编辑中尚未保存到图书的封面
+COVER_NAME = re.compile(r"[0-9a-f]{64}\.(jpg|jpeg|png|bmp|gif|webp)$")
+
+
+class CoverStore:
+    """图书封面的内容寻址存储
+
+    图书的 cover 字段保存封面文件名，即内容的SHA-256加扩展名；相同图片只存一份，
+    文件写入后不再修改，因此缩略图可以按 文件名+尺寸 永久缓存在磁盘上，无需失效处理。
+    原图放在 covers/objects/<哈希前两位>/ 下，缩略图放在 covers/thumbs/ 下。
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(data_utils.DATA_DIR, "covers")
+
+    def put(self, file_path):
+        """存入一张图片，返回封面文件名；文件类型或大小不符合要求时抛出ValueError"""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in COVER_EXTENSIONS:
+            raise ValueError(f"不支持的图片格式: {ext or '无扩展名'}")
+        if os.path.getsize(file_path) > MAX_COVER_BYTES:
+            raise ValueError(f"图片不能超过 {MAX_COVER_BYTES // (1024 * 1024)} MB")
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        name = digest.hexdigest() + ext
+        path = self.path_of(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, path)
+        return name
+
+    def path_of(self, name):
+        """封面原图路径，文件名不合法时返回None（防止数据文件中的路径穿越）"""
+        if not name or not COVER_NAME.match(name):
+            return None
+        return os.path.join(self.root, "objects", name[:2], name)
+
+    def thumb_path(self, name, size=THUMB_SIZE):
+        if not name or not COVER_NAME.match(name):
+            return None
+        return os.path.join(self.root, "thumbs", f"{name.split('.')[0]}_{size[0]}x{size[1]}.png")
+
+    def exists(self, name):
+        path = self.path_of(name)
+        return path is not None and os.path.exists(path)
+
+    def prune(self, referenced):
+        """删除不再被任何图书引用的原图和缩略图，返回删除的原图数量"""
+        stems = {name.split('.')[0] for name in referenced if name}
+        removed = 0
+        cutoff = time.time() - PRUNE_GRACE
+        objects_dir = os.path.join(self.root, "objects")
+        for sub in os.listdir(objects_dir) if os.path.isdir(objects_dir) else []:
+            for name in os.listdir(os.path.join(objects_dir, sub)):
+                path = os.path.join(objects_dir, sub, name)
+                if name.split('.')[0] in stems:
+                    continue
+                if os.path.getmtime(path) > cutoff:
+                    stems.add(name.split('.')[0])  # 保留的原图，其缩略图也保留
+                    continue
+                os.remove(path)
+                removed += 1
+        thumbs_dir = os.path.join(self.root, "thumbs")
+        for name in os.listdir(thumbs_dir) if os.path.isdir(thumbs_dir) else []:
+            if name.split('_')[0] not in stems:
+                os.remove(os.path.join(thumbs_dir, name))
+        return removed
+
+
+def covers_in_use(books):
+    return {book.get("cover") for book in books if book.get("cover")}
+
+
+class LruCache:
+    """按总开销限制大小的LRU缓存：超出上限时淘汰最久未使用的条目"""
+
+    def __init__(self, max_cost=CACHE_BYTES):
+        self.max_cost = max_cost
+        self.cost = 0
+        self.entries = OrderedDict()  # 键 -> (值, 开销)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, cost):
+        self.discard(key)
+        self.entries[key] = (value, cost)
+        self.cost += cost
+        while self.cost > self.max_cost and len(self.entries) > 1:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.cost -= evicted
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.cost -= entry[1]
+
+
+_cover_store = None
+
+
+def get_cover_store():
+    """获取进程内共享的封面存储"""
+    global _cover_store
+    if _cover_store is None:
+        _cover_store = CoverStore()
+    return _cover_store
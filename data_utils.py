@@ -6,13 +6,42 @@ import hashlib
 import datetime
 import shutil
 import re
+import time
+import contextlib
+import tarfile
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows 使用 msvcrt 的文件锁
+    fcntl = None
+    import msvcrt
 
 # 数据存储路径
 DATA_DIR = os.path.join(os.getcwd(), "data")
 BOOKS_FILE = os.path.join(DATA_DIR, "books.json")
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 BORROW_RECORDS_FILE = os.path.join(DATA_DIR, "borrow_records.csv")
+HOLDS_FILE = os.path.join(DATA_DIR, "holds.json")
 BACKUP_DIR = os.path.join(os.getcwd(), "backup")
+BACKUP_PREFIX = "library_"
+BACKUP_SUFFIX = ".tar.gz"
+# 备份保留策略：保留最近 BACKUP_KEEP_DAILY 天每天最新的一份，以及最近 BACKUP_KEEP_WEEKLY 周每周最新的一份
+BACKUP_KEEP_DAILY = 7
+BACKUP_KEEP_WEEKLY = 4
+RECORD_FIELDNAMES = ["borrower", "book_id", "book_title", "borrow_time", "due_time", "actual_return_time"]
+
+
+def set_data_dir(base_dir):
+    """切换数据所在的根目录（默认为当前工作目录），供命令行等非界面入口使用"""
+    global DATA_DIR, BOOKS_FILE, USERS_FILE, BORROW_RECORDS_FILE, HOLDS_FILE, BACKUP_DIR
+    base_dir = os.path.abspath(base_dir)
+    DATA_DIR = os.path.join(base_dir, "data")
+    BOOKS_FILE = os.path.join(DATA_DIR, "books.json")
+    USERS_FILE = os.path.join(DATA_DIR, "users.json")
+    BORROW_RECORDS_FILE = os.path.join(DATA_DIR, "borrow_records.csv")
+    HOLDS_FILE = os.path.join(DATA_DIR, "holds.json")
+    BACKUP_DIR = os.path.join(base_dir, "backup")
 
 
 def init_data_dir():
@@ -26,8 +55,7 @@ def init_data_dir():
                 json.dump([], f)
     if not os.path.exists(BORROW_RECORDS_FILE):
         with open(BORROW_RECORDS_FILE, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=["borrower", "book_id", "book_title", "borrow_time", "due_time",
-                                                   "actual_return_time"])
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDNAMES)
             writer.writeheader()
 
 
@@ -36,8 +64,8 @@ def encrypt_password(password):
     return hashlib.md5(password.encode()).hexdigest()
 
 
-def load_json(file_path):
-    """加载JSON文件"""
+def read_json(file_path):
+    """读取JSON文件的原始内容，文件不存在或格式错误时返回空列表"""
     if not os.path.exists(file_path):
         return []
     try:
@@ -47,10 +75,47 @@ def load_json(file_path):
         return []
 
 
-def save_json(file_path, data):
-    """保存JSON文件"""
-    with open(file_path, 'w', encoding='utf-8') as f:
+def write_json(file_path, data):
+    """先写临时文件再原子替换，其他进程不会读到写了一半的文件"""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+
+def load_json(file_path):
+    """加载JSON文件，图书和用户文件中已标记删除（尚未压缩）的行不返回"""
+    from change_log import logged_kind  # 延迟导入，避免与change_log循环引用
+    data = read_json(file_path)
+    if not logged_kind(file_path):
+        return data
+    from tombstones import get_tombstones
+    return get_tombstones(file_path).live(data)
+
+
+def save_json(file_path, data):
+    """保存JSON文件，图书和用户文件的变化同时写入变更日志"""
+    from change_log import logged_kind  # 延迟导入，避免与change_log循环引用
+    if not logged_kind(file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return
+    update_json(file_path, lambda _old: data)
+
+
+def update_json(file_path, update):
+    """在写锁内读取图书或用户文件，由 update(当前数据) 计算新数据并保存，返回新数据
+
+    读取到写入的整个过程持有写锁，多个终端同时导入时不会覆盖彼此的修改。
+    """
+    from change_log import log_json_save
+    from tombstones import get_tombstones
+    with file_lock(file_path):
+        old = load_json(file_path)
+        data = update(old)
+        get_tombstones(file_path).save(data)
+    log_json_save(file_path, old, data)
+    return data
 
 
 def load_csv(file_path):
@@ -84,25 +149,154 @@ def save_csv(file_path, data):
         writer.writerows(data)
 
 
+@contextlib.contextmanager
+def file_lock(file_path, timeout=None):
+    """跨进程写锁，防止多个终端同时写同一个数据文件
+
+    对同名 .lock 文件加操作系统文件锁：持有期间不会因耗时过长被其他进程接管，持有进程
+    异常退出时由系统自动释放。锁文件保留在磁盘上，避免删除后其他进程锁住已删除的文件。
+    timeout 为等待秒数，超时抛出 TimeoutError；默认一直等待。同一进程内不可重入。
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    fd = os.open(file_path + ".lock", os.O_CREAT | os.O_RDWR)
+    try:
+        while not try_lock(fd):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"等待写锁超时: {file_path}")
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            unlock(fd)
+    finally:
+        os.close(fd)
+
+
+def try_lock(fd):
+    """对锁文件加排他锁，已被其他持有者锁住时返回False"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def record_key(record):
+    """借阅记录的唯一键：(借阅人, 图书编号, 借阅时间)"""
+    return record.get("borrower", ""), record.get("book_id", ""), record.get("borrow_time", "")
+
+
+def diff_rows(old, new):
+    """对比两个以主键索引的字典，返回(新增, 修改, 删除)三个行列表"""
+    added = [row for key, row in new.items() if key not in old]
+    changed = [row for key, row in new.items() if key in old and old[key] != row]
+    removed = [row for key, row in old.items() if key not in new]
+    return added, changed, removed
+
+
 def backup_data():
-    """备份数据"""
+    """备份数据，打包压缩为 backup/library_YYYYmmddHHMMSS.tar.gz，返回备份文件路径"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
     date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    backup_dir = os.path.join(BACKUP_DIR, date_str)
-    os.makedirs(backup_dir, exist_ok=True)
-    for file in [BOOKS_FILE, USERS_FILE, BORROW_RECORDS_FILE]:
-        if os.path.exists(file):
-            shutil.copy(file, os.path.join(backup_dir, os.path.basename(file)))
-    return backup_dir
+    backup_path = os.path.join(BACKUP_DIR, f"{BACKUP_PREFIX}{date_str}{BACKUP_SUFFIX}")
+    tmp_path = backup_path + ".tmp"
+    try:
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            from tombstones import tombstone_path
+            for file in [BOOKS_FILE, USERS_FILE]:
+                # 数据文件与其墓碑日志加锁后一起打包，恢复时同样过滤掉已删除的行
+                with file_lock(file):
+                    for path in (file, tombstone_path(file)):
+                        if os.path.exists(path):
+                            tar.add(path, arcname=os.path.basename(path))
+            if os.path.exists(HOLDS_FILE):
+                tar.add(HOLDS_FILE, arcname=os.path.basename(HOLDS_FILE))
+            if os.path.exists(BORROW_RECORDS_FILE):
+                # 借阅记录会被原地修改（归还、续借会移动其后各行），加锁期间只把文件复制到
+                # 临时快照，压缩过程中不占用写锁，打包的内容也不会混入锁外的修改
+                with tempfile.TemporaryFile() as snapshot:
+                    with file_lock(BORROW_RECORDS_FILE):
+                        info = tarfile.TarInfo(os.path.basename(BORROW_RECORDS_FILE))
+                        info.mtime = int(os.stat(BORROW_RECORDS_FILE).st_mtime)
+                        with open(BORROW_RECORDS_FILE, 'rb') as f:
+                            shutil.copyfileobj(f, snapshot)
+                    info.size = snapshot.tell()
+                    snapshot.seek(0)
+                    tar.addfile(info, snapshot)
+        os.replace(tmp_path, backup_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return backup_path
+
+
+def list_backups():
+    """列出全部备份 [(备份时间, 路径)]，按时间从新到旧，兼容旧版按时间命名的备份目录"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    backups = []
+    for name in os.listdir(BACKUP_DIR):
+        stamp = name
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX):
+            stamp = name[len(BACKUP_PREFIX):-len(BACKUP_SUFFIX)]
+        elif not os.path.isdir(os.path.join(BACKUP_DIR, name)):
+            continue
+        try:
+            backups.append((datetime.datetime.strptime(stamp, "%Y%m%d%H%M%S"), os.path.join(BACKUP_DIR, name)))
+        except ValueError:
+            continue
+    backups.sort(reverse=True)
+    return backups
+
+
+def prune_backups(keep_daily=BACKUP_KEEP_DAILY, keep_weekly=BACKUP_KEEP_WEEKLY):
+    """按保留策略清理旧备份，返回被删除的备份路径"""
+    keep = set()
+    days, weeks = set(), set()
+    for stamp, path in list_backups():
+        day, week = stamp.date(), stamp.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            keep.add(path)
+        days.add(day)
+        weeks.add(week)
+    removed = []
+    for _, path in list_backups():
+        if path in keep:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+        removed.append(path)
+    return removed
 
 
 def check_auto_backup():
-    """每日首次启动自动备份"""
-    today = datetime.date.today().strftime("%Y%m%d")
-    backup_flag = os.path.join(DATA_DIR, f"backup_{today}.flag")
-    if not os.path.exists(backup_flag):
+    """每日首次启动自动备份并清理过期备份，可以在后台线程中调用"""
+    today = datetime.date.today()
+    if not any(stamp.date() == today for stamp, _ in list_backups()):
         backup_data()
-        with open(backup_flag, 'w') as f:
-            f.write("")
+    prune_backups()
+    # 早于最旧备份的变更日志已无法用于恢复
+    backups = list_backups()
+    if backups:
+        from change_log import truncate_changes
+        truncate_changes(backups[-1][0].strftime("%Y-%m-%d %H:%M:%S"))
 
 
 def is_valid_phone(phone):
@@ -115,8 +309,16 @@ def is_valid_id_card(id_card):
     return re.match(r'^[1-9]\d{5}(18|19|20)\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])\d{3}[\dXx]$', id_card) is not None
 
 
-def import_data(file_path):
-    """导入已备份的数据记录，与当前数据记录合并去重"""
+def import_data(file_path, operator=""):
+    """导入已备份的数据记录，与当前数据记录合并去重，操作写入审计日志"""
+    from audit_log import audit  # 延迟导入，避免与audit_log循环引用
+    success, message = merge_import(file_path)
+    audit(operator, "import_data", os.path.basename(file_path), detail=message if success else f"失败: {message}")
+    return success, message
+
+
+def merge_import(file_path):
+    """按文件类型合并导入的图书、用户或借阅记录，返回(是否成功, 提示信息)"""
     file_ext = os.path.splitext(file_path)[1].lower()
     if file_ext == '.json':
         # 处理 JSON 文件（如 books.json, users.json）
@@ -125,35 +327,38 @@ def import_data(file_path):
             return False, "导入的文件为空或格式不正确"
 
         if 'id' in data[0]:  # 假设是图书数据
-            current_books = load_json(BOOKS_FILE)
-            current_book_ids = {book['id'] for book in current_books}
-            new_books = [book for book in data if book['id'] not in current_book_ids]
-            current_books.extend(new_books)
-            save_json(BOOKS_FILE, current_books)
+            new_books = []
+
+            def merge_books(current_books):
+                current_book_ids = {book['id'] for book in current_books}
+                new_books[:] = [book for book in data if book['id'] not in current_book_ids]
+                return current_books + new_books
+
+            update_json(BOOKS_FILE, merge_books)
             return True, f"成功导入 {len(new_books)} 本图书"
         elif 'username' in data[0]:  # 假设是用户数据
-            current_users = load_json(USERS_FILE)
-            current_usernames = {user['username'] for user in current_users}
-            new_users = [user for user in data if user['username'] not in current_usernames]
-            current_users.extend(new_users)
-            save_json(USERS_FILE, current_users)
+            new_users = []
+
+            def merge_users(current_users):
+                current_usernames = {user['username'] for user in current_users}
+                new_users[:] = [user for user in data if user['username'] not in current_usernames]
+                return current_users + new_users
+
+            update_json(USERS_FILE, merge_users)
             return True, f"成功导入 {len(new_users)} 个用户"
     elif file_ext == '.csv':
-        # 处理 CSV 文件（如 borrow_records.csv）
-        data = load_csv(file_path)
-        if not data:
+        # 处理 CSV 文件（如 borrow_records.csv）：与当前记录排序归并对账，不整体读入内存
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
             return False, "导入的文件为空或格式不正确"
-
-        # 检查必要的字段是否存在
-        required_fields = ["borrower", "book_id", "borrow_time"]
-        if not all(field in data[0] for field in required_fields):
-            return False, "CSV文件缺少必要字段"
-
-        current_records = load_csv(BORROW_RECORDS_FILE)
-        current_record_keys = {(r['borrower'], r['book_id'], r['borrow_time']) for r in current_records}
-        new_records = [r for r in data if (r['borrower'], r['book_id'], r['borrow_time']) not in current_record_keys]
-        current_records.extend(new_records)
-        save_csv(BORROW_RECORDS_FILE, current_records)
-        return True, f"成功导入 {len(new_records)} 条借阅记录"
+        from reconcile import reconcile_records  # 延迟导入，避免与record_store循环引用
+        try:
+            summary = reconcile_records(file_path)
+        except ValueError as e:
+            return False, str(e)
+        message = (f"成功导入 {summary['inserted']} 条借阅记录，更新 {summary['updated']} 条，"
+                   f"跳过旧版本 {summary['stale']} 条，冲突 {summary['conflicts']} 条")
+        for key, reason in summary["conflict_samples"]:
+            message += f"\n  {key[0]} {key[1]}: {reason}"
+        return True, message
 
     return False, "不支持的文件格式"
\ No newline at end of file
@@ -0,0 +1,165 @@
+# due_scheduler.py
+import os
+import json
+import heapq
+import datetime
+from email.message import EmailMessage
+import data_utils
+from data_utils import file_lock
+from record_store import get_record_store
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+REMIND_BEFORE = datetime.timedelta(days=1)  # 到期前多久发送“明天到期”提醒
+EVENT_LABELS = {"due_soon": "即将到期", "overdue": "已逾期"}
+
+
+class LogFileSink:
+    """提醒写入文本日志，每条一行"""
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or os.path.join(data_utils.DATA_DIR, "notifications.log")
+
+    def send(self, event):
+        line = (f"{event['fire_time']} [{EVENT_LABELS[event['kind']]}] {event['borrower']} "
+                f"《{event['book_title']}》({event['book_id']}) 应还时间 {event['due_time']}\n")
+        with open(self.file_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+class MailOutboxSink:
+    """本地邮件替代：每条提醒生成一封 .eml 邮件放入发件箱目录，由外部程序投递"""
+
+    def __init__(self, outbox_dir=None, sender="library@localhost"):
+        self.outbox_dir = outbox_dir or os.path.join(data_utils.DATA_DIR, "outbox")
+        self.sender = sender
+
+    def send(self, event):
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = f"{event['borrower']}@localhost"
+        msg["Subject"] = f"图书{EVENT_LABELS[event['kind']]}提醒：《{event['book_title']}》"
+        if event["kind"] == "due_soon":
+            body = f"您借阅的《{event['book_title']}》将于 {event['due_time']} 到期，请按时归还或办理续借。"
+        else:
+            body = f"您借阅的《{event['book_title']}》已于 {event['due_time']} 到期，请尽快归还。"
+        msg.set_content(f"{event['borrower']}：\n\n{body}\n")
+        stamp = event["fire_time"].replace("-", "").replace(":", "").replace(" ", "")
+        name = f"{stamp}_{event['kind']}_{event['book_id']}_{event['borrower']}.eml"
+        name = "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+        with open(os.path.join(self.outbox_dir, name), 'wb') as f:
+            f.write(bytes(msg))
+
+
+class DueScheduler:
+    """到期提醒调度：按触发时间把未归还记录放入最小堆
+
+    每条未归还记录对应“明天到期”和“已逾期”两个事件。借阅时入堆 O(log n)；续借和归还
+    只更新记录的当前应还时间 O(1)，堆中的旧事件在弹出时比对后丢弃。轮询时只弹出已到
+    触发时间的堆顶，触发过的时间点保存在 notify_state.json 中，多个终端或重启后不会重复提醒。
+    """
+
+    def __init__(self, store=None, sinks=None, state_path=None):
+        self.store = store or get_record_store()
+        self.sinks = sinks if sinks is not None else [LogFileSink(), MailOutboxSink()]
+        self.state_path = state_path or os.path.join(os.path.dirname(self.store.file_path), "notify_state.json")
+        self.loans = {}  # (图书编号, 借阅时间) -> 应还时间（只含未归还记录）
+        self.heap = []  # [(触发时间, 事件类型, 图书编号, 借阅时间, 应还时间)]
+        self.rebuild()
+        self.store.subscribe(self.on_record_event)
+
+    @staticmethod
+    def events_for(key, due_time):
+        """一条记录的提醒事件，应还时间格式错误时不提醒"""
+        try:
+            due = datetime.datetime.strptime(due_time, TIME_FORMAT)
+        except ValueError:
+            return []
+        remind = (due - REMIND_BEFORE).strftime(TIME_FORMAT)
+        return [(remind, "due_soon", key[0], key[1], due_time), (due_time, "overdue", key[0], key[1], due_time)]
+
+    def rebuild(self):
+        """由记录索引中的应还/归还时间重建，无需读取记录文件"""
+        self.loans = {key: meta[1] for key, meta in self.store.meta.items() if not meta[2]}
+        self.heap = [event for key, due_time in self.loans.items() for event in self.events_for(key, due_time)]
+        heapq.heapify(self.heap)
+
+    def schedule(self, key, due_time):
+        self.loans[key] = due_time
+        for event in self.events_for(key, due_time):
+            heapq.heappush(self.heap, event)
+
+    def on_record_event(self, event, record, old):
+        if event == "reset":
+            self.rebuild()
+            return
+        key = (record.get("book_id", ""), record.get("borrow_time", ""))
+        if record.get("actual_return_time"):
+            self.loans.pop(key, None)  # 归还：堆中的事件弹出时丢弃
+        elif self.loans.get(key) != record.get("due_time", ""):
+            # 借阅、续借，或撤销归还（对账导入、修复、恢复清空了归还时间）后重新安排提醒
+            self.schedule(key, record.get("due_time", ""))
+
+    # ---------- 触发 ----------
+
+    def load_last_checked(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("last_checked", "")
+        except (OSError, ValueError):
+            return ""
+
+    def save_last_checked(self, last_checked):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"last_checked": last_checked}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def next_fire_time(self):
+        return self.heap[0][0] if self.heap else None
+
+    def poll(self, now=None):
+        """触发已到时间的提醒并发送到各输出端，返回触发的事件列表
+
+        首次运行时从当前时间开始，不补发历史提醒。
+        """
+        now_str = (now or datetime.datetime.now()).strftime(TIME_FORMAT)
+        self.store.sync()  # 接收其他终端的借还记录
+        fired = []
+        with file_lock(self.state_path):
+            last_checked = self.load_last_checked() or now_str
+            previous = None
+            while self.heap and self.heap[0][0] <= now_str:
+                item = heapq.heappop(self.heap)
+                if item == previous:
+                    continue  # 撤销归还后重新入堆的同一事件
+                previous = item
+                fire_time, kind, book_id, borrow_time, due_time = item
+                if self.loans.get((book_id, borrow_time)) != due_time or fire_time <= last_checked:
+                    continue  # 已归还、已续借，或已由其他终端/上次运行提醒过
+                record = self.store.get(book_id, borrow_time) or {}
+                event = {
+                    "kind": kind,
+                    "fire_time": fire_time,
+                    "borrower": record.get("borrower", ""),
+                    "book_id": book_id,
+                    "book_title": record.get("book_title", ""),
+                    "borrow_time": borrow_time,
+                    "due_time": due_time,
+                }
+                for sink in self.sinks:
+                    sink.send(event)
+                fired.append(event)
+            self.save_last_checked(max(last_checked, now_str))
+        return fired
+
+
+_scheduler = None
+
+
+def get_due_scheduler():
+    """获取进程内共享的到期提醒调度实例"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DueScheduler()
+    return _scheduler
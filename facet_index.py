@@ -0,0 +1,175 @@
+# facet_index.py
+import itertools
+
+FACET_FIELDS = ("category", "location", "publisher")
+
+# 命中数不少于 总数/DENSE_RATIO 的取值缓存为整数位图，其余只保留位序号集合，
+# 避免出版社这类取值很多的字段为每个取值都占用 总数/8 字节的位图
+DENSE_RATIO = 64
+BIT_TABLE = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def popcount(mask):
+    """统计位图中1的个数（int.bit_count 需要Python 3.10，低版本退回字符串计数）"""
+    return mask.bit_count() if hasattr(mask, "bit_count") else bin(mask).count("1")
+
+
+def slots_to_mask(slots):
+    """由位序号集合构造整数位图（先在字节数组上置位，避免大整数反复移位）"""
+    if not slots:
+        return 0
+    bits = bytearray(max(slots) // 8 + 1)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def mask_to_slots(mask):
+    """按从小到大的顺序取出位图中的位序号（借助bin/translate/compress在C层完成扫描）"""
+    bits = bin(mask)[:1:-1].encode().translate(BIT_TABLE)
+    return list(itertools.compress(range(len(bits)), bits))
+
+
+class FacetIndex:
+    """图书分面位图索引
+
+    第i位代表第i本图书，每个字段的取值对应一组位序号，常见取值缓存为整数位图。
+    同一字段内多选取值按“或”合并，不同字段之间按“且”合并，
+    筛选只是整数位运算，计数根据结果大小选择逐值相交或直接统计命中的图书。
+    """
+
+    def __init__(self, books=(), fields=FACET_FIELDS):
+        self.fields = fields
+        self.postings = {field: {} for field in fields}  # 字段 -> {取值: 位序号集合}
+        self.dense = {field: {} for field in fields}  # 字段 -> {取值: 整数位图}
+        self.slots = {}  # 图书编号 -> 位序号
+        self.books = []  # 位序号 -> 图书（已删除为None）
+        self.size = 0
+        self.all_mask = 0
+        for book in books:
+            self.index_slot(len(self.books), book)
+            self.books.append(book)
+        self.size = len(self.slots)
+        self.all_mask = slots_to_mask(self.slots.values())
+
+    def __len__(self):
+        return self.size
+
+    def index_slot(self, slot, book):
+        old = self.slots.get(book.get("id", ""))
+        if old is not None and old != slot:
+            self.remove(book.get("id", ""))
+        self.slots[book.get("id", "")] = slot
+        for field in self.fields:
+            value = book.get(field, "")
+            self.postings[field].setdefault(value, set()).add(slot)
+            self.dense[field].pop(value, None)
+
+    def unindex_slot(self, slot):
+        book = self.books[slot]
+        for field in self.fields:
+            value = book.get(field, "")
+            slots = self.postings[field].get(value)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self.postings[field][value]
+            self.dense[field].pop(value, None)
+
+    def add(self, book):
+        """加入一本图书，已存在则更新"""
+        if book.get("id", "") in self.slots:
+            self.update(book)
+            return
+        slot = len(self.books)
+        self.index_slot(slot, book)
+        self.books.append(book)
+        self.size += 1
+        self.all_mask |= 1 << slot
+
+    def update(self, book):
+        """更新一本图书的分面取值"""
+        slot = self.slots.get(book.get("id", ""))
+        if slot is None:
+            self.add(book)
+            return
+        self.unindex_slot(slot)
+        self.books[slot] = book
+        self.index_slot(slot, book)
+
+    def remove(self, book_id):
+        """移除一本图书（位序号不复用，保持原有顺序）"""
+        slot = self.slots.pop(book_id, None)
+        if slot is None:
+            return
+        self.unindex_slot(slot)
+        self.books[slot] = None
+        self.size -= 1
+        self.all_mask &= ~(1 << slot)
+
+    def mask_of(self, book_ids):
+        """由图书编号集合构造位图"""
+        return slots_to_mask([self.slots[i] for i in book_ids if i in self.slots])
+
+    def value_mask(self, field, value):
+        mask = self.dense[field].get(value)
+        if mask is None:
+            slots = self.postings[field].get(value, ())
+            mask = slots_to_mask(slots)
+            if len(slots) * DENSE_RATIO >= len(self.books):
+                self.dense[field][value] = mask
+        return mask
+
+    def field_mask(self, field, values):
+        """字段内多个取值按“或”合并"""
+        mask = 0
+        sparse = []
+        for value in values:
+            slots = self.postings[field].get(value, ())
+            if value in self.dense[field] or len(slots) * DENSE_RATIO >= len(self.books):
+                mask |= self.value_mask(field, value)
+            else:
+                sparse.extend(slots)
+        return mask | slots_to_mask(sparse)
+
+    def match(self, selections, base=None, skip_field=None):
+        """按选择条件 {字段: 取值集合} 筛选，返回结果位图；base 为预先筛选的位图（如可借图书）"""
+        mask = self.all_mask if base is None else base & self.all_mask
+        for field, values in selections.items():
+            if values and field != skip_field and field in self.postings:
+                mask &= self.field_mask(field, values)
+        return mask
+
+    def counts(self, selections, base=None):
+        """计算各字段每个取值的命中数量；某字段的计数不受该字段自身选择的影响"""
+        result = {}
+        for field in self.fields:
+            postings = self.postings[field]
+            mask = self.match(selections, base, skip_field=field)
+            if mask == self.all_mask:
+                result[field] = {value: len(slots) for value, slots in postings.items()}
+            elif popcount(mask) * 4 < self.size:
+                # 结果较少时直接统计命中图书的取值
+                counts = dict.fromkeys(postings, 0)
+                for slot in mask_to_slots(mask):
+                    value = self.books[slot].get(field, "")
+                    counts[value] += 1
+                result[field] = counts
+            else:
+                bits = bin(mask)[:1:-1].encode().translate(BIT_TABLE)
+                counts = {}
+                for value, slots in postings.items():
+                    if value in self.dense[field] or len(slots) * DENSE_RATIO >= len(self.books):
+                        counts[value] = popcount(self.value_mask(field, value) & mask)
+                    else:
+                        counts[value] = sum(1 for slot in slots if slot < len(bits) and bits[slot])
+                result[field] = counts
+        return result
+
+    def books_in(self, mask):
+        """按位序号顺序取出位图中的图书"""
+        return [self.books[slot] for slot in mask_to_slots(mask)]
+
+    def accepts(self, book, selections):
+        """判断单本图书是否满足选择条件"""
+        return all(not values or book.get(field, "") in values for field, values in selections.items())
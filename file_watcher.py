@@ -0,0 +1,153 @@
+# file_watcher.py
+import os
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+from data_utils import DATA_DIR, BOOKS_FILE, USERS_FILE, BORROW_RECORDS_FILE, load_json, record_key, diff_rows
+from record_store import get_record_store
+from tombstones import TombstoneLog
+
+
+class DataFileWatcher(QObject):
+    """监视data目录下的数据文件，只读取变化部分，并以行级差异(新增, 修改, 删除)通知各标签页
+
+    借阅记录不另存副本：文件变化后由记录存储按更新日志同步，监视器收集存储的
+    append/update 事件作为增量；文件被整体重写时发出 records_reset。
+    """
+    books_changed = pyqtSignal(list, list, list)
+    users_changed = pyqtSignal(list, list, list)
+    records_changed = pyqtSignal(list, list, list)
+    records_reset = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.books = {}  # 图书编号 -> 图书
+        self.users = {}  # 用户名 -> 用户
+        self.added_records = {}  # 记录键 -> 上次通知后新增的记录
+        self.changed_records = {}  # 记录键 -> 上次通知后被修改的记录
+        self.records_were_reset = False
+        self.file_stats = {}
+        self.pending = set()
+        # 图书/用户删除只追加墓碑日志，监视器自己读取日志，得到删除/撤销的增量
+        self.tombstones = {BOOKS_FILE: TombstoneLog(BOOKS_FILE), USERS_FILE: TombstoneLog(USERS_FILE)}
+        for log in self.tombstones.values():
+            log.refresh()
+
+        # 合并短时间内的多次写入事件，避免重复读取
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(200)
+        self.timer.timeout.connect(self.process_pending)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+
+        self.reload_books()
+        self.reload_users()
+        self.store = get_record_store()
+        self.store.subscribe(self.on_record_event)
+        self.watch_files()
+
+    def watch_files(self):
+        """（重新）注册监视路径，文件被替换后需要重新添加"""
+        watched = set(self.watcher.files())
+        for path in (BOOKS_FILE, USERS_FILE, BORROW_RECORDS_FILE) + self.tombstone_paths():
+            if path not in watched and os.path.exists(path):
+                self.watcher.addPath(path)
+        if DATA_DIR not in self.watcher.directories():
+            self.watcher.addPath(DATA_DIR)
+
+    def tombstone_paths(self):
+        return tuple(log.path for log in self.tombstones.values())
+
+    def on_file_changed(self, path):
+        self.pending.add(path)
+        self.timer.start()
+
+    def on_directory_changed(self, _path):
+        # 编辑器常用“写临时文件再改名”的方式保存，此时只会收到目录事件
+        self.pending.update((BOOKS_FILE, USERS_FILE, BORROW_RECORDS_FILE) + self.tombstone_paths())
+        self.timer.start()
+
+    def file_stat_changed(self, path):
+        """文件大小或修改时间未变化时跳过处理"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        stat = (st.st_size, st.st_mtime_ns)
+        if self.file_stats.get(path) == stat:
+            return False
+        self.file_stats[path] = stat
+        return True
+
+    def process_pending(self):
+        """处理积压的文件变化事件"""
+        pending, self.pending = self.pending, set()
+        self.watch_files()
+        if BORROW_RECORDS_FILE in pending:
+            # 本进程的写入已由存储事件收集，其他进程的写入在 sync 时按更新日志收集
+            self.store.sync()
+            self.flush_records()
+        for path in pending:
+            if path == BORROW_RECORDS_FILE or not self.file_stat_changed(path):
+                continue
+            if path == BOOKS_FILE:
+                self.emit_delta(self.books_changed, self.reload_books())
+            elif path == USERS_FILE:
+                self.emit_delta(self.users_changed, self.reload_users())
+            elif path == self.tombstones[BOOKS_FILE].path:
+                self.emit_delta(self.books_changed, self.refresh_tombstones(BOOKS_FILE, self.books))
+            elif path == self.tombstones[USERS_FILE].path:
+                self.emit_delta(self.users_changed, self.refresh_tombstones(USERS_FILE, self.users))
+
+    def emit_delta(self, signal, delta):
+        added, changed, removed = delta
+        if added or changed or removed:
+            signal.emit(added, changed, removed)
+
+    def reload_books(self):
+        new = {b.get("id", ""): b for b in load_json(BOOKS_FILE)}
+        delta = diff_rows(self.books, new)
+        self.books = new
+        self.file_stat_changed(BOOKS_FILE)
+        return delta
+
+    def reload_users(self):
+        new = {u.get("username", ""): u for u in load_json(USERS_FILE)}
+        delta = diff_rows(self.users, new)
+        self.users = new
+        self.file_stat_changed(USERS_FILE)
+        return delta
+
+    def refresh_tombstones(self, file_path, rows):
+        """按墓碑日志新追加的删除/撤销得到增量，不重新读取数据文件"""
+        added, removed = [], []
+        for op, key, row in self.tombstones[file_path].refresh():
+            if op == "delete" and key in rows:
+                removed.append(rows.pop(key))
+            elif op == "undo" and key not in rows and row is not None:
+                rows[key] = row
+                added.append(row)
+        return added, [], removed
+
+    def on_record_event(self, event, record, old):
+        if event == "reset":
+            self.records_were_reset = True
+            self.added_records, self.changed_records = {}, {}
+            return
+        key = record_key(record)
+        if event == "append" or key in self.added_records:
+            self.added_records[key] = record
+        else:
+            self.changed_records[key] = record
+
+    def flush_records(self):
+        """通知积累的借阅记录增量"""
+        if self.records_were_reset:
+            self.records_were_reset = False
+            self.added_records, self.changed_records = {}, {}
+            self.records_reset.emit()
+            return
+        added, changed = list(self.added_records.values()), list(self.changed_records.values())
+        self.added_records, self.changed_records = {}, {}
+        self.emit_delta(self.records_changed, (added, changed, []))
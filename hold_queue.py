@@ -0,0 +1,220 @@
+# hold_queue.py
+import os
+import json
+import heapq
+import datetime
+from collections import deque
+import data_utils
+from data_utils import file_lock
+
+HOLD_PICKUP_DAYS = 3  # 图书归还后为预约读者保留的天数
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class HoldQueue:
+    """图书预约：每本书一个先进先出的预约队列
+
+    每归还一个副本自动分配给队首读者并保留 HOLD_PICKUP_DAYS 天，到期未取则顺延给下一位；
+    多副本图书可同时有多位待取读者，但不超过可借副本数。
+    待取预约的到期时间保存在最小堆中，处理到期只弹出已到期的堆顶，每个事件 O(log n)；
+    取书或取消后堆中的旧条目不立即删除，弹出时与当前待取预约比对后丢弃。
+    数据保存在 holds.json 中，每次修改前检查文件是否被其他终端改过。
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = os.path.abspath(file_path or data_utils.HOLDS_FILE)
+        self.queues = {}  # 图书编号 -> deque([{"borrower", "placed_time"}, ...])
+        self.ready = {}  # 图书编号 -> [{"borrower", "placed_time", "ready_time", "expire_time"}, ...]
+        self.heap = []  # [(到期时间, 图书编号, 借阅人)]
+        self.stat = None
+        self.load()
+
+    # ---------- 持久化 ----------
+
+    def file_stat(self):
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def load(self):
+        """读取预约数据并由待取预约重建到期堆"""
+        self.queues, self.ready = {}, {}
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        for book_id, holds in data.get("queues", {}).items():
+            if holds:
+                self.queues[book_id] = deque(holds)
+        for book_id, holds in data.get("ready", {}).items():
+            # 旧版本每本书只保存一个待取预约
+            holds = [holds] if isinstance(holds, dict) else holds
+            if holds:
+                self.ready[book_id] = holds
+        self.heap = [(h["expire_time"], book_id, h["borrower"]) for book_id, holds in self.ready.items() for h in holds]
+        heapq.heapify(self.heap)
+        self.stat = self.file_stat()
+
+    def save(self):
+        data = {
+            "queues": {book_id: list(holds) for book_id, holds in self.queues.items()},
+            "ready": self.ready,
+        }
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.file_path)
+        self.stat = self.file_stat()
+
+    def sync(self):
+        """其他终端修改过预约文件时重新读取"""
+        if self.file_stat() != self.stat:
+            self.load()
+
+    # ---------- 查询 ----------
+
+    def reserved_for(self, book_id):
+        """图书当前为哪些读者保留（每位读者占一个可借副本），没有返回空列表"""
+        self.sync()
+        return [hold["borrower"] for hold in self.ready.get(book_id, ())]
+
+    def find_ready(self, book_id, borrower):
+        """读者在该书上的待取预约，没有返回None"""
+        for hold in self.ready.get(book_id, ()):
+            if hold["borrower"] == borrower:
+                return hold
+        return None
+
+    def queue_length(self, book_id):
+        self.sync()
+        return len(self.queues.get(book_id, ()))
+
+    def position(self, book_id, borrower):
+        """读者在队列中的位置（从1开始），待取返回0，未预约返回None"""
+        self.sync()
+        if self.find_ready(book_id, borrower):
+            return 0
+        for i, h in enumerate(self.queues.get(book_id, ()), 1):
+            if h["borrower"] == borrower:
+                return i
+        return None
+
+    def all_holds(self):
+        """全部预约 [(图书编号, 预约信息, 状态)]，状态为0表示待取，否则为排队位置"""
+        self.sync()
+        result = [(book_id, hold, 0) for book_id, holds in self.ready.items() for hold in holds]
+        for book_id, holds in self.queues.items():
+            result.extend((book_id, hold, i) for i, hold in enumerate(holds, 1))
+        return result
+
+    # ---------- 修改 ----------
+
+    def place(self, book_id, borrower, now=None):
+        """加入预约队列，返回排队位置；已预约过该书时返回None"""
+        with file_lock(self.file_path):
+            self.sync()
+            if self.position(book_id, borrower) is not None:
+                return None
+            now = now or datetime.datetime.now()
+            self.queues.setdefault(book_id, deque()).append(
+                {"borrower": borrower, "placed_time": now.strftime(TIME_FORMAT)})
+            self.save()
+            return len(self.queues[book_id])
+
+    def cancel(self, book_id, borrower, now=None):
+        """取消预约；取消的是待取预约时顺延给下一位，返回新分配的预约"""
+        with file_lock(self.file_path):
+            self.sync()
+            hold = self.find_ready(book_id, borrower)
+            assigned = None
+            if hold:
+                self.remove_ready(book_id, hold)
+                assigned = self.assign(book_id, now or datetime.datetime.now())
+            else:
+                holds = self.queues.get(book_id)
+                if holds:
+                    self.queues[book_id] = deque(h for h in holds if h["borrower"] != borrower)
+                    if not self.queues[book_id]:
+                        del self.queues[book_id]
+            self.save()
+            return assigned
+
+    def on_return(self, book_id, now=None, available=None):
+        """图书归还一个副本：分配给队首读者，返回分配的预约，无人预约返回None
+
+        available 为归还后的可借副本数，待取预约已占满可借副本时不再分配。
+        """
+        with file_lock(self.file_path):
+            self.sync()
+            if available is not None and len(self.ready.get(book_id, ())) >= available:
+                return None
+            assigned = self.assign(book_id, now or datetime.datetime.now())
+            if assigned:
+                self.save()
+            return assigned
+
+    def fulfil(self, book_id, borrower):
+        """读者借走为其保留的图书，返回是否有对应的待取预约"""
+        with file_lock(self.file_path):
+            self.sync()
+            hold = self.find_ready(book_id, borrower)
+            if not hold:
+                return False
+            self.remove_ready(book_id, hold)
+            self.save()
+            return True
+
+    def expire(self, now=None):
+        """处理已到期未取的预约并顺延，返回 [(图书编号, 过期预约, 新分配的预约或None)]"""
+        now = now or datetime.datetime.now()
+        now_str = now.strftime(TIME_FORMAT)
+        self.sync()
+        if not self.heap or self.heap[0][0] > now_str:
+            return []
+        with file_lock(self.file_path):
+            self.sync()
+            expired = []
+            while self.heap and self.heap[0][0] <= now_str:
+                expire_time, book_id, borrower = heapq.heappop(self.heap)
+                hold = self.find_ready(book_id, borrower)
+                if not hold or hold["expire_time"] != expire_time:
+                    continue  # 已取书或已取消
+                self.remove_ready(book_id, hold)
+                expired.append((book_id, hold, self.assign(book_id, now)))
+            if expired:
+                self.save()
+            return expired
+
+    def assign(self, book_id, now):
+        """将图书保留给队首读者并加入到期堆（调用方持有写锁）"""
+        holds = self.queues.get(book_id)
+        if not holds:
+            return None
+        hold = dict(holds.popleft())
+        if not holds:
+            del self.queues[book_id]
+        hold["ready_time"] = now.strftime(TIME_FORMAT)
+        hold["expire_time"] = (now + datetime.timedelta(days=HOLD_PICKUP_DAYS)).strftime(TIME_FORMAT)
+        self.ready.setdefault(book_id, []).append(hold)
+        heapq.heappush(self.heap, (hold["expire_time"], book_id, hold["borrower"]))
+        return hold
+
+    def remove_ready(self, book_id, hold):
+        holds = self.ready[book_id]
+        holds.remove(hold)
+        if not holds:
+            del self.ready[book_id]
+
+
+_holds = None
+
+
+def get_hold_queue():
+    """获取进程内共享的预约队列实例"""
+    global _holds
+    if _holds is None:
+        _holds = HoldQueue()
+    return _holds
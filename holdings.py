@@ -0,0 +1,172 @@
+# holdings.py
+import re
+import data_utils
+from data_utils import load_json
+from record_store import get_record_store
+
+COPY_STATUS_NORMAL = "正常"
+COPY_STATUSES = (COPY_STATUS_NORMAL, "维修", "遗失", "剔除")  # 非“正常”状态的副本不可借
+
+
+def book_copies(book):
+    """图书的副本列表 [{"barcode", "status"}]；未登记副本的图书视为条码等于图书编号的单个副本"""
+    copies = book.get("copies")
+    if copies:
+        return copies
+    return [{"barcode": book.get("id", ""), "status": COPY_STATUS_NORMAL}]
+
+
+def parse_copies(text):
+    """解析副本条码输入，如“B1-1, B1-2:维修”，返回副本列表；状态不合法时抛出ValueError"""
+    copies = []
+    for token in re.split(r'[,，;；\s]+', text.strip()):
+        if not token:
+            continue
+        barcode, _, status = token.partition(":")
+        status = status or COPY_STATUS_NORMAL
+        if status not in COPY_STATUSES:
+            raise ValueError(f"副本 {barcode} 的状态“{status}”无效，可选: {'、'.join(COPY_STATUSES)}")
+        copies.append({"barcode": barcode, "status": status})
+    return copies
+
+
+def format_copies(copies):
+    return ", ".join(c["barcode"] if c.get("status", COPY_STATUS_NORMAL) == COPY_STATUS_NORMAL
+                     else f"{c['barcode']}:{c['status']}" for c in copies)
+
+
+class Holdings:
+    """馆藏副本与可借数量
+
+    一种图书（图书编号）可以有多个副本，借阅记录中的 book_id 为副本条码。每种图书维护
+    当前可借的副本条码集合，借出、归还时随记录存储的事件 O(1) 增减，查询可借数量和
+    “仅显示可借”筛选不需要统计借阅记录。
+    """
+
+    def __init__(self, store=None, books=None):
+        self.store = store or get_record_store()
+        self.copies = {}  # 图书编号 -> [条码, ...]
+        self.copy_title = {}  # 条码 -> 图书编号
+        self.copy_status = {}  # 条码 -> 副本状态
+        self.titles = {}  # 图书编号 -> 书名
+        self.on_loan = {}  # 条码 -> 未归还记录数
+        self.free = {}  # 图书编号 -> {可借条码}
+        self.load_loans()
+        self.set_books(load_json(data_utils.BOOKS_FILE) if books is None else books)
+        self.store.subscribe(self.on_record_event)
+
+    def load_loans(self):
+        """由记录索引中的归还时间统计在借副本，无需读取记录文件"""
+        self.on_loan = {}
+        for (barcode, _), meta in self.store.meta.items():
+            if not meta[2]:
+                self.on_loan[barcode] = self.on_loan.get(barcode, 0) + 1
+
+    def set_books(self, books):
+        self.copies, self.copy_title, self.copy_status, self.free, self.titles = {}, {}, {}, {}, {}
+        for book in books:
+            self.add_book(book)
+
+    def add_book(self, book):
+        """加入或更新一种图书的副本"""
+        book_id = book.get("id", "")
+        self.remove_book(book_id)
+        barcodes = []
+        free = set()
+        for copy in book_copies(book):
+            barcode = copy["barcode"]
+            barcodes.append(barcode)
+            self.copy_title[barcode] = book_id
+            self.copy_status[barcode] = copy.get("status", COPY_STATUS_NORMAL)
+            if self.is_lendable(barcode):
+                free.add(barcode)
+        self.copies[book_id] = barcodes
+        self.free[book_id] = free
+        self.titles[book_id] = book.get("title", "")
+
+    def remove_book(self, book_id):
+        for barcode in self.copies.pop(book_id, ()):
+            if self.copy_title.get(barcode) == book_id:
+                del self.copy_title[barcode]
+                del self.copy_status[barcode]
+        self.free.pop(book_id, None)
+        self.titles.pop(book_id, None)
+
+    def is_lendable(self, barcode):
+        return self.copy_status.get(barcode) == COPY_STATUS_NORMAL and not self.on_loan.get(barcode)
+
+    # ---------- 借还事件 ----------
+
+    def on_record_event(self, event, record, old):
+        if event == "reset":
+            self.load_loans()
+            for book_id, barcodes in self.copies.items():
+                self.free[book_id] = {b for b in barcodes if self.is_lendable(b)}
+            return
+        barcode = record.get("book_id", "")
+        returned = bool(record.get("actual_return_time"))
+        if event == "append" and not returned:
+            self.lend_copy(barcode)
+        elif event == "update" and returned and not old.get("actual_return_time"):
+            self.return_copy(barcode)
+        elif event == "update" and not returned and old.get("actual_return_time"):
+            # 撤销归还（对账导入、修复、恢复清空了归还时间），副本重新计为借出
+            self.lend_copy(barcode)
+
+    def lend_copy(self, barcode):
+        self.on_loan[barcode] = self.on_loan.get(barcode, 0) + 1
+        self.free.get(self.title_of(barcode), set()).discard(barcode)
+
+    def return_copy(self, barcode):
+        count = self.on_loan.get(barcode, 0) - 1
+        if count > 0:
+            self.on_loan[barcode] = count
+        else:
+            self.on_loan.pop(barcode, None)
+        if self.is_lendable(barcode) and barcode in self.copy_title:
+            self.free[self.copy_title[barcode]].add(barcode)
+
+    # ---------- 查询 ----------
+
+    def title_of(self, barcode):
+        """副本所属的图书编号（旧记录中的图书编号原样返回）"""
+        return self.copy_title.get(barcode, barcode)
+
+    def available_count(self, book_id):
+        return len(self.free.get(book_id, ()))
+
+    def copy_count(self, book_id):
+        return len(self.copies.get(book_id, ()))
+
+    def is_available(self, book_id):
+        return bool(self.free.get(book_id))
+
+    def pick_copy(self, book_id):
+        """选择一个可借副本的条码，没有可借副本返回None"""
+        free = self.free.get(book_id)
+        return min(free) if free else None
+
+    def status_text(self, book_id):
+        total = self.copy_count(book_id)
+        available = self.available_count(book_id)
+        if total <= 1:
+            return "在库" if available else "已借出"
+        return f"可借 {available}/{total}"
+
+    def barcode_conflicts(self, book):
+        """与其他图书的编号或副本条码重复的条码"""
+        book_id = book.get("id", "")
+        return [c["barcode"] for c in book_copies(book)
+                if self.copy_title.get(c["barcode"], book_id) != book_id or
+                (c["barcode"] != book_id and c["barcode"] in self.copies)]
+
+
+_holdings = None
+
+
+def get_holdings():
+    """获取进程内共享的馆藏副本实例"""
+    global _holdings
+    if _holdings is None:
+        _holdings = Holdings()
+    return _holdings
@@ -0,0 +1,202 @@
+# integrity.py
+import os
+import re
+import datetime
+import data_utils
+from data_utils import load_json
+from record_export import iter_csv
+from holdings import book_copies
+from reconcile import external_sort
+from change_log import log_changes, put_entry, record_log_key
+from record_store import get_record_store
+from restore import write_records
+
+SAMPLE_SIZE = 10  # 每个类别保留的问题样例数
+REPAIR_LOAN_DAYS = 30  # 修复应还时间早于借阅时间的记录时使用的借期
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+CATEGORIES = {
+    "book_missing_id": "图书缺少编号",
+    "book_duplicate_id": "图书编号重复",
+    "barcode_conflict": "副本条码冲突",
+    "user_duplicate": "用户名重复",
+    "record_duplicate": "借阅记录重复",
+    "record_multiple_open": "同一副本多条未归还记录",
+    "record_bad_time": "时间格式错误",
+    "record_due_before_borrow": "应还时间早于借阅时间",
+    "record_unknown_book": "图书已不存在",
+    "record_unknown_user": "借阅人已不存在",
+}
+# 可自动修复的类别；图书/用户重复需人工处理，已删除的图书和用户保留历史记录，只报告
+REPAIRABLE = ("record_duplicate", "record_multiple_open", "record_due_before_borrow")
+# 仅作提示的类别：删除图书或用户后历史记录照常保留，不算检查失败
+INFORMATIONAL = ("record_unknown_book", "record_unknown_user")
+
+
+class IntegrityReport:
+    """检查结果：每个类别的问题数量和前 SAMPLE_SIZE 条样例，内存占用与问题总数无关"""
+
+    def __init__(self):
+        self.counts = {}
+        self.samples = {}
+        self.drop_rows = set()  # 修复时删除的记录行号（重复记录中除第一条外的）
+        self.duplicate_keys = set()
+        self.patches = {}  # 行号 -> 修复时修改的字段
+        self.repaired = 0
+        self.checked_stat = None  # 检查时记录文件的(大小, 修改时间)，修复前据此确认文件未变
+
+    def add(self, category, message):
+        self.counts[category] = self.counts.get(category, 0) + 1
+        samples = self.samples.setdefault(category, [])
+        if len(samples) < SAMPLE_SIZE:
+            samples.append(message)
+
+    def patch(self, row, **changes):
+        self.patches.setdefault(row, {}).update(changes)
+
+    @property
+    def fixable(self):
+        return len(self.drop_rows) + len(self.patches)
+
+    def __len__(self):
+        """问题数量（不含仅作提示的类别）"""
+        return sum(count for category, count in self.counts.items() if category not in INFORMATIONAL)
+
+    def __iter__(self):
+        """按类别产出 (类别, 名称, 数量, 样例)"""
+        for category, label in CATEGORIES.items():
+            if category in self.counts:
+                yield category, label, self.counts[category], self.samples[category]
+
+
+def file_stat(file_path):
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def row_line(row):
+    return row + 2  # 第一条记录在文件第2行（表头之后）
+
+
+def check_catalog(report):
+    """检查图书和用户，返回 (条码 -> 图书编号, 用户名集合) 供检查借阅记录使用"""
+    barcodes = {}
+    book_ids = set()
+    for book in load_json(data_utils.BOOKS_FILE):
+        book_id = book.get("id", "")
+        if not book_id:
+            report.add("book_missing_id", f"图书缺少编号: {book.get('title', '')}")
+        elif book_id in book_ids:
+            report.add("book_duplicate_id", f"图书编号重复: {book_id}")
+        book_ids.add(book_id)
+        # 副本条码（单本图书的条码即图书编号）在全部图书中唯一
+        for copy in book_copies(book):
+            owner = barcodes.setdefault(copy["barcode"], book_id)
+            if owner != book_id:
+                report.add("barcode_conflict", f"副本条码 {copy['barcode']} 同时属于图书 {owner} 和 {book_id}")
+
+    usernames = set()
+    for user in load_json(data_utils.USERS_FILE):
+        username = user.get("username", "")
+        if username in usernames:
+            report.add("user_duplicate", f"用户名重复: {username}")
+        usernames.add(username)
+    return barcodes, usernames
+
+
+def check_records(report, barcodes, usernames):
+    """顺序读取一遍借阅记录检查逐行规则，同时把 (主键, 行号) 外部排序后找出重复主键
+
+    只在内存中保留图书/用户的哈希索引、未归还记录和发现的问题，记录条数再多也不会
+    整体读入内存。
+    """
+    open_loans = {}  # 条码 -> [(借阅时间, 行号)]，只含未归还记录
+
+    def scan():
+        for row, record in enumerate(iter_csv(data_utils.BORROW_RECORDS_FILE)):
+            line = row_line(row)
+            barcode = record.get("book_id", "")
+            borrower = record.get("borrower", "")
+            borrow_time = record.get("borrow_time", "")
+            due_time = record.get("due_time", "")
+            if barcode not in barcodes:
+                report.add("record_unknown_book", f"第{line}行: 图书 {barcode} 已不存在")
+            if borrower not in usernames:
+                report.add("record_unknown_user", f"第{line}行: 借阅人 {borrower} 已不存在")
+            if not TIME_PATTERN.match(borrow_time) or (due_time and not TIME_PATTERN.match(due_time)):
+                report.add("record_bad_time", f"第{line}行: 借阅时间 {borrow_time} / 应还时间 {due_time}")
+            else:
+                if due_time and due_time < borrow_time:
+                    report.add("record_due_before_borrow", f"第{line}行: {barcode} 借阅 {borrow_time}，应还 {due_time}")
+                    due = datetime.datetime.strptime(borrow_time, TIME_FORMAT) + datetime.timedelta(days=REPAIR_LOAN_DAYS)
+                    report.patch(row, due_time=due.strftime(TIME_FORMAT))
+                # 借阅时间格式错误的记录无法排序，不参与多条未归还记录的修复
+                if not record.get("actual_return_time"):
+                    open_loans.setdefault(barcode, []).append((borrow_time, row))
+            yield {"book_id": barcode, "borrow_time": borrow_time, "row": row}
+
+    # 排序是稳定的，同一主键的记录按文件顺序相邻产出，保留第一条
+    previous = None
+    for entry in external_sort(scan(), ["book_id", "borrow_time", "row"]):
+        key = (entry["book_id"], entry["borrow_time"])
+        if key == previous:
+            report.add("record_duplicate", f"第{row_line(entry['row'])}行: 借阅记录重复 {key[0]} {key[1]}")
+            report.drop_rows.add(entry["row"])
+            report.duplicate_keys.add(key)
+        previous = key
+
+    for barcode, loans in open_loans.items():
+        loans = [loan for loan in loans if loan[1] not in report.drop_rows]
+        if len(loans) <= 1:
+            continue
+        loans.sort()
+        report.add("record_multiple_open", f"图书 {barcode} 同时存在 {len(loans)} 条未归还记录")
+        # 再次借出说明之前已归还：较早的记录以下一次借阅的时间作为归还时间，只保留最近一条未归还
+        for (_, row), (next_borrow_time, _) in zip(loans, loans[1:]):
+            report.patch(row, actual_return_time=next_borrow_time)
+
+
+def repair_records(report):
+    """将可修复的问题流式写入新的记录文件后原子替换，并记入变更日志，返回修复的记录行数"""
+    store = get_record_store()
+    entries = []
+
+    def repaired_rows():
+        for row, record in enumerate(iter_csv(store.file_path)):
+            if row in report.drop_rows:
+                continue
+            changes = report.patches.get(row)
+            if changes:
+                record = dict(record, **changes)
+            # 重复主键保留的那一条同样写入日志，按主键重放时得到修复后的结果
+            if changes or (record.get("book_id", ""), record.get("borrow_time", "")) in report.duplicate_keys:
+                entries.append(put_entry("records", record_log_key(record),
+                                         {name: record.get(name, "") for name in store.fieldnames}))
+            yield record
+
+    with store.locked():
+        if file_stat(store.file_path) != report.checked_stat:
+            raise RuntimeError("借阅记录在检查期间被修改，请重新检查后再修复")
+        write_records(store, repaired_rows())
+        store.rebuild()
+        log_changes(entries)
+    store.notify("reset", None)
+    return report.fixable
+
+
+def check_data(repair=False):
+    """一次流式检查图书、用户和借阅记录的一致性，返回 IntegrityReport（len为0表示通过）
+
+    repair 为 True 时修复重复记录、同一副本多条未归还记录和应还时间早于借阅时间的记录，
+    修复后的记录文件整体原子替换。
+    """
+    report = IntegrityReport()
+    report.checked_stat = file_stat(data_utils.BORROW_RECORDS_FILE)
+    barcodes, usernames = check_catalog(report)
+    check_records(report, barcodes, usernames)
+    if repair and report.fixable:
+        report.repaired = repair_records(report)
+    return report
@@ -0,0 +1,97 @@
+# isbn_index.py
+import re
+
+
+def clean_isbn(raw):
+    """去掉连字符、空格等分隔符，只保留数字和校验位X"""
+    return re.sub(r'[^0-9Xx]', '', raw or "").upper()
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_isbn(raw):
+    """校验ISBN-10/ISBN-13格式及校验位"""
+    isbn = clean_isbn(raw)
+    if re.match(r'^\d{9}[\dX]$', isbn):
+        return isbn10_check_digit(isbn) == isbn[-1]
+    if re.match(r'^97[89]\d{10}$', isbn):
+        return isbn13_check_digit(isbn) == isbn[-1]
+    return False
+
+
+def normalize_isbn(raw):
+    """规范化ISBN：有效的ISBN-10转换为ISBN-13，有效的ISBN-13原样返回；
+    无效的ISBN只去掉分隔符，保证同一写法的不同格式能够精确匹配"""
+    isbn = clean_isbn(raw)
+    if not is_valid_isbn(isbn):
+        return isbn
+    if len(isbn) == 10:
+        isbn = "978" + isbn[:9]
+        isbn += isbn13_check_digit(isbn)
+    return isbn
+
+
+class IsbnIndex:
+    """规范化ISBN哈希索引：ISBN -> 图书编号集合，支持O(1)精确查找和重复/冲突报告
+
+    同一ISBN对应多本图书是正常的多副本情况；若这些图书的书名或作者不一致，
+    则视为冲突（可能录入错误）。
+    """
+
+    def __init__(self, books=()):
+        self.isbn_to_ids = {}  # 规范化ISBN -> {图书编号}
+        self.books = {}  # 图书编号 -> 图书
+        for book in books:
+            self.add(book)
+
+    def add(self, book):
+        """加入或更新一本图书"""
+        book_id = book.get("id", "")
+        if book_id in self.books:
+            self.remove(book_id)
+        self.books[book_id] = book
+        isbn = normalize_isbn(book.get("isbn", ""))
+        if isbn:
+            self.isbn_to_ids.setdefault(isbn, set()).add(book_id)
+
+    def remove(self, book_id):
+        book = self.books.pop(book_id, None)
+        if book is None:
+            return
+        isbn = normalize_isbn(book.get("isbn", ""))
+        ids = self.isbn_to_ids.get(isbn)
+        if ids is not None:
+            ids.discard(book_id)
+            if not ids:
+                del self.isbn_to_ids[isbn]
+
+    def lookup(self, raw):
+        """按ISBN精确查找图书（输入可以是ISBN-10或ISBN-13，带或不带分隔符）"""
+        ids = self.isbn_to_ids.get(normalize_isbn(raw), ())
+        return [self.books[book_id] for book_id in sorted(ids)]
+
+    def conflicts_with(self, book):
+        """返回与该图书ISBN相同但书名或作者不同的已有图书"""
+        return [b for b in self.lookup(book.get("isbn", "")) if b.get("id") != book.get("id") and
+                (b.get("title", ""), b.get("author", "")) != (book.get("title", ""), book.get("author", ""))]
+
+    def report(self):
+        """ISBN重复报告：[(规范化ISBN, 图书列表, 是否冲突)]，冲突项排在前面"""
+        result = []
+        for isbn, ids in self.isbn_to_ids.items():
+            if len(ids) < 2:
+                continue
+            books = [self.books[book_id] for book_id in sorted(ids)]
+            conflict = len({(b.get("title", ""), b.get("author", "")) for b in books}) > 1
+            result.append((isbn, books, conflict))
+        result.sort(key=lambda item: (not item[2], item[0]))
+        return result
@@ -0,0 +1,288 @@
+# library_cli.py
+"""图书管理系统命令行入口，供定时任务等无界面场景使用（不导入Qt）
+
+用法示例：
+    python -m library_cli backup
+    python -m library_cli import backup/books.json
+    python -m library_cli check --repair
+    python -m library_cli export records.csv.gz --keyword 张三
+    python -m library_cli report --top 20
+    python -m library_cli renew-all --borrower 张三 --dry-run
+    python -m library_cli recommend B0001 --top 5
+    python -m library_cli compact
+    python -m library_cli bench-checkout --records 1000000
+    python -m library_cli load-test --workers 8 --duration 30
+"""
+import sys
+import json
+import getpass
+import argparse
+import datetime
+import data_utils
+from audit_log import audit
+
+
+def cli_operator():
+    """命令行操作在审计日志中记为“cli:系统用户名”"""
+    return f"cli:{getpass.getuser()}"
+
+
+def cmd_import(args):
+    success, message = data_utils.import_data(args.file, operator=cli_operator())
+    print(message)
+    return 0 if success else 1
+
+
+def cmd_backup(args):
+    print(f"数据已备份至: {data_utils.backup_data()}")
+    if not args.no_prune:
+        for path in data_utils.prune_backups():
+            print(f"已清理过期备份: {path}")
+    return 0
+
+
+def cmd_check(args):
+    from integrity import INFORMATIONAL, REPAIRABLE, check_data
+    try:
+        report = check_data(repair=args.repair)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for category, label, count, samples in report:
+        hint = "（可用 --repair 修复）" if category in REPAIRABLE and not args.repair else ""
+        hint = "（仅提示）" if category in INFORMATIONAL else hint
+        print(f"[{label}] {count} 个{hint}")
+        for message in samples:
+            print(f"    {message}")
+        if count > len(samples):
+            print(f"    …… 另有 {count - len(samples)} 个")
+    print(f"检查完成，发现 {len(report)} 个问题")
+    if report.repaired:
+        fixed = "，".join(f"{label} {count}" for category, label, count, _ in report if category in REPAIRABLE)
+        audit(cli_operator(), "repair_records", "borrow_records.csv", detail=f"修复 {report.repaired} 条: {fixed}")
+        print(f"已修复 {report.repaired} 条借阅记录")
+    remaining = sum(count for category, _, count, _ in report
+                    if category not in INFORMATIONAL and not (report.repaired and category in REPAIRABLE))
+    return 1 if remaining else 0
+
+
+def cmd_export(args):
+    from record_export import export_records, export_format, iter_csv, match_record
+    from record_store import get_record_store
+    if export_format(args.output) is None:
+        print("不支持的导出格式，请使用 .csv/.csv.gz/.jsonl/.jsonl.gz 扩展名", file=sys.stderr)
+        return 1
+    keyword = args.keyword.lower().strip()
+    store = get_record_store()
+    predicate = (lambda r: match_record(r, keyword)) if keyword else None
+    count = export_records(iter_csv(store.file_path), args.output, store.fieldnames, predicate)
+    print(f"已导出 {count} 条记录至: {args.output}")
+    return 0
+
+
+def cmd_report(args):
+    from circulation_stats import get_circulation_stats
+    from record_store import get_record_store
+    stats = get_circulation_stats()
+    store = get_record_store()
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # 逾期数量直接由记录索引中的应还/归还时间计算，无需读取记录文件
+    overdue = sum(1 for _, due_time, return_time in store.meta.values() if not return_time and due_time and due_time < now)
+    report = dict(stats.summary(), overdue=overdue,
+                  top_books=[{"book_id": b, "title": t, "loans": n} for b, t, n in stats.top_books()[:args.top]])
+    stats.save()
+    store.save_index()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"累计借阅: {report['total_loans']} 次")
+    print(f"当前在借: {report['open_loans']} 本（逾期 {overdue} 本）")
+    print(f"已归还: {report['returned_loans']} 次，平均借阅时长 {report['average_loan_days']:.1f} 天")
+    print(f"涉及图书: {report['books']} 本，借阅人: {report['borrowers']} 位")
+    print("借阅排行:")
+    for i, book in enumerate(report["top_books"], 1):
+        print(f"  {i:>2}. {book['title']} ({book['book_id']}) - {book['loans']} 次")
+    return 0
+
+
+def cmd_restore(args):
+    from restore import restore_to
+    try:
+        target = datetime.datetime.strptime(args.time, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        print("时间格式应为 YYYY-MM-DD HH:MM:SS", file=sys.stderr)
+        return 1
+    result = restore_to(target)
+    audit(cli_operator(), "restore", result["snapshot"], after=args.time, detail=f"恢复前备份: {result['safety_backup']}")
+    print(f"已从 {result['snapshot']} 的备份重放 {result['replayed']} 条变更")
+    print(f"图书 {result['books']} 本，用户 {result['users']} 个，借阅记录 {result['records']} 条")
+    print(f"恢复前的数据已备份至: {result['safety_backup']}")
+    for problem in result["problems"]:
+        print(f"[校验] {problem}")
+    return 1 if result["problems"] else 0
+
+
+def cmd_renew_all(args):
+    from renewal import bulk_renew
+    plan = bulk_renew(args.borrower, dry_run=args.dry_run)
+    scope = args.borrower or "全部读者"
+    for book_id, borrow_time, borrower, old_due, new_due in plan.items if args.dry_run else ():
+        print(f"{book_id}\t{borrow_time}\t{borrower}\t{old_due} -> {new_due}")
+    skipped = f"；不可续借: {plan.skip_text()}" if plan.skipped else ""
+    if args.dry_run:
+        print(f"{scope}: 可续借 {len(plan)} 条{skipped}（预览，未写入）")
+        return 0
+    audit(cli_operator(), "bulk_renew", scope, detail=f"续借 {plan.renewed} 条{skipped}")
+    print(f"{scope}: 已续借 {plan.renewed} 条{skipped}")
+    return 0
+
+
+def cmd_recommend(args):
+    from recommend import get_co_borrow_index
+    index = get_co_borrow_index()
+    titles = index.holdings.titles
+    if args.book_id not in titles:
+        print(f"未找到图书 {args.book_id}", file=sys.stderr)
+        return 1
+    print(f"借过《{titles[args.book_id]}》的读者还借了:")
+    for i, (book_id, count) in enumerate(index.recommend(args.book_id, args.top), 1):
+        print(f"  {i:>2}. {titles[book_id]} ({book_id}) - {count} 次")
+    return 0
+
+
+def cmd_compact(args):
+    from tombstones import get_tombstones
+    for label, file_path in (("图书", data_utils.BOOKS_FILE), ("用户", data_utils.USERS_FILE)):
+        print(f"{label}: 清理已删除的 {get_tombstones(file_path).compact()} 条")
+    from cover_store import get_cover_store, covers_in_use
+    removed = get_cover_store().prune(covers_in_use(data_utils.load_json(data_utils.BOOKS_FILE)))
+    print(f"封面: 清理未被引用的 {removed} 张")
+    return 0
+
+
+def cmd_bench_checkout(args):
+    from scan_checkout import benchmark, TARGET_MS
+    result = benchmark(args.books, args.users, args.records, args.scans)
+    print(f"数据: 图书 {result['books']} 本，用户 {result['users']} 个，借阅记录 {result['records']} 条"
+          f"（生成耗时 {result['generate_s']:.1f} 秒）")
+    print(f"启动（建立索引）: {result['startup_s'] * 1000:.0f} ms")
+    print(f"扫码 {result['scans']} 次，借出 {result['loans']} 本，失败 {result['errors']} 次，"
+          f"吞吐 {result['throughput']:.0f} 次/秒")
+    print(f"单次耗时: p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms, 最大 {result['max_ms']:.2f} ms")
+    return 0 if result["p99_ms"] < TARGET_MS else 1
+
+
+def parse_mix(text):
+    """解析操作占比，如 "borrow=30,return=25,search=45"，未列出的操作不执行"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def cmd_load_test(args):
+    from load_test import DEFAULT_MIX, run_load_test
+    try:
+        mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    except ValueError:
+        print("--mix 格式应为 操作=权重,...，如 borrow=30,return=25,search=45", file=sys.stderr)
+        return 1
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        print(f"未知的操作: {', '.join(sorted(unknown))}，可选: {', '.join(DEFAULT_MIX)}", file=sys.stderr)
+        return 1
+    report = run_load_test(args.workers, args.duration, mix, args.books, args.users, args.records, args.seed)
+    for message in report["fatal"]:
+        print(f"[进程异常] {message}", file=sys.stderr)
+    print(f"{report['workers']} 个终端并发 {report['duration']:.0f} 秒，总吞吐 {report['throughput']:.1f} 次/秒")
+    for name, op in report["operations"].items():
+        skipped = ", ".join(f"{k} {v}" for k, v in op["outcomes"].items() if k != "ok")
+        print(f"  {name:<7} 成功 {op['ok']:>6} 次 {op['throughput']:>8.1f} 次/秒  p50 {op['p50_ms']:.1f} ms  "
+              f"p95 {op['p95_ms']:.1f} ms  p99 {op['p99_ms']:.1f} ms  最大 {op['max_ms']:.1f} ms"
+              + (f"  ({skipped})" if skipped else ""))
+        for message in op["errors"]:
+            print(f"      {message}")
+    for kind, samples in report["problems"].items():
+        print(f"[{kind}] {len(samples)} 个")
+        for message in samples[:5]:
+            print(f"    {message}")
+    if not report["problems"]:
+        print("未发现丢失的更新或数据损坏")
+    return 1 if report["problems"] or report["fatal"] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="library_cli", description="图书管理系统命令行工具")
+    parser.add_argument("--dir", help="数据根目录（包含data和backup目录），默认为当前目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="导入备份的图书/用户(JSON)或借阅记录(CSV)")
+    p.add_argument("file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("backup", help="备份数据并按保留策略清理旧备份")
+    p.add_argument("--no-prune", action="store_true", help="不清理旧备份")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("check", help="检查数据一致性，有问题时返回非零退出码")
+    p.add_argument("--repair", action="store_true", help="修复重复记录、多条未归还记录和错误的应还时间")
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser("export", help="导出借阅记录（按扩展名选择CSV/JSONL及gzip压缩）")
+    p.add_argument("output")
+    p.add_argument("--keyword", default="", help="只导出书名、借阅人或图书编号包含该关键字的记录")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("report", help="输出流通统计报表")
+    p.add_argument("--top", type=int, default=10, help="借阅排行显示数量")
+    p.add_argument("--json", action="store_true", help="以JSON格式输出")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("restore", help="将数据恢复到指定时间点")
+    p.add_argument("time", help="目标时间，格式 YYYY-MM-DD HH:MM:SS")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser("renew-all", help="按续借规则批量续借未归还的图书（一次写入）")
+    p.add_argument("--borrower", help="只续借该读者的记录，默认全部读者")
+    p.add_argument("--dry-run", action="store_true", help="只列出可续借的记录，不写入")
+    p.set_defaults(func=cmd_renew_all)
+
+    p = sub.add_parser("recommend", help="按共同借阅列出与某本书相关的图书")
+    p.add_argument("book_id")
+    p.add_argument("--top", type=int, default=10, help="显示数量")
+    p.set_defaults(func=cmd_recommend)
+
+    p = sub.add_parser("compact", help="立即压缩图书和用户文件，清理已删除的行（之后不可撤销）及不再使用的封面")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("bench-checkout", help="扫码借书性能测试（在临时目录中生成数据，p99超过50ms时返回非零）")
+    p.add_argument("--books", type=int, default=50000)
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--records", type=int, default=200000)
+    p.add_argument("--scans", type=int, default=2000, help="扫描的图书数量（另有每5本一次的读者扫码）")
+    p.set_defaults(func=cmd_bench_checkout)
+
+    p = sub.add_parser("load-test", help="多终端并发压力测试（临时目录），报告各操作耗时分位数、吞吐以及丢失的更新")
+    p.add_argument("--workers", type=int, default=4, help="并发的终端（进程）数")
+    p.add_argument("--duration", type=float, default=10.0, help="持续时间（秒）")
+    p.add_argument("--mix", help="操作占比，如 borrow=30,return=25,renew=10,search=30,import=5")
+    p.add_argument("--books", type=int, default=5000)
+    p.add_argument("--users", type=int, default=500)
+    p.add_argument("--records", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_load_test)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.dir:
+        data_utils.set_data_dir(args.dir)
+    data_utils.init_data_dir()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
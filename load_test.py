@@ -0,0 +1,263 @@
+# load_test.py
+import os
+import csv
+import json
+import time
+import random
+import datetime
+import tempfile
+import traceback
+import multiprocessing
+import data_utils
+from data_utils import load_json, merge_import
+from record_store import get_record_store
+from holdings import get_holdings
+from search_index import SearchIndex
+from scan_checkout import generate_data, percentile, TIME_FORMAT, LOAN_DAYS
+
+# 各操作的默认占比：借、还、续借、检索、导入图书
+DEFAULT_MIX = {"borrow": 30, "return": 25, "renew": 10, "search": 30, "import": 5}
+IMPORT_BATCH = 5  # 每次导入的新图书数量
+START_DELAY = 2.0  # 各进程完成初始化后统一开始的等待时间（秒）
+MAX_ERROR_SAMPLES = 5
+
+
+class DeskWorker:
+    """模拟一个柜台终端：与图书、借阅标签页使用相同的数据层，按比例随机执行操作
+
+    每个终端只归还/续借自己借出的记录，并记下这些记录及导入的图书最终应有的状态，
+    测试结束后由主进程与数据文件比对，找出丢失的更新。
+    """
+
+    def __init__(self, worker_id, seed=0):
+        self.worker_id = worker_id
+        self.rng = random.Random(seed * 1000 + worker_id)
+        self.store = get_record_store()
+        self.holdings = get_holdings()
+        self.books = load_json(data_utils.BOOKS_FILE)
+        self.usernames = [u["username"] for u in load_json(data_utils.USERS_FILE)]
+        self.search_index = SearchIndex(self.books)
+        self.open_loans = []  # [(条码, 借阅时间)]
+        self.expected = {}  # (条码, 借阅时间) -> 本终端写入的最终记录
+        self.imported = []  # 本终端导入的图书编号
+        self.import_count = 0
+        self.timings = {}  # 操作 -> [耗时ms]
+        self.outcomes = {}  # 操作 -> {结果: 次数}
+        self.errors = {}  # 操作 -> [错误信息]
+
+    def now(self):
+        return datetime.datetime.now().strftime(TIME_FORMAT)
+
+    def borrow(self):
+        self.store.sync()  # 与标签页收到文件变化后的处理相同，先接收其他终端的借还
+        book = self.rng.choice(self.books)
+        barcode = self.holdings.pick_copy(book["id"])
+        if barcode is None:
+            return "unavailable"
+        borrow_time = self.now()
+        if (barcode, borrow_time) in self.expected:
+            return "same_second"  # 同一秒内重复借同一副本会产生重复主键，界面中不会发生
+        due = datetime.datetime.strptime(borrow_time, TIME_FORMAT) + datetime.timedelta(days=LOAN_DAYS)
+        record = {"borrower": self.rng.choice(self.usernames), "book_id": barcode, "book_title": book["title"],
+                  "borrow_time": borrow_time, "due_time": due.strftime(TIME_FORMAT), "actual_return_time": ""}
+        if self.store.lend(record) is None:
+            return "taken"  # 同步后到写入前被其他终端借走，与界面中的处理相同
+        self.open_loans.append((barcode, borrow_time))
+        self.expected[(barcode, borrow_time)] = dict(record)
+        return "ok"
+
+    def return_book(self):
+        if not self.open_loans:
+            return "no_loan"
+        key = self.open_loans.pop(self.rng.randrange(len(self.open_loans)))
+        return_time = self.now()
+        self.store.update(key[0], key[1], actual_return_time=return_time)
+        self.expected[key]["actual_return_time"] = return_time
+        return "ok"
+
+    def renew(self):
+        if not self.open_loans:
+            return "no_loan"
+        key = self.rng.choice(self.open_loans)
+        record = self.expected[key]
+        due = datetime.datetime.strptime(record["due_time"], TIME_FORMAT) + datetime.timedelta(days=15)
+        self.store.update(key[0], key[1], due_time=due.strftime(TIME_FORMAT))
+        record["due_time"] = due.strftime(TIME_FORMAT)
+        return "ok"
+
+    def search(self):
+        title = self.rng.choice(self.books)["title"]
+        start = self.rng.randrange(max(1, len(title) - 1))
+        self.search_index.search(title[start:start + 2])
+        return "ok"
+
+    def import_books(self, tmp_dir):
+        """与界面“导入数据”相同：读取JSON文件，合并后整体写回图书文件"""
+        ids = []
+        for _ in range(IMPORT_BATCH):
+            self.import_count += 1
+            ids.append(f"LT{self.worker_id:03d}-{self.import_count:06d}")
+        path = os.path.join(tmp_dir, f"import_{self.worker_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{"id": book_id, "title": f"导入图书{book_id}", "author": "", "isbn": "", "publisher": "",
+                        "location": "", "category": ""} for book_id in ids], f, ensure_ascii=False)
+        success, message = merge_import(path)
+        if not success:
+            raise RuntimeError(message)
+        self.imported.extend(ids)
+        return "ok"
+
+    def run(self, duration, mix, start_at, tmp_dir):
+        operations = {"borrow": self.borrow, "return": self.return_book, "renew": self.renew,
+                      "search": self.search, "import": lambda: self.import_books(tmp_dir)}
+        names = [name for name in mix if mix[name] > 0]
+        weights = [mix[name] for name in names]
+        time.sleep(max(0.0, start_at - time.time()))
+        begin = time.monotonic()
+        end = begin + duration
+        while time.monotonic() < end:
+            name = self.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                outcome = operations[name]()
+            except Exception as e:
+                outcome = "error"
+                samples = self.errors.setdefault(name, [])
+                if len(samples) < MAX_ERROR_SAMPLES:
+                    samples.append(f"{type(e).__name__}: {e}")
+            elapsed = (time.perf_counter() - started) * 1000
+            counts = self.outcomes.setdefault(name, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == "ok":
+                self.timings.setdefault(name, []).append(elapsed)
+        return {"worker": self.worker_id, "elapsed": time.monotonic() - begin, "timings": self.timings, "outcomes": self.outcomes, "errors": self.errors,
+                "expected": [[key[0], key[1], record] for key, record in self.expected.items()],
+                "imported": self.imported}
+
+
+def worker_main(worker_id, base_dir, duration, mix, seed, start_at, results):
+    """子进程入口（spawn方式启动，需为模块级函数）"""
+    try:
+        data_utils.set_data_dir(base_dir)
+        worker = DeskWorker(worker_id, seed)
+        with tempfile.TemporaryDirectory(prefix="load_import_") as tmp_dir:
+            results.put(worker.run(duration, mix, start_at, tmp_dir))
+    except Exception:
+        results.put({"worker": worker_id, "fatal": traceback.format_exc()})
+
+
+def verify(results):
+    """测试结束后检查数据文件：损坏的行、丢失的更新、重复借出等，返回 {问题: [样例]} 和计数"""
+    problems = {}
+
+    def add(kind, message):
+        samples = problems.setdefault(kind, [])
+        samples.append(message)
+
+    rows = {}
+    with open(data_utils.BORROW_RECORDS_FILE, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if header != data_utils.RECORD_FIELDNAMES:
+            add("corrupt_header", f"表头为 {header}")
+        for line, row in enumerate(reader, 2):
+            if len(row) != len(data_utils.RECORD_FIELDNAMES):
+                add("corrupt_row", f"第{line}行有 {len(row)} 个字段")
+                continue
+            record = dict(zip(data_utils.RECORD_FIELDNAMES, row))
+            key = (record["book_id"], record["borrow_time"])
+            if key in rows:
+                add("duplicate_key", f"第{line}行: {key[0]} {key[1]}")
+            rows[key] = record
+
+    open_loans = {}
+    for record in rows.values():
+        if not record["actual_return_time"]:
+            open_loans[record["book_id"]] = open_loans.get(record["book_id"], 0) + 1
+    for barcode, count in open_loans.items():
+        if count > 1:
+            add("double_checkout", f"副本 {barcode} 有 {count} 条未归还记录")
+
+    for result in results:
+        for barcode, borrow_time, expected in result.get("expected", ()):
+            actual = rows.get((barcode, borrow_time))
+            if actual is None:
+                add("lost_loan", f"终端{result['worker']}: {barcode} {borrow_time} 的借阅记录丢失")
+                continue
+            for field in ("borrower", "due_time", "actual_return_time"):
+                if actual[field] != expected[field]:
+                    add("lost_update", f"终端{result['worker']}: {barcode} {borrow_time} 的 {field} "
+                                       f"应为 {expected[field]!r}，实际为 {actual[field]!r}")
+
+    try:
+        with open(data_utils.BOOKS_FILE, 'r', encoding='utf-8') as f:
+            book_ids = {book.get("id") for book in json.load(f)}
+    except ValueError as e:
+        add("corrupt_books", f"books.json 无法解析: {e}")
+        book_ids = set()
+    for result in results:
+        missing = [book_id for book_id in result.get("imported", ()) if book_id not in book_ids]
+        if missing and "corrupt_books" not in problems:
+            add("lost_import", f"终端{result['worker']}: 导入的 {len(missing)} 本图书丢失，如 {missing[0]}")
+    return problems
+
+
+def summarize(results, wall_time):
+    """合并各进程的耗时，按操作输出次数、分位数和吞吐"""
+    operations = {}
+    for result in results:
+        for name, timings in result.get("timings", {}).items():
+            operations.setdefault(name, {"timings": [], "outcomes": {}, "errors": []})["timings"].extend(timings)
+        for name, counts in result.get("outcomes", {}).items():
+            outcomes = operations.setdefault(name, {"timings": [], "outcomes": {}, "errors": []})["outcomes"]
+            for outcome, count in counts.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+        for name, samples in result.get("errors", {}).items():
+            operations[name]["errors"].extend(samples)
+    summary = {}
+    total = 0
+    for name, data in sorted(operations.items()):
+        timings = sorted(data["timings"])
+        total += len(timings)
+        summary[name] = {
+            "ok": len(timings), "outcomes": data["outcomes"], "errors": data["errors"][:MAX_ERROR_SAMPLES],
+            "throughput": len(timings) / wall_time if wall_time else 0.0,
+            "p50_ms": percentile(timings, 50), "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99), "max_ms": timings[-1] if timings else 0.0,
+        }
+    return summary, (total / wall_time if wall_time else 0.0)
+
+
+def run_load_test(workers=4, duration=10.0, mix=None, books=5000, users=500, records=20000, seed=0):
+    """在临时目录中生成数据，启动 workers 个进程同时对该数据目录执行借还、续借、检索和导入，返回测试报告
+
+    当前进程的数据目录会切换到临时目录，只应在独立进程（命令行）中调用。
+    """
+    mix = mix or DEFAULT_MIX
+    with tempfile.TemporaryDirectory(prefix="load_test_") as base_dir:
+        data_utils.set_data_dir(base_dir)
+        data_utils.init_data_dir()
+        generate_data(data_utils.DATA_DIR, books, users, records, seed)
+        # 预先建立并保存记录偏移索引，各进程启动时直接加载
+        store = get_record_store()
+        store.save_index()
+        store.close_map()
+
+        ctx = multiprocessing.get_context("spawn")
+        results_queue = ctx.Queue()
+        start_at = time.time() + START_DELAY + workers * 0.5
+        processes = [ctx.Process(target=worker_main, args=(i, base_dir, duration, mix, seed, start_at, results_queue))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        results = [results_queue.get() for _ in processes]  # 先取结果再join，避免队列数据未读完时阻塞
+        for process in processes:
+            process.join()
+        wall_time = max((r.get("elapsed", 0.0) for r in results), default=0.0)
+
+        fatal = [r["fatal"] for r in results if "fatal" in r]
+        results = [r for r in results if "fatal" not in r]
+        operations, throughput = summarize(results, wall_time)
+        problems = verify(results)
+    return {"workers": workers, "duration": duration, "operations": operations, "throughput": throughput,
+            "problems": problems, "fatal": fatal}
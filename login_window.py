@@ -5,6 +5,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdi
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 from data_utils import load_json, save_json, USERS_FILE, encrypt_password, is_valid_phone, is_valid_id_card
+from audit_log import audit
 
 
 class LoginWindow(QWidget):
@@ -69,10 +70,12 @@ class LoginWindow(QWidget):
 
         for user in users:
             if user["username"] == username and user["password"] == encrypted_pwd:
+                audit(username, "login", username)
                 QMessageBox.information(self, "成功", f"欢迎回来，{username}！")
                 self.app.show_main_window(user)
                 return
 
+        audit(username, "login_failed", username)
         QMessageBox.critical(self, "错误", "用户名或密码错误")
 
     def show_register(self):
@@ -165,5 +168,6 @@ class RegisterWindow(QWidget):
 
         users.append(new_user)
         save_json(USERS_FILE, users)
+        audit(username, "register", username, after=new_user)
         QMessageBox.information(self, "成功", "注册成功，请登录")
         self.close()
\ No newline at end of file
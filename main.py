@@ -1,10 +1,13 @@
 # main.py
 import sys
 import os
+import threading
 from PyQt5.QtWidgets import QApplication, QMessageBox
+from PyQt5.QtCore import QTimer
 from main_window import MainWindow
 from login_window import LoginWindow
 from data_utils import init_data_dir, check_auto_backup
+from audit_log import audit
 
 # 初始化数据目录
 init_data_dir()
@@ -14,9 +17,10 @@ class LibrarySystem(QApplication):
     def __init__(self, argv):
         super().__init__(argv)
         self.current_user = None
-        self.check_backup()  # 检查自动备份
         self.login_window = LoginWindow(self)
         self.login_window.show()
+        # 界面显示后再在后台线程中检查自动备份，登录不等待备份的磁盘读写
+        QTimer.singleShot(0, self.check_backup)
 
     def handle_current_user_deleted(self):
         """处理当前用户被删除的情况"""
@@ -29,7 +33,8 @@ class LibrarySystem(QApplication):
 
     def check_backup(self):
         """检查每日自动备份"""
-        check_auto_backup()
+        self.backup_thread = threading.Thread(target=check_auto_backup, name="auto-backup", daemon=True)
+        self.backup_thread.start()
 
     def show_main_window(self, user):
         """切换到主窗口"""
@@ -40,6 +45,8 @@ class LibrarySystem(QApplication):
 
     def logout(self):
         """退出到登录界面"""
+        if self.current_user:
+            audit(self.current_user["username"], "logout", self.current_user["username"])
         self.current_user = None
         if hasattr(self, 'main_window'):
             self.main_window.close()
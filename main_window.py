@@ -1,12 +1,47 @@
 # main_window.py
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QTabWidget,
-                             QMenuBar, QMenu, QAction, QMessageBox, QFileDialog)
+                             QMenuBar, QMenu, QAction, QMessageBox, QFileDialog,
+                             QDialog, QLabel, QDateTimeEdit, QDialogButtonBox)
+from PyQt5.QtCore import QDateTime, QTimer
 from PyQt5.QtGui import QIcon
 from book_management import BookManagementTab
 from borrow_management import BorrowManagementTab
 from record_query import RecordQueryTab
 from user_management import UserManagementTab
-from data_utils import backup_data, import_data  # 新增 import_data 函数导入
+from statistics_tab import StatisticsTab
+from circulation_stats import get_circulation_stats
+from file_watcher import DataFileWatcher
+from record_store import get_record_store
+from data_utils import backup_data, import_data, list_backups  # 新增 import_data 函数导入
+from restore import restore_to
+from due_scheduler import get_due_scheduler
+from audit_log import audit, get_audit_log
+from audit_viewer import AuditLogDialog
+
+NOTIFY_INTERVAL = 60 * 1000  # 检查到期提醒的间隔（毫秒）
+
+class RestoreDialog(QDialog):
+    """选择恢复的目标时间"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("恢复到指定时间")
+        layout = QVBoxLayout(self)
+        backups = list_backups()
+        earliest = backups[-1][0].strftime("%Y-%m-%d %H:%M:%S") if backups else "无可用备份"
+        layout.addWidget(QLabel(f"最早可恢复到: {earliest}\n恢复前会自动备份当前数据"))
+        self.time_edit = QDateTimeEdit(QDateTime.currentDateTime())
+        self.time_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        self.time_edit.setCalendarPopup(True)
+        layout.addWidget(self.time_edit)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def target_time(self):
+        return self.time_edit.dateTime().toPyDateTime().replace(microsecond=0)
+
 
 class MainWindow(QMainWindow):
     def __init__(self, app, user):
@@ -43,6 +78,8 @@ class MainWindow(QMainWindow):
         if self.user["role"] == "admin":
             self.user_tab = UserManagementTab(self.handle_current_user_deleted, self.user)
             self.tabs.addTab(self.user_tab, "用户管理")
+            self.stats_tab = StatisticsTab(self.user)
+            self.tabs.addTab(self.stats_tab, "流通统计")
 
         main_layout.addWidget(self.tabs)
 
@@ -55,6 +92,52 @@ class MainWindow(QMainWindow):
         self.record_tab.load_records()
         if self.user["role"] == "admin":
             self.user_tab.load_users()
+            self.stats_tab.load_stats()
+
+        # 监视数据文件，其他终端或外部脚本修改后自动增量刷新
+        self.watcher = DataFileWatcher(self)
+        self.watcher.books_changed.connect(self.on_books_changed)
+        self.watcher.records_changed.connect(self.on_records_changed)
+        self.watcher.records_reset.connect(self.on_records_reset)
+        if self.user["role"] == "admin":
+            self.watcher.users_changed.connect(self.user_tab.apply_user_delta)
+
+        # 到期/逾期提醒：调度器随借还记录增量维护，定时只处理已到触发时间的事件
+        self.due_scheduler = get_due_scheduler()
+        self.notify_timer = QTimer(self)
+        self.notify_timer.timeout.connect(self.due_scheduler.poll)
+        self.notify_timer.start(NOTIFY_INTERVAL)
+        QTimer.singleShot(0, self.due_scheduler.poll)
+
+    def closeEvent(self, event):
+        """关闭窗口时保存借阅记录的偏移索引，下次启动无需重新扫描"""
+        get_record_store().save_index()
+        if self.user["role"] == "admin":
+            get_circulation_stats().save()
+        get_audit_log().flush()
+        super().closeEvent(event)
+
+    def on_books_changed(self, added, changed, removed):
+        """数据文件中的图书发生变化"""
+        self.book_tab.apply_book_delta(added, changed, removed)
+        self.borrow_tab.apply_book_delta(added, changed, removed)
+        if self.user["role"] == "admin":
+            get_circulation_stats().apply_book_delta(added, changed, removed)
+
+    def on_records_changed(self, added, changed, removed):
+        """数据文件中的借阅记录发生变化（可借数量、统计等订阅者已随记录存储同步）"""
+        self.book_tab.apply_record_delta(added, changed, removed)
+        self.borrow_tab.apply_record_delta(added, changed, removed)
+        self.record_tab.apply_record_delta(added, changed, removed)
+        if self.user["role"] == "admin":
+            self.stats_tab.load_stats()
+
+    def on_records_reset(self):
+        """借阅记录文件被整体重写（修复、恢复等）：记录列表已由各标签页的存储监听重新加载，这里刷新可借状态"""
+        self.book_tab.filter_books()
+        self.borrow_tab.refresh_views()
+        if self.user["role"] == "admin":
+            self.stats_tab.load_stats()
 
     def create_menu_bar(self):
         """创建菜单栏"""
@@ -73,6 +156,16 @@ class MainWindow(QMainWindow):
         backup_action.triggered.connect(self.backup_data)
         sys_menu.addAction(backup_action)
 
+        # 按时间点恢复（管理员）
+        if self.user["role"] == "admin":
+            restore_action = QAction("恢复到指定时间", self)
+            restore_action.triggered.connect(self.restore_data)
+            sys_menu.addAction(restore_action)
+
+            audit_action = QAction("审计日志", self)
+            audit_action.triggered.connect(self.show_audit_log)
+            sys_menu.addAction(audit_action)
+
         # 退出登录
         logout_action = QAction("注销登录", self)
         logout_action.triggered.connect(self.logout)
@@ -110,11 +203,48 @@ class MainWindow(QMainWindow):
     def backup_data(self):
         """手动备份数据"""
         try:
-            backup_dir = backup_data()
-            QMessageBox.information(self, "成功", f"数据已备份至:\n{backup_dir}")
+            backup_path = backup_data()
+            QMessageBox.information(self, "成功", f"数据已备份至:\n{backup_path}")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"备份失败:\n{str(e)}")
 
+    def restore_data(self):
+        """将数据恢复到指定时间点：最近的备份加变更日志重放"""
+        dialog = RestoreDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        target = dialog.target_time()
+        if QMessageBox.question(
+                self, "确认恢复",
+                f"确定要将全部数据恢复到 {target:%Y-%m-%d %H:%M:%S} 吗？",
+                QMessageBox.Yes | QMessageBox.No
+        ) != QMessageBox.Yes:
+            return
+        try:
+            result = restore_to(target)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"恢复失败:\n{str(e)}")
+            return
+        audit(self.user["username"], "restore", result["snapshot"], after=target.strftime("%Y-%m-%d %H:%M:%S"),
+              detail=f"恢复前备份: {result['safety_backup']}")
+        # 重新加载数据
+        self.book_tab.load_books()
+        self.borrow_tab.load_available_books()
+        self.record_tab.load_records()
+        self.user_tab.load_users()
+        self.stats_tab.load_stats()
+        message = (f"已从 {result['snapshot']} 的备份重放 {result['replayed']} 条变更\n"
+                   f"图书 {result['books']} 本，用户 {result['users']} 个，借阅记录 {result['records']} 条\n"
+                   f"恢复前的数据已备份至:\n{result['safety_backup']}")
+        if result["problems"]:
+            QMessageBox.warning(self, "恢复完成，校验发现问题", message + "\n\n" + "\n".join(result["problems"]))
+        else:
+            QMessageBox.information(self, "恢复成功", message + "\n\n索引校验通过")
+
+    def show_audit_log(self):
+        """查看管理操作的审计日志"""
+        AuditLogDialog(self).exec_()
+
     def show_about(self):
         QMessageBox.about(self, "关于", "图书管理系统 v1.1\n基于PyQt5开发")
 
@@ -124,7 +254,7 @@ class MainWindow(QMainWindow):
         if not file_path:
             return
         try:
-            success, message = import_data(file_path)
+            success, message = import_data(file_path, operator=self.user["username"])
             if success:
                 QMessageBox.information(self, "成功", message)
                 # 重新加载数据
@@ -133,6 +263,7 @@ class MainWindow(QMainWindow):
                 self.record_tab.load_records()
                 if self.user["role"] == "admin":
                     self.user_tab.load_users()
+                    self.stats_tab.load_stats()
             else:
                 QMessageBox.warning(self, "导入失败", message)
         except Exception as e:
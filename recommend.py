@@ -0,0 +1,104 @@
+# recommend.py
+import heapq
+from collections import deque
+from record_store import get_record_store
+from holdings import get_holdings
+
+WINDOW = 5  # 每位读者最近借阅的图书数，新借的书与窗口内的书计为共同借阅
+TOP_K = 20  # 每本书缓存的近邻数量
+RELATED_COUNT = 5  # 界面中显示的推荐数量
+
+
+class CoBorrowIndex:
+    """“借过这本书的读者还借了”：按读者借阅窗口统计的图书共现稀疏矩阵
+
+    每位读者保留最近借阅的 WINDOW 种图书，借出新书时只与窗口内的书两两加一，
+    每次借阅 O(WINDOW)，不必重新扫描全部记录。矩阵按行存为 {图书: {图书: 次数}}，
+    每本书的前 TOP_K 个近邻缓存起来，行被修改后只标记失效，下次查询时才重新计算。
+    初次建立时按借阅时间遍历记录索引中的借阅人，不读取记录文件。
+    """
+
+    def __init__(self, store=None, holdings=None, window=WINDOW):
+        self.store = store or get_record_store()
+        self.holdings = holdings or get_holdings()
+        self.window = window
+        self.counts = {}  # 图书编号 -> {图书编号: 共同借阅次数}
+        self.recent = {}  # 借阅人 -> 最近借阅的图书编号
+        self.seen = set()  # 已计入的记录键
+        self.top = {}  # 图书编号 -> [(图书编号, 次数)]，按次数降序
+        self.stale = set()  # 近邻缓存已失效的图书
+        self.catch_up()
+        self.store.subscribe(self.on_record_event)
+
+    def catch_up(self):
+        """计入索引中尚未处理的记录（按借阅时间顺序）"""
+        self.store.sync()
+        new_keys = sorted((key for key in self.store.positions if key not in self.seen), key=lambda key: key[1])
+        for key in new_keys:
+            self.add_loan(key, self.store.meta[key][0])
+
+    def add_loan(self, key, borrower):
+        self.seen.add(key)
+        book_id = self.holdings.title_of(key[0])
+        recent = self.recent.get(borrower)
+        if recent is None:
+            recent = self.recent[borrower] = deque(maxlen=self.window)
+        if book_id in recent:
+            # 重复借同一种书不再计数，只移到窗口末尾
+            recent.remove(book_id)
+            recent.append(book_id)
+            return
+        row = self.counts.setdefault(book_id, {})
+        for other in recent:
+            row[other] = row.get(other, 0) + 1
+            other_row = self.counts.setdefault(other, {})
+            other_row[book_id] = other_row.get(book_id, 0) + 1
+            self.stale.add(other)
+        if recent:
+            self.stale.add(book_id)
+        recent.append(book_id)
+
+    def on_record_event(self, event, record, old):
+        if event == "reset":
+            # 文件被整体重写（修复、其他终端原地修改等），只补上新出现的记录
+            self.catch_up()
+        elif event == "append":
+            key = (record.get("book_id", ""), record.get("borrow_time", ""))
+            if key not in self.seen:
+                self.add_loan(key, record.get("borrower", ""))
+
+    def neighbours(self, book_id):
+        """与该书共同借阅次数最多的 TOP_K 本书 [(图书编号, 次数)]"""
+        if book_id in self.stale or book_id not in self.top:
+            row = self.counts.get(book_id, {})
+            # 次数相同时按图书编号排列，结果稳定
+            self.top[book_id] = heapq.nsmallest(TOP_K, row.items(), key=lambda item: (-item[1], item[0]))
+            self.stale.discard(book_id)
+        return self.top[book_id]
+
+    def recommend(self, book_ids, k=RELATED_COUNT, exclude=()):
+        """一本或几本书的相关推荐：合并各书近邻的次数，排除这些书本身、exclude 及已删除的图书"""
+        book_ids = [book_ids] if isinstance(book_ids, str) else list(book_ids)
+        skip = set(book_ids) | set(exclude)
+        scores = {}
+        for book_id in book_ids:
+            for other, count in self.neighbours(book_id):
+                if other not in skip and other in self.holdings.titles:
+                    scores[other] = scores.get(other, 0) + count
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def related_text(self, book_ids, k=RELATED_COUNT, exclude=()):
+        """推荐的书名列表文本，没有推荐时返回空字符串"""
+        titles = [f"《{self.holdings.titles[book_id]}》" for book_id, _ in self.recommend(book_ids, k, exclude)]
+        return "、".join(titles)
+
+
+_co_borrow_index = None
+
+
+def get_co_borrow_index():
+    """获取进程内共享的共同借阅索引（首次使用时建立）"""
+    global _co_borrow_index
+    if _co_borrow_index is None:
+        _co_borrow_index = CoBorrowIndex()
+    return _co_borrow_index
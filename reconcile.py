@@ -0,0 +1,193 @@
+# reconcile.py
+import os
+import csv
+import json
+import heapq
+import codecs
+import tempfile
+from record_store import get_record_store
+
+RUN_SIZE = 50000  # 外部排序时每个有序分段的记录数，决定内存上限
+APPLY_BATCH = 20000  # 新增/修改累积到该数量时写入一次
+MAX_CONFLICT_SAMPLES = 20
+REQUIRED_FIELDS = ("borrower", "book_id", "borrow_time")
+
+
+def sniff_encoding(file_path):
+    """逐块检测CSV编码：能按UTF-8完整解码则为utf-8-sig，否则按gbk读取（兼容WPS等编辑器）"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return 'gbk'
+    return 'utf-8-sig'
+
+
+def read_header(file_path, encoding):
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def iter_rows(file_path, encoding):
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def loan_key(record):
+    """合并时的排序键，与记录存储的主键一致：(图书编号, 借阅时间)"""
+    return record.get("book_id", ""), record.get("borrow_time", "")
+
+
+def external_sort(rows, fieldnames, run_size=RUN_SIZE):
+    """外部排序：每 run_size 条排序后写入临时分段文件，再多路归并，按键顺序逐条产出记录
+
+    内存中最多同时保留一个分段，与文件总大小无关；临时文件在迭代结束后删除。
+    """
+    with tempfile.TemporaryDirectory(prefix="reconcile_") as tmp_dir:
+        run_paths = []
+
+        def flush(run):
+            run.sort(key=loan_key)
+            path = os.path.join(tmp_dir, f"run{len(run_paths)}.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                for record in run:
+                    f.write(json.dumps([record.get(name, "") for name in fieldnames], ensure_ascii=False))
+                    f.write("\n")
+            run_paths.append(path)
+
+        run = []
+        for record in rows:
+            run.append(record)
+            if len(run) >= run_size:
+                flush(run)
+                run = []
+        if run:
+            flush(run)
+
+        def read_run(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield dict(zip(fieldnames, json.loads(line)))
+
+        yield from heapq.merge(*(read_run(path) for path in run_paths), key=loan_key)
+
+
+def resolve(current, incoming):
+    """按规则合并同一笔借阅的两个版本，返回(结果, 需修改的字段或冲突原因)
+
+    结果为 "unchanged"、"update"、"stale"（导入的版本较旧，忽略）或 "conflict"（保留当前版本）。
+    """
+    if current.get("borrower", "") != incoming.get("borrower", ""):
+        return "conflict", f"借阅人不一致: {current.get('borrower', '')} / {incoming.get('borrower', '')}"
+    cur_return = current.get("actual_return_time", "")
+    new_return = incoming.get("actual_return_time", "")
+    cur_due = current.get("due_time", "")
+    new_due = incoming.get("due_time", "")
+    if cur_return and new_return:
+        if cur_return != new_return:
+            return "conflict", f"归还时间不一致: {cur_return} / {new_return}"
+        return "unchanged", None
+    if cur_return:
+        return "stale", None  # 当前已归还，导入的是归还前的版本
+    if new_return:
+        # 导入的版本已归还：补上归还时间，归还前续借过的应还时间一并更新
+        changes = {"actual_return_time": new_return}
+        if new_due > cur_due:
+            changes["due_time"] = new_due
+        return "update", changes
+    if new_due > cur_due:
+        return "update", {"due_time": new_due}  # 都未归还，导入的版本续借过
+    return ("stale" if new_due < cur_due else "unchanged"), None
+
+
+def collapse(records):
+    """合并导入文件中同一笔借阅的多个版本（输入已按键排序），产出(记录, 合并掉的条数, 冲突列表)"""
+    group = None
+    merged = 0
+    conflicts = []
+    for record in records:
+        if group is not None and loan_key(record) == loan_key(group):
+            outcome, detail = resolve(group, record)
+            if outcome == "update":
+                group = dict(group, **detail)
+            elif outcome == "conflict":
+                conflicts.append(detail)
+            merged += 1
+            continue
+        if group is not None:
+            yield group, merged, conflicts
+        group, merged, conflicts = record, 0, []
+    if group is not None:
+        yield group, merged, conflicts
+
+
+def reconcile_records(file_path, store=None, apply=True, run_size=RUN_SIZE):
+    """将导入的借阅记录文件与当前记录对账合并，返回汇总
+
+    两个文件分别外部排序后按键一次顺序归并：只在导入文件中的记录为新增，两边都有的按
+    resolve 的规则更新或记为冲突。新增和修改分批写入，内存占用与文件大小无关。
+    apply 为 False 时只统计不写入。汇总中的 conflict_samples 为前若干个冲突 [(键, 原因)]。
+    """
+    store = store or get_record_store()
+    encoding = sniff_encoding(file_path)
+    header = read_header(file_path, encoding)
+    missing = [field for field in REQUIRED_FIELDS if field not in header]
+    if missing:
+        raise ValueError(f"CSV文件缺少必要字段: {', '.join(missing)}")
+    fieldnames = store.fieldnames
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "stale": 0, "duplicates": 0,
+               "invalid": 0, "conflicts": 0, "conflict_samples": []}
+
+    def add_conflict(key, reason):
+        summary["conflicts"] += 1
+        if len(summary["conflict_samples"]) < MAX_CONFLICT_SAMPLES:
+            summary["conflict_samples"].append((key, reason))
+
+    def valid(record):
+        if record.get("book_id") and record.get("borrow_time"):
+            return True
+        summary["invalid"] += 1
+        return False
+
+    incoming = collapse(external_sort(filter(valid, iter_rows(file_path, encoding)), fieldnames, run_size))
+    current = external_sort(iter_rows(store.file_path, 'utf-8-sig'), fieldnames, run_size)
+
+    inserts, updates = [], {}
+
+    def flush(force=False):
+        if inserts and (force or len(inserts) >= APPLY_BATCH):
+            if apply:
+                store.append_many(inserts)
+            inserts.clear()
+        if updates and (force or len(updates) >= APPLY_BATCH):
+            if apply:
+                store.update_many(updates)
+            updates.clear()
+
+    cur = next(current, None)
+    for record, merged, conflicts in incoming:
+        key = loan_key(record)
+        summary["duplicates"] += merged
+        for reason in conflicts:
+            add_conflict(key, reason)
+        while cur is not None and loan_key(cur) < key:
+            cur = next(current, None)
+        if cur is None or loan_key(cur) != key:
+            inserts.append({name: record.get(name, "") for name in fieldnames})
+            summary["inserted"] += 1
+        else:
+            outcome, detail = resolve(cur, record)
+            if outcome == "update":
+                updates[key] = detail
+                summary["updated"] += 1
+            elif outcome == "conflict":
+                add_conflict(key, detail)
+            else:
+                summary[outcome] += 1
+        flush()
+    current.close()  # 及时删除排序用的临时文件
+    flush(force=True)
+    return summary
@@ -0,0 +1,98 @@
+# record_export.py
+import os
+import io
+import csv
+import gzip
+import json
+from data_utils import RECORD_FIELDNAMES
+
+# 每写满CHUNK_SIZE条记录刷新一次缓冲并报告进度
+CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    ".csv": ("csv", False),
+    ".csv.gz": ("csv", True),
+    ".jsonl": ("jsonl", False),
+    ".jsonl.gz": ("jsonl", True),
+}
+
+
+def export_format(file_path):
+    """按扩展名确定导出格式，返回(格式, 是否压缩)，不支持的扩展名返回None"""
+    name = file_path.lower()
+    for ext in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if name.endswith(ext):
+            return EXPORT_FORMATS[ext]
+    return None
+
+
+def match_record(record, keyword):
+    """借阅记录是否匹配搜索关键字（书名、借阅人或图书编号）"""
+    return (keyword in record.get("book_title", "").lower() or
+            keyword in record.get("borrower", "").lower() or
+            keyword in record.get("book_id", "").lower())
+
+
+def iter_csv(file_path):
+    """逐行读取CSV文件中的记录，不把整个文件读入内存"""
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def export_records(records, file_path, fieldnames=RECORD_FIELDNAMES, predicate=None, progress=None,
+                   should_stop=None, chunk_size=CHUNK_SIZE):
+    """流式导出记录到CSV/JSONL（可gzip压缩），返回导出条数；中途取消返回None
+
+    records 可以是任意可迭代对象（如生成器），predicate 为过滤条件，按块格式化写出，
+    内存占用与导出总量无关。progress 收到的是已扫描的记录数。
+    先写入临时文件，完成后再替换目标文件，取消或出错时不会留下半截文件。
+    """
+    fmt = export_format(file_path)
+    if fmt is None:
+        raise ValueError(f"不支持的导出格式: {os.path.basename(file_path)}")
+    fmt, compressed = fmt
+    tmp_path = file_path + ".tmp"
+    if compressed:
+        f = gzip.open(tmp_path, 'wt', encoding='utf-8', newline='')
+    else:
+        f = open(tmp_path, 'w', encoding='utf-8', newline='')
+    scanned = 0
+    count = 0
+    finished = False
+    try:
+        with f:
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
+            if fmt == "csv":
+                writer.writeheader()
+            for record in records:
+                scanned += 1
+                if predicate is None or predicate(record):
+                    if fmt == "csv":
+                        writer.writerow(record)
+                    else:
+                        buf.write(json.dumps({name: record.get(name, "") for name in fieldnames}, ensure_ascii=False))
+                        buf.write("\n")
+                    count += 1
+                if scanned % chunk_size == 0:
+                    f.write(buf.getvalue())
+                    buf.seek(0)
+                    buf.truncate()
+                    if progress:
+                        progress(scanned)
+                    if should_stop and should_stop():
+                        break
+            else:
+                f.write(buf.getvalue())
+                finished = True
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    if not finished:
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, file_path)
+    if progress:
+        progress(scanned)
+    return count
@@ -1,16 +1,106 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
                              QPushButton, QTableWidget, QTableWidgetItem,
-                             QHeaderView, QMessageBox, QFileDialog)
-from data_utils import load_csv, save_csv
+                             QHeaderView, QMessageBox, QFileDialog, QLabel, QProgressDialog,
+                             QCheckBox, QComboBox, QDateEdit)
+from PyQt5.QtCore import QThread, pyqtSignal, Qt, QDate
+import datetime
+from data_utils import record_key
+from record_store import get_record_store
+from record_export import export_records, export_format, iter_csv, match_record
+from sort_index import SortIndex, SortState, collation_key
 
 BORROW_RECORDS_FILE = 'data/borrow_records.csv'
+EXPORT_FILTERS = {
+    "CSV文件 (*.csv)": ".csv",
+    "CSV压缩文件 (*.csv.gz)": ".csv.gz",
+    "JSON Lines文件 (*.jsonl)": ".jsonl",
+    "JSON Lines压缩文件 (*.jsonl.gz)": ".jsonl.gz",
+}
+# 可按日期筛选的字段：名称 -> (记录字段, 表格列号)
+DATE_FIELDS = {
+    "借阅时间": ("borrow_time", 3),
+    "应还时间": ("due_time", 4),
+    "归还时间": ("actual_return_time", 5),
+}
+DATE_PRESETS = ["自定义", "今天", "本周", "上周", "本月", "上月"]
+
+
+def preset_range(preset, today):
+    """快捷日期范围，返回(起始日期, 结束日期)，均包含在内"""
+    if preset == "今天":
+        return today, today
+    if preset in ("本周", "上周"):
+        start = today - datetime.timedelta(days=today.weekday())
+        if preset == "上周":
+            start -= datetime.timedelta(days=7)
+        return start, start + datetime.timedelta(days=6)
+    first = today.replace(day=1)
+    if preset == "上月":
+        end = first - datetime.timedelta(days=1)
+        return end.replace(day=1), end
+    next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first, next_month - datetime.timedelta(days=1)
+
+
+def date_bounds(start, end):
+    """把包含两端的日期范围换成时间字符串的半开区间 [low, high)
+
+    记录中的时间为“YYYY-MM-DD HH:MM:SS”，按字符串比较即按时间先后，
+    “2025-07-01” 小于当天的任何时间，“2025-08-01” 大于7月31日的任何时间。
+    """
+    return start.strftime("%Y-%m-%d"), (end + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class ExportWorker(QThread):
+    """后台流式导出借阅记录：直接逐行读取记录文件并按关键字过滤，不经过界面中的记录列表"""
+    progress = pyqtSignal(int)
+    succeeded = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, source_path, file_path, fieldnames, keyword="", date_range=None):
+        super().__init__()
+        self.source_path = source_path
+        self.file_path = file_path
+        self.fieldnames = fieldnames
+        self.keyword = keyword
+        self.date_range = date_range  # (记录字段, low, high)，None表示不按日期筛选
+
+    def matches(self, record):
+        if self.date_range:
+            field, low, high = self.date_range
+            if not low <= record.get(field, "") < high:
+                return False
+        return not self.keyword or match_record(record, self.keyword)
+
+    def run(self):
+        predicate = self.matches if self.keyword or self.date_range else None
+        try:
+            count = export_records(iter_csv(self.source_path), self.file_path, self.fieldnames, predicate,
+                                   progress=self.progress.emit, should_stop=self.isInterruptionRequested)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if count is not None:
+            self.succeeded.emit(count)
+
 
 class RecordQueryTab(QWidget):
     def __init__(self, user):
         super().__init__()
         self.user = user
-        self.records = []
+        self.records = {}  # 记录键 -> 记录，按文件顺序
+        self.sort = SortState()  # 未点击表头时按文件顺序显示
+        self.sort_index = SortIndex([
+            lambda r: collation_key(r.get("borrower", "")),
+            lambda r: r.get("book_id", ""),
+            lambda r: collation_key(r.get("book_title", "")),
+            lambda r: r.get("borrow_time", ""),
+            lambda r: r.get("due_time", ""),
+            lambda r: r.get("actual_return_time", ""),
+        ], record_key)
         self.init_ui()
+        # 记录列表和各列有序索引随记录存储的借还事件增量维护，只在首次加载和文件被重写时全量读取
+        get_record_store(BORROW_RECORDS_FILE).subscribe(self.on_record_event)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -23,25 +113,58 @@ class RecordQueryTab(QWidget):
         self.reset_btn = QPushButton("重置")
 
         self.search_btn.clicked.connect(self.search_records)
-        self.reset_btn.clicked.connect(self.load_records)
+        self.reset_btn.clicked.connect(self.reset_filters)
 
         search_layout.addWidget(self.search_edit)
         search_layout.addWidget(self.search_btn)
         search_layout.addWidget(self.reset_btn)
         layout.addLayout(search_layout)
 
+        # 日期范围筛选
+        date_layout = QHBoxLayout()
+        self.date_check = QCheckBox("按日期筛选")
+        self.date_field_combo = QComboBox()
+        self.date_field_combo.addItems(DATE_FIELDS)
+        self.date_preset_combo = QComboBox()
+        self.date_preset_combo.addItems(DATE_PRESETS)
+        today = QDate.currentDate()
+        self.date_from_edit = QDateEdit(today.addDays(1 - today.day()))
+        self.date_to_edit = QDateEdit(today)
+        for edit in (self.date_from_edit, self.date_to_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.dateChanged.connect(self.on_date_edited)
+        self.date_check.toggled.connect(self.search_records)
+        self.date_field_combo.currentIndexChanged.connect(self.on_date_filter_changed)
+        self.date_preset_combo.currentIndexChanged.connect(self.apply_date_preset)
+
+        date_layout.addWidget(self.date_check)
+        date_layout.addWidget(self.date_field_combo)
+        date_layout.addWidget(self.date_preset_combo)
+        date_layout.addWidget(self.date_from_edit)
+        date_layout.addWidget(QLabel("至"))
+        date_layout.addWidget(self.date_to_edit)
+        date_layout.addStretch()
+        layout.addLayout(date_layout)
+
+        # 普通用户显示个人借阅概况
+        if self.user["role"] != "admin":
+            self.summary_label = QLabel()
+            layout.addWidget(self.summary_label)
+
         # 记录表格
         self.record_table = QTableWidget()
         self.record_table.setColumnCount(6)
         self.record_table.setHorizontalHeaderLabels(
             ["借阅人", "图书编号", "书名", "借阅时间", "应还时间", "实际归还时间"])
         self.record_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.record_table.horizontalHeader().sectionClicked.connect(self.sort_records)
         layout.addWidget(self.record_table)
 
         # 管理员导出功能
         if self.user["role"] == "admin":
             btn_layout = QHBoxLayout()
-            self.export_btn = QPushButton("导出记录为CSV")
+            self.export_btn = QPushButton("导出记录")
             self.export_btn.clicked.connect(self.export_records)
             btn_layout.addWidget(self.export_btn)
             layout.addLayout(btn_layout)
@@ -50,16 +173,111 @@ class RecordQueryTab(QWidget):
 
     def load_records(self):
         """加载借阅记录"""
-        self.records = load_csv(BORROW_RECORDS_FILE)
-
-        # 权限过滤：普通用户只能看自己的记录
+        # 权限过滤：普通用户只能看自己的记录，直接通过借阅人索引读取
+        store = get_record_store(BORROW_RECORDS_FILE)
         if self.user["role"] != "admin":
-            self.records = [r for r in self.records if r["borrower"] == self.user["username"]]
+            records = store.records_for_borrower(self.user["username"])
+            self.update_summary()
+        else:
+            records = store.iter_records()
+        self.records = {record_key(r): r for r in records}
+
+        self.sort_index.rebuild(self.records.values())
+        self.search_records()
+
+    def on_record_event(self, event, record, old):
+        if event == "reset":
+            self.load_records()
+            return
+        if self.user["role"] != "admin" and record.get("borrower") != self.user["username"]:
+            return
+        key = record_key(record)
+        if old is not None and record_key(old) != key:
+            self.records.pop(record_key(old), None)
+            self.sort_index.remove(record_key(old))
+        self.records[key] = record
+        self.sort_index.add(record)
+
+    def sort_records(self, column):
+        """点击表头按该列排序，再次点击切换升降序"""
+        self.sort.click(column)
+        header = self.record_table.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(column, Qt.DescendingOrder if self.sort.descending else Qt.AscendingOrder)
+        self.search_records()
+
+    def reset_filters(self):
+        """清除关键词和日期筛选，显示全部记录"""
+        self.search_edit.clear()
+        self.date_check.blockSignals(True)
+        self.date_check.setChecked(False)
+        self.date_check.blockSignals(False)
+        self.search_records()
+
+    def apply_date_preset(self):
+        preset = self.date_preset_combo.currentText()
+        if preset == "自定义":
+            return
+        start, end = preset_range(preset, datetime.date.today())
+        for edit, value in ((self.date_from_edit, start), (self.date_to_edit, end)):
+            edit.blockSignals(True)
+            edit.setDate(QDate(value.year, value.month, value.day))
+            edit.blockSignals(False)
+        self.on_date_filter_changed()
+
+    def on_date_edited(self):
+        """手动修改日期后快捷范围显示为“自定义”"""
+        self.date_preset_combo.blockSignals(True)
+        self.date_preset_combo.setCurrentIndex(0)
+        self.date_preset_combo.blockSignals(False)
+        self.on_date_filter_changed()
+
+    def on_date_filter_changed(self):
+        if self.date_check.isChecked():
+            self.search_records()
+        else:
+            self.date_check.setChecked(True)  # 修改日期条件即启用日期筛选
+
+    def date_range(self):
+        """当前日期筛选条件 (记录字段, 表格列号, low, high)，未启用时返回None"""
+        if not self.date_check.isChecked():
+            return None
+        field, column = DATE_FIELDS[self.date_field_combo.currentText()]
+        low, high = date_bounds(self.date_from_edit.date().toPyDate(), self.date_to_edit.date().toPyDate())
+        return field, column, low, high
+
+    def has_filter(self):
+        return bool(self.search_edit.text().strip()) or self.date_check.isChecked()
 
-        self.update_table(self.records)
+    def filtered_records(self):
+        """按日期范围和关键词筛选记录
+
+        日期范围在该列的有序索引上二分查找两端，只取出范围内的 k 条记录，再按关键词过滤，
+        记录总数再多也不需要逐条扫描。
+        """
+        date_range = self.date_range()
+        if date_range:
+            _, column, low, high = date_range
+            records = self.sort_index.range(column, low, high)
+        else:
+            records = list(self.records.values())
+        keyword = self.search_edit.text().lower().strip()
+        if keyword:
+            records = [r for r in records if match_record(r, keyword)]
+        return records
+
+    def update_summary(self):
+        """更新个人借阅概况"""
+        summary = get_record_store(BORROW_RECORDS_FILE).patron_summary(self.user["username"])
+        self.summary_label.setText(
+            f"当前借阅: {summary['current_loans']} 本    累计借阅: {summary['total_borrowed']} 本    "
+            f"逾期未还: {summary['overdue']} 本    最近活动: {summary['last_activity'] or '无'}")
 
     def update_table(self, records):
-        """更新表格显示"""
+        """更新表格显示，已选择排序列时按该列的有序索引输出"""
+        if self.sort.column is not None:
+            visible = None if len(records) == len(self.sort_index) else {record_key(r) for r in records}
+            records = self.sort_index.ordered(self.sort.column, self.sort.descending, visible)
         self.record_table.setRowCount(len(records))
         for row, r in enumerate(records):
             self.record_table.setItem(row, 0, QTableWidgetItem(r.get("borrower", "")))
@@ -70,30 +288,48 @@ class RecordQueryTab(QWidget):
             self.record_table.setItem(row, 5, QTableWidgetItem(r.get("actual_return_time", "未归还")))
 
     def search_records(self):
-        """搜索记录"""
-        keyword = self.search_edit.text().lower().strip()
-        if not keyword:
-            self.load_records()
-            return
+        """搜索记录（关键词与日期范围组合），无筛选条件时显示全部"""
+        self.update_table(self.filtered_records())
 
-        filtered = [r for r in self.records if
-                    keyword in r.get("book_title", "").lower() or
-                    keyword in r.get("borrower", "").lower() or
-                    keyword in r.get("book_id", "").lower()]
-        self.update_table(filtered)
+    def apply_record_delta(self, added, changed, removed):
+        """借阅记录变化后刷新表格（记录列表和有序索引已随记录存储的事件更新），保持当前搜索条件"""
+        if self.user["role"] != "admin":
+            self.update_summary()
+        self.search_records()
 
     def export_records(self):
-        """导出记录（管理员）"""
+        """导出当前搜索结果（管理员），支持CSV/JSONL及gzip压缩，在后台线程中分块写出"""
         if not self.records:
             QMessageBox.warning(self, "警告", "没有记录可导出")
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, "保存文件", "", "CSV文件 (*.csv)")
+        file_path, selected_filter = QFileDialog.getSaveFileName(self, "保存文件", "", ";;".join(EXPORT_FILTERS))
         if not file_path:
             return
+        if export_format(file_path) is None:
+            file_path += EXPORT_FILTERS.get(selected_filter, ".csv")
 
-        try:
-            save_csv(file_path, self.records)
-            QMessageBox.information(self, "成功", f"记录已导出至:\n{file_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
\ No newline at end of file
+        store = get_record_store(BORROW_RECORDS_FILE)
+        total = len(store)
+        self.export_btn.setEnabled(False)
+        self.export_progress = QProgressDialog("正在导出记录...", "取消", 0, max(total, 1), self)
+        self.export_progress.setWindowTitle("导出")
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(500)
+
+        date_range = self.date_range()
+        self.export_worker = ExportWorker(store.file_path, file_path, store.fieldnames,
+                                          self.search_edit.text().lower().strip(),
+                                          date_range and (date_range[0], date_range[2], date_range[3]))
+        self.export_worker.progress.connect(lambda count: self.export_progress.setValue(min(count, total)))
+        self.export_worker.succeeded.connect(
+            lambda count: QMessageBox.information(self, "成功", f"已导出 {count} 条记录至:\n{file_path}"))
+        self.export_worker.failed.connect(lambda error: QMessageBox.critical(self, "错误", f"导出失败:\n{error}"))
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_progress.canceled.connect(self.export_worker.requestInterruption)
+        self.export_worker.start()
+
+    def on_export_finished(self):
+        self.export_progress.reset()
+        self.export_btn.setEnabled(True)
+        self.export_worker = None
@@ -0,0 +1,628 @@
+# record_store.py
+import os
+import io
+import csv
+import json
+import mmap
+import codecs
+import time
+import shutil
+import datetime
+from array import array
+from contextlib import contextmanager
+import data_utils
+from data_utils import RECORD_FIELDNAMES, file_lock, load_csv, save_csv
+from change_log import log_changes, put_entry, record_log_key
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 3
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAX_BYTES = 1 << 20  # 更新日志超过该大小时由下一次写入截断重写
+TAIL_SIGNATURE_SIZE = 64
+COPY_CHUNK_SIZE = 1 << 20
+
+
+class RecordStore:
+    """借阅记录存储：通过mmap随机读取，用字节偏移索引直接定位单条记录
+
+    索引按文件顺序保存每条记录的起始偏移，主键为(图书编号, 借阅时间)，
+    另按借阅人维护记录键列表和借阅概况（写入时同步更新）。索引缓存在
+    同名 .idx 侧车文件中。每次追加或原地修改都在同名 .journal 更新日志中记下涉及的
+    记录键及偏移变化，其他进程据此只重读新增和被修改的行，文件被整体重写（修复、
+    恢复、外部编辑）时才重建索引。
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = os.path.abspath(file_path or data_utils.BORROW_RECORDS_FILE)
+        self.index_path = self.file_path + INDEX_SUFFIX
+        self.journal_path = self.file_path + JOURNAL_SUFFIX
+        self.fieldnames = list(RECORD_FIELDNAMES)
+        self.newline = "\n"
+        self.data_start = 0  # 表头之后第一条记录的偏移
+        self.keys = []  # 按文件顺序排列的 (book_id, borrow_time)
+        self.starts = array('q')  # 与 keys 对应的起始字节偏移
+        self.positions = {}  # (book_id, borrow_time) -> keys 中的下标
+        self.by_borrower = {}  # 借阅人 -> [(book_id, borrow_time), ...]
+        self.meta = {}  # (book_id, borrow_time) -> [借阅人, 应还时间, 实际归还时间]
+        self.patrons = {}  # 借阅人 -> {"total": 累计借阅数, "open": {记录键: 应还时间}, "last_activity": 最近活动时间}
+        self.loaned = {}  # 副本条码 -> 未归还的记录数
+        self.size = 0
+        self.mtime_ns = 0
+        self.tail_signature = b""
+        self.mm = None
+        self.journal_generation = ""  # 更新日志的代号，日志截断重写后改变
+        self.journal_offset = 0  # 已处理到的更新日志位置
+        self.lock_held = False
+        self.listeners = []  # 记录变化监听器 listener(事件, 记录, 旧记录)
+        self.pending_events = []  # 持有写锁期间同步到的变化，释放锁后再通知
+        self.open()
+
+    # ---------- 文件映射与索引维护 ----------
+
+    def open(self):
+        """打开记录文件，优先使用侧车索引"""
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            with open(self.file_path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f, lineterminator=self.newline).writerow(self.fieldnames)
+        if self.load_index():
+            self.sync()
+        else:
+            with self.locked():
+                self.rebuild()
+
+    @contextmanager
+    def locked(self):
+        """持有记录文件的写锁（期间 sync 不再重复加锁）"""
+        with file_lock(self.file_path):
+            self.lock_held = True
+            try:
+                yield
+            finally:
+                self.lock_held = False
+
+    def open_map(self):
+        self.close_map()
+        with open(self.file_path, 'r+b') as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+
+    def close_map(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def refresh_stat(self):
+        """记录文件当前大小、修改时间和尾部签名，用于识别外部修改"""
+        st = os.stat(self.file_path)
+        self.size, self.mtime_ns = st.st_size, st.st_mtime_ns
+        self.tail_signature = self.mm[max(0, self.size - TAIL_SIGNATURE_SIZE):self.size]
+
+    def sync(self):
+        """检查文件是否被其他进程修改：按更新日志增量同步，文件被整体重写时重建索引"""
+        st = os.stat(self.file_path)
+        if (st.st_size, st.st_mtime_ns) != (self.size, self.mtime_ns):
+            if self.lock_held:
+                self.catch_up()
+                return
+            with self.locked():
+                self.catch_up()
+        if not self.lock_held:
+            self.flush_events()
+
+    def catch_up(self):
+        """持有写锁时调用：重放其他进程的追加和原地修改，无法衔接时重建索引"""
+        st = os.stat(self.file_path)
+        if (st.st_size, st.st_mtime_ns) == (self.size, self.mtime_ns):
+            return
+        entries = self.read_journal()
+        if entries is None or (entries and not self.replay(entries, st)) or (not entries and not self.tail_appended(st)):
+            self.rebuild()
+            self.pending_events.append(("reset", None, None))
+
+    def tail_appended(self, st):
+        """没有更新日志时（旧版本或外部工具写入），检查文件是否只在末尾追加了记录"""
+        old_size = self.size
+        signature = self.tail_signature
+        self.open_map()
+        if not (st.st_size > old_size and signature and signature.endswith(b"\n") and
+                self.mm[old_size - len(signature):old_size] == signature):
+            return False
+        records = self.index_range(old_size, len(self.mm))
+        self.refresh_stat()
+        self.pending_events.extend(("append", record, None) for record in records)
+        return True
+
+    def read_journal(self):
+        """读取尚未处理的更新日志条目；日志被截断重写且无法衔接时返回None"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                header = json.loads(f.readline() or b"{}")
+                if header.get("generation") != self.journal_generation:
+                    # 截断时的文件状态与本进程索引一致，才能从新日志开头接着重放
+                    if header.get("base") != [self.size, self.mtime_ns]:
+                        return None
+                    self.journal_generation = header["generation"]
+                    self.journal_offset = f.tell()
+                f.seek(self.journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError):
+            return None
+        self.journal_offset += len(data)
+        try:
+            return [json.loads(line) for line in data.splitlines() if line.strip()]
+        except ValueError:
+            return None
+
+    def replay(self, entries, st):
+        """按更新日志重放：先推算新增记录和偏移变化，再只读取新增和被修改的行"""
+        size, mtime_ns = self.size, self.mtime_ns
+        appended = []  # 新增记录在 keys 中的下标
+        changed = {}  # 被修改的已有记录键 -> 修改前的 [借阅人, 应还时间, 实际归还时间]
+        for entry in entries:
+            if entry["before"] != [size, mtime_ns]:
+                return False
+            if entry["op"] == "append":
+                for book_id, borrow_time, start in entry["rows"]:
+                    appended.append(len(self.keys))
+                    self.positions[(book_id, borrow_time)] = len(self.keys)
+                    self.keys.append((book_id, borrow_time))
+                    self.starts.append(start)
+            else:
+                shifts = []
+                for book_id, borrow_time, delta in entry["rows"]:
+                    key = (book_id, borrow_time)
+                    if key not in self.positions:
+                        return False
+                    if key in self.meta:
+                        changed.setdefault(key, list(self.meta[key]))
+                    if delta:
+                        shifts.append((self.positions[key], delta))
+                self.shift_starts(sorted(shifts))
+            size, mtime_ns = entry["after"]
+        if [size, mtime_ns] != [st.st_size, st.st_mtime_ns]:
+            return False
+
+        self.open_map()
+        self.refresh_stat()
+        events = []
+        for pos in appended:
+            record = self.record_at(pos)
+            if (record.get("book_id", ""), record.get("borrow_time", "")) != self.keys[pos]:
+                return False
+            self.index_record(self.keys[pos], record)
+            events.append(("append", record, None))
+        for key, (borrower, due_time, return_time) in changed.items():
+            record = self.record_at(self.positions[key])
+            if (record.get("book_id", ""), record.get("borrow_time", "")) != key:
+                return False
+            self.track_patron(key, record, False)
+            events.append(("update", record, dict(record, borrower=borrower, due_time=due_time,
+                                                  actual_return_time=return_time)))
+        self.pending_events.extend(events)
+        return True
+
+    def shift_starts(self, shifts):
+        """记录长度变化后顺移其后各记录的起始偏移，shifts 为按下标排序的 [(下标, 长度变化)]"""
+        if not shifts:
+            return
+        total = 0
+        k = 0
+        for i in range(shifts[0][0], len(self.starts)):
+            self.starts[i] += total
+            while k < len(shifts) and shifts[k][0] == i:
+                total += shifts[k][1]
+                k += 1
+
+    def write_journal(self, op, before, rows):
+        """持有写锁时追加一条更新日志：op 为 append（rows 为 [图书编号, 借阅时间, 起始偏移]）
+        或 update（rows 为 [图书编号, 借阅时间, 长度变化]），before 为写入前的 [大小, 修改时间]"""
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) > JOURNAL_MAX_BYTES:
+            self.start_journal(before)
+        entry = {"op": op, "before": before, "after": [self.size, self.mtime_ns], "rows": rows}
+        with open(self.journal_path, 'ab') as f:
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.journal_offset = f.tell()
+
+    def start_journal(self, base):
+        """截断重写更新日志，base 为截断时文件的 [大小, 修改时间]"""
+        generation = f"{os.getpid()}-{time.time_ns()}"
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"generation": generation, "base": base}) + "\n")
+        os.replace(tmp_path, self.journal_path)
+        self.journal_generation = generation
+
+    def skip_journal(self):
+        """索引刚与文件对齐（持有写锁），已有的更新日志无需再重放"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                self.journal_generation = json.loads(f.readline() or b"{}").get("generation", "")
+                self.journal_offset = f.seek(0, os.SEEK_END)
+        except (OSError, ValueError):
+            self.journal_generation, self.journal_offset = "", 0
+
+    def subscribe(self, listener):
+        """注册记录变化监听器，事件为 append（新增）、update（修改）、reset（文件被整体重写）"""
+        self.listeners.append(listener)
+
+    def notify(self, event, record, old=None):
+        for listener in self.listeners:
+            listener(event, record, old)
+
+    def flush_events(self):
+        """通知同步期间积累的变化（在释放写锁之后调用，监听器中可以再写入记录）"""
+        events, self.pending_events = self.pending_events, []
+        for event, record, old in events:
+            self.notify(event, record, old)
+
+    def is_utf8(self):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            with open(self.file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    decoder.decode(chunk)
+                decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def rebuild(self):
+        """全量扫描文件重建偏移索引"""
+        # WPS等编辑器可能将文件另存为GBK，统一转换为UTF-8后再建立字节索引
+        if not self.is_utf8():
+            save_csv(self.file_path, load_csv(self.file_path))
+        self.reset_index()
+        self.open_map()
+        pos = 3 if self.mm[:3] == codecs.BOM_UTF8 else 0
+        header_end = self.mm.find(b"\n", pos)
+        header_end = len(self.mm) if header_end == -1 else header_end + 1
+        header = self.mm[pos:header_end]
+        self.fieldnames = next(csv.reader(io.StringIO(header.decode('utf-8'))), []) or list(RECORD_FIELDNAMES)
+        self.newline = "\r\n" if header.endswith(b"\r\n") else "\n"
+        self.data_start = header_end
+        self.index_range(header_end, len(self.mm))
+        self.refresh_stat()
+        self.skip_journal()
+        self.pending_events = []  # 重建后由调用方通知 reset
+        self.save_index()
+
+    def reset_index(self):
+        self.keys, self.starts = [], array('q')
+        self.positions, self.by_borrower = {}, {}
+        self.meta, self.patrons, self.loaned = {}, {}, {}
+
+    def iter_lines(self, start, end):
+        """按CSV语义切分[start, end)内的记录（引号内的换行不算行结束），返回(偏移, 行字节)"""
+        pos = start
+        while pos < end:
+            nl = self.mm.find(b"\n", pos, end)
+            line_end = end if nl == -1 else nl + 1
+            while self.mm[pos:line_end].count(b'"') % 2 and line_end < end:
+                nl = self.mm.find(b"\n", line_end, end)
+                line_end = end if nl == -1 else nl + 1
+            yield pos, self.mm[pos:line_end]
+            pos = line_end
+
+    def index_range(self, start, end):
+        """索引[start, end)内的记录，返回这些记录"""
+        records = []
+        for pos, line in self.iter_lines(start, end):
+            if not line.strip():
+                continue
+            record = self.parse(line)
+            self.add_entry(record, pos)
+            records.append(record)
+        return records
+
+    def add_entry(self, record, start):
+        key = (record.get("book_id", ""), record.get("borrow_time", ""))
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        self.starts.append(start)
+        self.index_record(key, record)
+
+    def index_record(self, key, record):
+        """新增记录的借阅人索引和概况（同一主键重复出现时不重复计入）"""
+        is_new = key not in self.meta
+        if is_new:
+            self.by_borrower.setdefault(record.get("borrower", ""), []).append(key)
+        self.track_patron(key, record, is_new)
+
+    def track_patron(self, key, record, is_new):
+        """写入时同步维护借阅人概况"""
+        borrower = record.get("borrower", "")
+        due_time = record.get("due_time", "")
+        return_time = record.get("actual_return_time", "")
+        previous = self.meta.get(key)
+        was_open = previous is not None and not previous[2]
+        if was_open != (not return_time):
+            count = self.loaned.get(key[0], 0) + (-1 if was_open else 1)
+            if count > 0:
+                self.loaned[key[0]] = count
+            else:
+                self.loaned.pop(key[0], None)
+        self.meta[key] = [borrower, due_time, return_time]
+        summary = self.patrons.setdefault(borrower, {"total": 0, "open": {}, "last_activity": ""})
+        if is_new:
+            summary["total"] += 1
+        if return_time:
+            summary["open"].pop(key, None)
+        else:
+            summary["open"][key] = due_time
+        summary["last_activity"] = max(summary["last_activity"], key[1], return_time)
+
+    def load_index(self):
+        """读取侧车索引，之后由 sync 按更新日志补上保存索引以来的变化"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get("version") != INDEX_VERSION or os.path.getsize(self.file_path) < index["size"]:
+            return False
+        self.fieldnames = index["fieldnames"]
+        self.newline = index["newline"]
+        self.data_start = index["data_start"]
+        self.reset_index()
+        for book_id, borrow_time, start, borrower, due_time, return_time in index["entries"]:
+            self.add_entry({"book_id": book_id, "borrow_time": borrow_time, "borrower": borrower,
+                            "due_time": due_time, "actual_return_time": return_time}, start)
+        self.size, self.mtime_ns = index["size"], index["mtime_ns"]
+        self.tail_signature = bytes.fromhex(index["tail_signature"])
+        self.journal_generation, self.journal_offset = index["journal"]
+        self.open_map()
+        return True
+
+    def save_index(self):
+        """将偏移索引写入侧车文件（先写临时文件再替换）"""
+        index = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "tail_signature": self.tail_signature.hex(),
+            "fieldnames": self.fieldnames,
+            "newline": self.newline,
+            "data_start": self.data_start,
+            "journal": [self.journal_generation, self.journal_offset],
+            "entries": [[key[0], key[1], start] + self.meta[key] for key, start in zip(self.keys, self.starts)],
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"  # 多个终端可能同时保存索引
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        self.save_index()
+        self.close_map()
+
+    # ---------- 记录读写 ----------
+
+    def parse(self, line):
+        values = next(csv.reader(io.StringIO(line.decode('utf-8', errors='replace'))), [])
+        return {name: values[i] if i < len(values) else "" for i, name in enumerate(self.fieldnames)}
+
+    def serialize(self, record):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator=self.newline).writerow([record.get(name, "") for name in self.fieldnames])
+        return buf.getvalue().encode('utf-8')
+
+    def bounds(self, pos):
+        end = self.starts[pos + 1] if pos + 1 < len(self.starts) else self.size
+        return self.starts[pos], end
+
+    def record_at(self, pos):
+        start, end = self.bounds(pos)
+        return self.parse(self.mm[start:end])
+
+    def get(self, book_id, borrow_time):
+        """按(图书编号, 借阅时间)直接读取一条记录，不存在返回None"""
+        self.sync()
+        pos = self.positions.get((book_id, borrow_time))
+        return None if pos is None else self.record_at(pos)
+
+    def records_for_borrower(self, borrower):
+        """读取某借阅人的全部记录"""
+        self.sync()
+        return [self.record_at(self.positions[key]) for key in self.by_borrower.get(borrower, [])]
+
+    def patron_summary(self, borrower, now=None):
+        """借阅人概况：当前借阅、累计借阅、逾期数量和最近活动时间，只与该借阅人的在借数量有关"""
+        self.sync()
+        now = now or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        summary = self.patrons.get(borrower, {"total": 0, "open": {}, "last_activity": ""})
+        return {
+            "current_loans": len(summary["open"]),
+            "total_borrowed": summary["total"],
+            "overdue": sum(1 for due_time in summary["open"].values() if due_time and due_time < now),
+            "last_activity": summary["last_activity"],
+        }
+
+    def open_records(self):
+        """未归还的记录：按索引中的归还时间筛选，只读取这些行"""
+        self.sync()
+        return [self.record_at(self.positions[key]) for key, meta in self.meta.items() if not meta[2]]
+
+    def iter_records(self):
+        """按文件顺序逐条读取记录"""
+        self.sync()
+        for pos in range(len(self.keys)):
+            yield self.record_at(pos)
+
+    def __len__(self):
+        self.sync()
+        return len(self.keys)
+
+    def append(self, record):
+        """在文件末尾追加一条记录"""
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        """一次写入在文件末尾追加多条记录"""
+        with self.locked():
+            self.sync()
+            self.write_records(records)
+        self.flush_events()
+        for record in records:
+            self.notify("append", record)
+        return records
+
+    def lend(self, record):
+        """借出一个副本：持写锁同步到最新后确认该副本没有未归还的记录再追加
+
+        检查与写入在同一把锁内完成，多个终端不会借出同一副本；副本已被借出，或同一秒内
+        刚还回又借出（主键重复）时返回None。
+        """
+        key = (record.get("book_id", ""), record.get("borrow_time", ""))
+        with self.locked():
+            self.sync()
+            lent = key not in self.meta and not self.loaned.get(key[0])
+            if lent:
+                self.write_records([record])
+        self.flush_events()
+        if not lent:
+            return None
+        self.notify("append", record)
+        return record
+
+    def write_records(self, records):
+        """追加写入记录并更新索引（调用方持有写锁并已同步）"""
+        before = [self.size, self.mtime_ns]
+        start = self.size
+        chunks = []
+        if self.size and self.mm[self.size - 1:self.size] != b"\n":
+            chunks.append(self.newline.encode())
+            start += len(self.newline)
+        entries = []
+        for record in records:
+            data = self.serialize(record)
+            chunks.append(data)
+            entries.append((record, start))
+            start += len(data)
+        self.close_map()
+        with open(self.file_path, 'ab') as f:
+            f.write(b"".join(chunks))
+        self.open_map()
+        for record, start in entries:
+            self.add_entry(record, start)
+        self.refresh_stat()
+        self.write_journal("append", before, [[r.get("book_id", ""), r.get("borrow_time", ""), start]
+                                              for r, start in entries])
+        self.log_puts(records)
+
+    def log_puts(self, records):
+        """本进程写入的记录同时写入变更日志（其他进程的写入由其自身记录）"""
+        if self.file_path == os.path.abspath(data_utils.BORROW_RECORDS_FILE):
+            log_changes([put_entry("records", record_log_key(r), {name: r.get(name, "") for name in self.fieldnames})
+                         for r in records])
+
+    def update(self, book_id, borrow_time, **changes):
+        """原地修改一条记录：长度不变时直接覆盖该行，否则只重写该记录之后的部分"""
+        with self.locked():
+            self.sync()
+            before = [self.size, self.mtime_ns]
+            pos = self.positions.get((book_id, borrow_time))
+            if pos is None:
+                return None
+            start, end = self.bounds(pos)
+            old, new, record, old_record = self.rewrite_line(pos, changes)
+
+            if len(new) == len(old):
+                self.write_at(start, new)
+            else:
+                tail = self.mm[end:self.size]
+                self.close_map()
+                with open(self.file_path, 'r+b') as f:
+                    f.seek(start)
+                    f.write(new)
+                    f.write(tail)
+                    f.truncate()
+                self.shift_starts([(pos, len(new) - len(old))])
+                self.open_map()
+            self.track_patron((book_id, borrow_time), record, False)
+            self.refresh_stat()
+            self.write_journal("update", before, [[book_id, borrow_time, len(new) - len(old)]])
+            self.log_puts([record])
+        self.flush_events()
+        self.notify("update", record, old_record)
+        return record
+
+    def write_at(self, start, data):
+        """长度不变的原地写入（经文件写入，修改时间随即更新，与更新日志中记下的一致）"""
+        with open(self.file_path, 'r+b') as f:
+            f.seek(start)
+            f.write(data)
+
+    def rewrite_line(self, pos, changes):
+        """生成修改后的记录行，返回(旧行, 新行, 新记录, 旧记录)"""
+        start, end = self.bounds(pos)
+        old = self.mm[start:end]
+        old_record = self.parse(old)
+        record = dict(old_record, **changes)
+        # 保留原记录末尾的换行符（含可能存在的空行）
+        new = self.serialize(record)[:-len(self.newline)] + old[len(old.rstrip(b"\r\n")):]
+        return old, new, record, old_record
+
+    def update_many(self, changes):
+        """批量修改记录，整批只写一次文件：changes 为 {(图书编号, 借阅时间): {字段: 值}}，返回修改后的记录
+
+        长度都不变时逐行原位覆盖；否则从第一条被修改的记录起，把新的尾部流式写入
+        临时文件后一次性写回原文件，并顺序重算其后各记录的偏移。
+        """
+        with self.locked():
+            self.sync()
+            before = [self.size, self.mtime_ns]
+            targets = sorted((self.positions[key], fields) for key, fields in changes.items() if key in self.positions)
+            if not targets:
+                return []
+            lines = [(pos,) + self.rewrite_line(pos, fields) for pos, fields in targets]
+            if all(len(new) == len(old) for _, old, new, _, _ in lines):
+                for pos, _, new, _, _ in lines:
+                    self.write_at(self.starts[pos], new)
+            else:
+                first = lines[0][0]
+                replacements = {pos: new for pos, _, new, _, _ in lines}
+                base = offset = self.starts[first]
+                new_starts = array('q')
+                tmp_path = self.file_path + ".tmp"
+                with open(tmp_path, 'w+b') as tmp:
+                    for pos in range(first, len(self.keys)):
+                        data = replacements.get(pos)
+                        if data is None:
+                            start, end = self.bounds(pos)
+                            data = self.mm[start:end]
+                        new_starts.append(offset)
+                        tmp.write(data)
+                        offset += len(data)
+                    self.close_map()
+                    tmp.seek(0)
+                    with open(self.file_path, 'r+b') as f:
+                        f.seek(base)
+                        shutil.copyfileobj(tmp, f, COPY_CHUNK_SIZE)
+                        f.truncate()
+                os.remove(tmp_path)
+                self.starts[first:] = new_starts
+                self.open_map()
+            records = []
+            for pos, _, _, record, _ in lines:
+                self.track_patron(self.keys[pos], record, False)
+                records.append(record)
+            self.refresh_stat()
+            self.write_journal("update", before, [list(self.keys[pos]) + [len(new) - len(old)]
+                                                  for pos, old, new, _, _ in lines])
+            self.log_puts(records)
+        self.flush_events()
+        for _, _, _, record, old_record in lines:
+            self.notify("update", record, old_record)
+        return records
+
+
+_stores = {}
+
+
+def get_record_store(file_path=None):
+    """获取进程内共享的记录存储实例"""
+    path = os.path.abspath(file_path or data_utils.BORROW_RECORDS_FILE)
+    if path not in _stores:
+        _stores[path] = RecordStore(path)
+    return _stores[path]
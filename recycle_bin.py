@@ -0,0 +1,67 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QAbstractItemView)
+from PyQt5.QtCore import pyqtSignal
+from tombstones import get_tombstones
+
+
+class RecycleBinDialog(QDialog):
+    """回收站：列出已删除但尚未压缩的图书或用户，选中后撤销删除"""
+    restored = pyqtSignal(list)
+
+    def __init__(self, file_path, columns, actor, title="回收站", parent=None):
+        super().__init__(parent)
+        self.tombstones = get_tombstones(file_path)
+        self.columns = columns  # [(表头, 字段)]，第一列为主键
+        self.actor = actor
+        self.keys = []
+        self.setWindowTitle(title)
+        self.resize(700, 400)
+        self.init_ui()
+        self.load_entries()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        self.hint_label = QLabel("已删除的记录在后台压缩之前可以恢复")
+        layout.addWidget(self.hint_label)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.columns) + 2)
+        self.table.setHorizontalHeaderLabels([header for header, _ in self.columns] + ["删除时间", "操作人"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        self.restore_btn = QPushButton("恢复选中")
+        self.restore_btn.clicked.connect(self.restore_selected)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.restore_btn)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def load_entries(self):
+        self.tombstones.refresh()
+        entries = sorted(self.tombstones.deleted.values(), key=lambda e: e.get("ts", ""), reverse=True)
+        self.keys = [entry.get("key") for entry in entries]
+        self.table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            data = entry.get("row") or {}
+            for col, (_, field) in enumerate(self.columns):
+                self.table.setItem(row, col, QTableWidgetItem(str(data.get(field, ""))))
+            self.table.setItem(row, len(self.columns), QTableWidgetItem(entry.get("ts", "")[:19]))
+            self.table.setItem(row, len(self.columns) + 1, QTableWidgetItem(entry.get("actor", "")))
+
+    def restore_selected(self):
+        rows = {item.row() for item in self.table.selectedItems()}
+        if not rows:
+            QMessageBox.warning(self, "警告", "请选择要恢复的记录")
+            return
+        restored = self.tombstones.undelete([self.keys[row] for row in rows], self.actor)
+        if restored:
+            self.restored.emit(restored)
+            QMessageBox.information(self, "成功", f"已恢复 {len(restored)} 条")
+        else:
+            QMessageBox.warning(self, "警告", "选中的记录已被压缩清理，无法恢复")
+        self.load_entries()
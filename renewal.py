@@ -0,0 +1,86 @@
+# renewal.py
+import datetime
+from record_store import get_record_store
+from holdings import get_holdings
+from hold_queue import get_hold_queue
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOAN_DAYS = 30  # 原借期，应还时间超过借阅时间这么多天说明已续借过
+RENEW_DAYS = 15
+SKIP_REASONS = {
+    "overdue": "已逾期",
+    "renewed": "已续借过",
+    "on_hold": "有读者预约",
+    "bad_time": "时间格式错误",
+}
+
+
+def renew_check(borrow_time, due_time, has_holds, now):
+    """续借规则（最多续借1次，每次延长15天），可续借返回新的应还时间，否则返回 (None, 原因)"""
+    try:
+        borrowed = datetime.datetime.fromisoformat(borrow_time)
+        due = datetime.datetime.fromisoformat(due_time)
+    except ValueError:
+        return None, "bad_time"
+    if due < now:
+        return None, "overdue"
+    if (due - borrowed).days > LOAN_DAYS:
+        return None, "renewed"
+    if has_holds:
+        return None, "on_hold"
+    return (due + datetime.timedelta(days=RENEW_DAYS)).strftime(TIME_FORMAT), None
+
+
+class RenewalPlan:
+    """批量续借的计划：可续借的记录及新应还时间，以及各原因跳过的数量"""
+
+    def __init__(self):
+        self.changes = {}  # (图书编号, 借阅时间) -> {"due_time": 新应还时间}
+        self.items = []  # [(图书编号, 借阅时间, 借阅人, 原应还时间, 新应还时间)]
+        self.skipped = {}  # 原因 -> 数量
+        self.renewed = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def skip_text(self):
+        return "，".join(f"{SKIP_REASONS[reason]} {count}" for reason, count in self.skipped.items())
+
+
+def plan_renewals(borrower=None, now=None, store=None, holdings=None, holds=None):
+    """一次遍历未归还记录，按续借规则生成计划；borrower 为空时针对全部读者
+
+    只使用记录存储内存中的索引（借阅人、应还时间、归还时间），不读取记录文件；
+    预约队列按图书只查询一次。
+    """
+    store = store or get_record_store()
+    holdings = holdings or get_holdings()
+    holds = holds or get_hold_queue()
+    now = now or datetime.datetime.now()
+    store.sync()
+    keys = store.by_borrower.get(borrower, []) if borrower else store.meta.keys()
+    plan = RenewalPlan()
+    queued = {}  # 图书编号 -> 是否有人预约
+    for key in keys:
+        loan_borrower, due_time, return_time = store.meta[key]
+        if return_time:
+            continue
+        book_id = holdings.title_of(key[0])
+        if book_id not in queued:
+            queued[book_id] = bool(holds.queue_length(book_id))
+        new_due, reason = renew_check(key[1], due_time, queued[book_id], now)
+        if reason:
+            plan.skipped[reason] = plan.skipped.get(reason, 0) + 1
+            continue
+        plan.changes[key] = {"due_time": new_due}
+        plan.items.append((key[0], key[1], loan_borrower, due_time, new_due))
+    return plan
+
+
+def bulk_renew(borrower=None, dry_run=False, now=None, store=None):
+    """批量续借：生成计划后整批只写一次文件；dry_run 为 True 时只返回计划不写入"""
+    store = store or get_record_store()
+    plan = plan_renewals(borrower, now, store)
+    if not dry_run and plan.changes:
+        plan.renewed = len(store.update_many(plan.changes))
+    return plan
@@ -0,0 +1,175 @@
+# restore.py
+import os
+import io
+import csv
+import json
+import tarfile
+import data_utils
+from data_utils import backup_data, list_backups, save_json, load_json, record_key
+from change_log import KEY_FIELDS, iter_changes, log_changes, put_entry, delete_entry, record_log_key
+from record_store import get_record_store
+from facet_index import FacetIndex
+from isbn_index import IsbnIndex
+from tombstones import tombstone_path, replay_deletes
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def read_snapshot_file(path, name):
+    """读取备份中的一个数据文件（压缩包或旧版备份目录），不存在返回None"""
+    if os.path.isdir(path):
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            return f.read()
+    with tarfile.open(path, "r:gz") as tar:
+        try:
+            return tar.extractfile(name).read()
+        except KeyError:
+            return None
+
+
+def decode_csv(data):
+    for enc in ['utf-8-sig', 'gbk']:
+        try:
+            return list(csv.DictReader(io.StringIO(data.decode(enc), newline='')))
+        except UnicodeDecodeError:
+            continue
+    return []
+
+
+def load_snapshot(path):
+    """读取备份快照，返回 {"books": {id: 图书}, "users": {...}, "records": {(图书编号, 借阅时间): 记录}}"""
+    state = {}
+    for kind, name in (("books", "books.json"), ("users", "users.json")):
+        data = read_snapshot_file(path, name)
+        rows = json.loads(data.decode('utf-8')) if data else []
+        tombstones = read_snapshot_file(path, tombstone_path(name))
+        if tombstones:
+            deleted = replay_deletes(tombstones.splitlines())
+            rows = [row for row in rows if row.get(KEY_FIELDS[kind]) not in deleted]
+        state[kind] = {row.get(KEY_FIELDS[kind]): row for row in rows}
+    data = read_snapshot_file(path, "borrow_records.csv")
+    rows = decode_csv(data) if data else []
+    state["records"] = {tuple(record_log_key(r)): r for r in rows}
+    return state
+
+
+def find_snapshot(target):
+    """时间不晚于target的最近一份备份 (备份时间, 路径)，没有返回None"""
+    for stamp, path in list_backups():
+        if stamp <= target:
+            return stamp, path
+    return None
+
+
+def replay(state, start, end):
+    """将[start, end]内的变更日志依次应用到快照上，返回应用条数"""
+    count = 0
+    for entry in iter_changes(start, end):
+        rows = state.get(entry.get("file"))
+        if rows is None:
+            continue
+        key = entry["key"]
+        key = tuple(key) if isinstance(key, list) else key
+        if entry["op"] == "put":
+            rows[key] = entry["row"]
+        elif entry["op"] == "delete":
+            rows.pop(key, None)
+        count += 1
+    return count
+
+
+def rebuild_state(target):
+    """重建target时刻的数据：最近的快照加上此后到target为止的变更日志，返回(状态, 快照时间, 重放条数)"""
+    snapshot = find_snapshot(target)
+    if snapshot is None:
+        raise ValueError("没有早于该时间的备份，无法恢复")
+    stamp, path = snapshot
+    state = load_snapshot(path)
+    # 日志条目为按主键写入整行，备份过程中写入的变更重复应用不影响结果，因此从备份开始的那一秒起重放
+    count = replay(state, stamp.strftime(TIME_FORMAT), target.strftime(TIME_FORMAT))
+    return state, stamp, count
+
+
+def write_records(store, records):
+    """用恢复后的记录整体替换借阅记录文件（调用方持有写锁）"""
+    tmp_path = store.file_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator=store.newline)
+        writer.writerow(store.fieldnames)
+        for record in records:
+            writer.writerow([record.get(name, "") for name in store.fieldnames])
+    store.close_map()
+    os.replace(tmp_path, store.file_path)
+
+
+def verify_restore(state):
+    """校验恢复后的数据文件及重建的索引与恢复结果一致，返回问题列表（为空表示通过）"""
+    problems = []
+    for kind, file_path in (("books", data_utils.BOOKS_FILE), ("users", data_utils.USERS_FILE)):
+        rows = load_json(file_path)
+        if rows != list(state[kind].values()):
+            problems.append(f"{os.path.basename(file_path)} 内容与恢复结果不一致")
+        if len({row.get(KEY_FIELDS[kind]) for row in rows}) != len(rows):
+            problems.append(f"{os.path.basename(file_path)} 存在重复主键")
+
+    books = list(state["books"].values())
+    facet_index = FacetIndex(books)
+    for field, counts in facet_index.counts({}).items():
+        if sum(counts.values()) != len(books):
+            problems.append(f"分面索引字段 {field} 计数与图书数量不一致")
+    isbn_index = IsbnIndex(books)
+    if len(isbn_index.books) != len(books):
+        problems.append("ISBN索引中的图书数量与图书文件不一致")
+
+    store = get_record_store()
+    records = state["records"]
+    if len(store) != len(records):
+        problems.append(f"借阅记录索引有 {len(store)} 条，恢复结果为 {len(records)} 条")
+    for (book_id, borrow_time), record in records.items():
+        stored = store.get(book_id, borrow_time)
+        if stored is None or any(stored.get(name, "") != record.get(name, "") for name in store.fieldnames):
+            problems.append(f"借阅记录 {book_id} {borrow_time} 与恢复结果不一致")
+            break
+    if sum(p["total"] for p in store.patrons.values()) != len(records):
+        problems.append("借阅人概况中的累计借阅数与记录数量不一致")
+    if len({record_key(r) for r in records.values()}) != len(records):
+        problems.append("借阅记录存在重复主键")
+    return problems
+
+
+def restore_to(target):
+    """将数据恢复到target时刻，恢复前先备份当前数据，返回恢复摘要
+
+    恢复本身也作为普通变更写入日志，之后仍可恢复到恢复前的任意时间点。
+    """
+    state, stamp, count = rebuild_state(target)
+    safety_backup = backup_data()
+    save_json(data_utils.BOOKS_FILE, list(state["books"].values()))
+    save_json(data_utils.USERS_FILE, list(state["users"].values()))
+
+    store = get_record_store()
+    with store.locked():
+        store.sync()
+        current = {tuple(record_log_key(r)): r for r in store.iter_records()}
+        records = state["records"]
+        entries = [put_entry("records", list(key), {name: r.get(name, "") for name in store.fieldnames})
+                   for key, r in records.items()
+                   if key not in current or any(current[key].get(n, "") != r.get(n, "") for n in store.fieldnames)]
+        entries.extend(delete_entry("records", list(key)) for key in current if key not in records)
+        write_records(store, records.values())
+        store.rebuild()
+        log_changes(entries)
+    store.notify("reset", None)
+
+    return {
+        "snapshot": stamp.strftime(TIME_FORMAT),
+        "replayed": count,
+        "books": len(state["books"]),
+        "users": len(state["users"]),
+        "records": len(state["records"]),
+        "safety_backup": safety_backup,
+        "problems": verify_restore(state),
+    }
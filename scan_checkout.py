@@ -0,0 +1,201 @@
+# scan_checkout.py
+import os
+import csv
+import json
+import time
+import random
+import datetime
+import tempfile
+import data_utils
+from data_utils import load_json
+from record_store import get_record_store
+from holdings import get_holdings
+from hold_queue import get_hold_queue
+from isbn_index import IsbnIndex, is_valid_isbn
+
+LOAN_DAYS = 30
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TARGET_MS = 50  # 每次扫码到确认的目标耗时
+
+
+def percentile(sorted_values, q):
+    """已排序数据的 q 分位数（0~100，取最近的秩）"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class ScanCheckout:
+    """扫码借书：扫描枪按键盘输入读者用户名，再逐本扫描图书条码，每扫一本立即借出
+
+    读者、副本条码、图书编号和ISBN均通过哈希索引解析，借阅记录经记录存储的追加路径
+    写入，每次扫码只做常数次内存查找和一次追加写，与图书、记录总数无关。扫描到另一位
+    读者时切换读者；输入空行结束本次借阅。
+    """
+
+    def __init__(self, books=None, users=None, store=None, holdings=None, holds=None):
+        books = load_json(data_utils.BOOKS_FILE) if books is None else books
+        users = load_json(data_utils.USERS_FILE) if users is None else users
+        self.store = store or get_record_store()
+        self.holdings = holdings or get_holdings()
+        self.holds = holds or get_hold_queue()
+        self.titles = {book.get("id", ""): book.get("title", "") for book in books}
+        self.isbn_index = IsbnIndex(books)
+        self.users = {user.get("username", ""): user for user in users}
+        self.patron = None
+        self.session = []  # 当前读者本次借出的记录
+
+    def scan(self, code):
+        """处理一次扫码，返回 {"kind": patron/loan/end/error, "message", "record", "elapsed_ms"}"""
+        start = time.perf_counter()
+        result = self.handle(code.strip())
+        result.setdefault("record", None)
+        result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    def handle(self, code):
+        if not code:
+            return self.finish()
+        if self.patron is None:
+            if code not in self.users:
+                return {"kind": "error", "message": f"请先扫描读者证：未找到读者 {code}"}
+            return self.start(code)
+        self.store.sync()  # 先接收其他终端的借还，副本状态以最新记录为准
+        resolved = self.resolve_book(code)
+        if resolved is None:
+            if code in self.users:
+                return self.start(code)
+            return {"kind": "error", "message": f"未找到条码 {code} 对应的图书或读者"}
+        book_id, barcode, error = resolved
+        if error:
+            return {"kind": "error", "message": error}
+        return self.checkout(book_id, barcode)
+
+    def start(self, username):
+        previous = self.finish() if self.patron is not None else None
+        self.patron = username
+        message = f"读者: {username}"
+        if previous and previous["count"]:
+            message = f"{previous['message']}；{message}"
+        return {"kind": "patron", "message": message}
+
+    def finish(self):
+        """结束当前读者的借阅，返回本次借出的数量"""
+        count = len(self.session)
+        message = f"{self.patron} 本次借出 {count} 本" if self.patron else "未开始借阅"
+        self.patron, self.session = None, []
+        return {"kind": "end", "message": message, "count": count}
+
+    def resolve_book(self, code):
+        """条码 -> (图书编号, 可借副本条码, 错误信息)；不是图书返回None
+
+        依次按副本条码、图书编号（多副本时自动选择可借副本）和ISBN解析。
+        """
+        holdings = self.holdings
+        if code in holdings.copy_title:
+            book_id = holdings.copy_title[code]
+            if not holdings.is_lendable(code):
+                return book_id, code, f"《{self.titles.get(book_id, book_id)}》副本 {code} 已借出或不可借"
+            return book_id, code, None
+        if code in holdings.copies:
+            candidates = [code]
+        elif is_valid_isbn(code):
+            candidates = [book["id"] for book in self.isbn_index.lookup(code)]
+            if not candidates:
+                return None
+        else:
+            return None
+        for book_id in candidates:
+            barcode = holdings.pick_copy(book_id)
+            if barcode is not None:
+                return book_id, barcode, None
+        return candidates[0], None, f"《{self.titles.get(candidates[0], candidates[0])}》当前没有可借的副本"
+
+    def checkout(self, book_id, barcode):
+        # 已为其他预约读者保留的副本不能借出（仍有其他可借副本时不受影响）
+        reserved_for = self.holds.reserved_for(book_id)
+        if self.patron not in reserved_for and self.holdings.available_count(book_id) <= len(reserved_for):
+            return {"kind": "error", "message": f"该书已为预约读者 {'、'.join(reserved_for)} 保留"}
+        now = datetime.datetime.now()
+        record = {
+            "borrower": self.patron,
+            "book_id": barcode,
+            "book_title": self.titles.get(book_id, ""),
+            "borrow_time": now.strftime(TIME_FORMAT),
+            "due_time": (now + datetime.timedelta(days=LOAN_DAYS)).strftime(TIME_FORMAT),
+            "actual_return_time": "",
+        }
+        if self.store.lend(record) is None:
+            # 其他终端在本次扫码前刚借出了这个副本
+            return {"kind": "error", "message": f"《{record['book_title']}》副本 {barcode} 已被其他终端借出，请重新扫码"}
+        if self.patron in reserved_for:
+            self.holds.fulfil(book_id, self.patron)
+        self.session.append(record)
+        return {"kind": "loan", "message": f"已借出《{record['book_title']}》 {barcode}，应还 {record['due_time'][:10]}",
+                "record": record}
+
+
+def generate_data(data_dir, books, users, records, seed=0):
+    """生成基准测试用的图书、用户和历史借阅记录（全部已归还）"""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    book_rows = [{"id": f"B{i:07d}", "title": f"测试图书{i}", "author": f"作者{i % 997}", "isbn": "",
+                  "publisher": "测试出版社", "location": "一楼", "category": "测试"} for i in range(books)]
+    user_rows = [{"username": f"U{i:06d}", "password": "", "role": "user"} for i in range(users)]
+    with open(os.path.join(data_dir, "books.json"), 'w', encoding='utf-8') as f:
+        json.dump(book_rows, f, ensure_ascii=False)
+    with open(os.path.join(data_dir, "users.json"), 'w', encoding='utf-8') as f:
+        json.dump(user_rows, f, ensure_ascii=False)
+    base = datetime.datetime(2020, 1, 1)
+    with open(os.path.join(data_dir, "borrow_records.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(data_utils.RECORD_FIELDNAMES)
+        for i in range(records):
+            borrow = base + datetime.timedelta(seconds=i * 60)
+            book = book_rows[rng.randrange(books)]
+            writer.writerow([user_rows[rng.randrange(users)]["username"], book["id"], book["title"],
+                             borrow.strftime(TIME_FORMAT), (borrow + datetime.timedelta(days=LOAN_DAYS)).strftime(TIME_FORMAT),
+                             (borrow + datetime.timedelta(days=7)).strftime(TIME_FORMAT)])
+    return book_rows, user_rows
+
+
+def benchmark(books=50000, users=5000, records=200000, scans=2000, per_patron=5, seed=0):
+    """在临时目录中生成数据并连续扫码借书，返回启动耗时和每次扫码耗时的分位数
+
+    当前进程的数据目录会切换到临时目录，只应在独立进程（命令行）中调用。
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="scan_bench_") as base_dir:
+        data_utils.set_data_dir(base_dir)
+        started = time.perf_counter()
+        book_rows, user_rows = generate_data(data_utils.DATA_DIR, books, users, records, seed)
+        generated = time.perf_counter() - started
+
+        started = time.perf_counter()
+        checkout = ScanCheckout()
+        startup = time.perf_counter() - started
+
+        codes = [book["id"] for book in rng.sample(book_rows, min(books, scans))]
+        timings = []
+        loans = errors = 0
+        started = time.perf_counter()
+        for i, code in enumerate(codes):
+            if i % per_patron == 0:
+                timings.append(checkout.scan(rng.choice(user_rows)["username"])["elapsed_ms"])
+            result = checkout.scan(code)
+            timings.append(result["elapsed_ms"])
+            loans += result["kind"] == "loan"
+            errors += result["kind"] == "error"
+        total = time.perf_counter() - started
+        get_record_store().close_map()
+
+    timings.sort()
+    return {
+        "books": books, "users": users, "records": records,
+        "generate_s": generated, "startup_s": startup,
+        "scans": len(timings), "loans": loans, "errors": errors,
+        "throughput": len(timings) / total if total else 0.0,
+        "p50_ms": percentile(timings, 50), "p95_ms": percentile(timings, 95),
+        "p99_ms": percentile(timings, 99), "max_ms": timings[-1] if timings else 0.0,
+    }
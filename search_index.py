@@ -0,0 +1,175 @@
+# search_index.py
+import re
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 未安装pypinyin时只支持原文匹配和模糊匹配
+    lazy_pinyin = None
+
+
+def pinyin_keys(text):
+    """返回(全拼, 首字母)，如“刘慈欣” -> ("liucixin", "lcx")；未安装pypinyin时返回空"""
+    if lazy_pinyin is None or not text:
+        return "", ""
+    syllables = [s.lower() for s in lazy_pinyin(text) if s.strip()]
+    return "".join(syllables).replace(" ", ""), "".join(s[0] for s in syllables)
+
+
+def fuzzy_option():
+    """检索框旁“拼音/模糊”选项的(文字, 提示)；未安装pypinyin时注明拼音检索不可用"""
+    if lazy_pinyin is None:
+        return "模糊", "未安装pypinyin（pip install pypinyin），拼音检索不可用；仍支持错别字容错搜索"
+    return "拼音/模糊", "支持拼音全拼、首字母及错别字容错搜索"
+
+
+def search_keys(book):
+    """图书的全部检索键：书名、作者、ISBN原文及书名、作者的全拼和首字母"""
+    keys = [book.get("title", "").lower(), book.get("author", "").lower(), book.get("isbn", "").lower()]
+    for field in ("title", "author"):
+        keys.extend(pinyin_keys(book.get(field, "")))
+    return tuple(k for k in keys if k)
+
+
+def fuzzy_tokens(keys):
+    """参与模糊匹配的词：完整检索键及按空白/标点拆分出的单词"""
+    tokens = set(keys)
+    for key in keys:
+        tokens.update(t for t in re.split(r'[\s\-_,.:;，。：；、·]+', key) if t)
+    return tokens
+
+
+def edit_distance(a, b, limit):
+    """有界Levenshtein编辑距离，超过limit时提前返回limit+1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def padded_bigrams(word):
+    """加首尾标记后的二元片段，每次编辑最多破坏其中两个"""
+    word = "\x02" + word + "\x03"
+    return {word[i:i + 2] for i in range(len(word) - 1)}
+
+
+def max_edit_distance(query):
+    """按查询长度确定允许的编辑距离，过短的查询不做模糊匹配"""
+    if len(query) <= 2:
+        return 0
+    return 1 if len(query) <= 4 else 2
+
+
+class SearchIndex:
+    """拼音/模糊检索索引
+
+    建索引时为书名、作者预先计算全拼和首字母键，子串匹配通过一元/二元字符片段的
+    倒排表取候选后再校验。模糊匹配先按片段计数过滤（编辑距离不超过k的词至少共享
+    查询串 片段数-2k 个二元片段）得到候选词，再做有界编辑距离校验。增删改均为增量更新。
+    """
+
+    def __init__(self, books=()):
+        self.slots = {}  # 图书编号 -> 序号
+        self.ids = []  # 序号 -> 图书编号（已删除为None）
+        self.keys = []  # 序号 -> 检索键
+        self.grams = {}  # 字符片段 -> {序号}
+        self.tokens = {}  # 模糊匹配词 -> {序号}
+        self.token_grams = {}  # 二元片段 -> {模糊匹配词}
+        for book in books:
+            self.add(book)
+
+    @staticmethod
+    def grams_of(keys):
+        grams = set()
+        for key in keys:
+            grams.update(key)
+            grams.update(key[i:i + 2] for i in range(len(key) - 1))
+        return grams
+
+    def add(self, book):
+        """加入或更新一本图书"""
+        book_id = book.get("id", "")
+        if book_id in self.slots:
+            self.remove(book_id)
+        slot = len(self.ids)
+        keys = search_keys(book)
+        self.slots[book_id] = slot
+        self.ids.append(book_id)
+        self.keys.append(keys)
+        for gram in self.grams_of(keys):
+            self.grams.setdefault(gram, set()).add(slot)
+        for token in fuzzy_tokens(keys):
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                for gram in padded_bigrams(token):
+                    self.token_grams.setdefault(gram, set()).add(token)
+            self.tokens[token].add(slot)
+
+    def remove(self, book_id):
+        slot = self.slots.pop(book_id, None)
+        if slot is None:
+            return
+        keys = self.keys[slot]
+        for gram in self.grams_of(keys):
+            self.grams[gram].discard(slot)
+        for token in fuzzy_tokens(keys):
+            slots = self.tokens[token]
+            slots.discard(slot)
+            if not slots:
+                del self.tokens[token]
+                for gram in padded_bigrams(token):
+                    self.token_grams[gram].discard(token)
+        self.ids[slot] = None
+        self.keys[slot] = ()
+
+    def substring_slots(self, query):
+        """子串匹配：用查询串的字符片段倒排表求交得到候选，再逐个校验"""
+        grams = {query} if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+        postings = sorted((self.grams.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return sorted(slot for slot in candidates if any(query in key for key in self.keys[slot]))
+
+    def search(self, query, fuzzy=True):
+        """检索图书编号：先返回子串命中（含拼音、首字母），再按编辑距离返回模糊命中"""
+        query = query.lower().strip()
+        if not query:
+            return []
+        hits = self.substring_slots(query)
+        result = [self.ids[slot] for slot in hits]
+        max_dist = max_edit_distance(query)
+        if fuzzy and max_dist:
+            seen = set(hits)
+            fuzzy_hits = []
+            for dist, token in self.similar_tokens(query, max_dist):
+                for slot in self.tokens[token]:
+                    if slot not in seen:
+                        seen.add(slot)
+                        fuzzy_hits.append((dist, slot))
+            result.extend(self.ids[slot] for _, slot in sorted(fuzzy_hits))
+        return result
+
+    def similar_tokens(self, query, max_dist):
+        """返回[(距离, 词)]：先按共享片段数过滤候选词，再校验有界编辑距离"""
+        grams = padded_bigrams(query)
+        shared = {}
+        for gram in grams:
+            for token in self.token_grams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        threshold = max(1, len(grams) - 2 * max_dist)
+        result = []
+        for token, count in shared.items():
+            if count >= threshold:
+                dist = edit_distance(query, token, max_dist)
+                if dist <= max_dist:
+                    result.append((dist, token))
+        return result
@@ -0,0 +1,116 @@
+# sort_index.py
+from bisect import bisect_left, insort
+from search_index import lazy_pinyin
+
+# 可见行少于全部条目的 1/SUBSET_RATIO 时，直接按预计算的排序键排序可见行，不扫描整列
+SUBSET_RATIO = 16
+
+
+def collation_key(text):
+    """文本排序键：中文按拼音排序，同音时再按原文区分
+
+    未安装pypinyin时按GBK编码排序，常用汉字（一级字库）在GBK中即按拼音排列。
+    """
+    text = text or ""
+    if lazy_pinyin is None:
+        return text.lower().encode("gbk", errors="replace")
+    return (" ".join(lazy_pinyin(text)).lower() + "\x00" + text).encode("utf-8")
+
+
+class SortState:
+    """表格当前的排序列和方向：点击新列按升序排序，再次点击同一列切换升降序"""
+
+    def __init__(self, column=None, descending=False):
+        self.column = column
+        self.descending = descending
+
+    def click(self, column):
+        if column == self.column:
+            self.descending = not self.descending
+        else:
+            self.column, self.descending = column, False
+
+
+class SortIndex:
+    """按列维护的有序索引
+
+    每列保存按 (排序键, 主键) 排好序的数组，排序键（含中文的拼音排序键）在条目加入时
+    计算一次。增删改用二分查找定位后插入/删除，不重新排序；切换排序列只是按该列的
+    数组顺序输出，是一次线性遍历。live_columns 中的列依赖外部状态（如预约人数），
+    不建索引，排序时现取现排。
+    """
+
+    def __init__(self, columns, key_of, items=(), live_columns=()):
+        self.columns = columns  # 列号 -> 排序键函数(条目)
+        self.key_of = key_of  # 条目 -> 主键
+        self.live_columns = set(live_columns)
+        self.items = {}  # 主键 -> 条目
+        self.keys = {}  # 主键 -> 各列排序键
+        self.sorted = []  # 列号 -> [(排序键, 主键), ...]
+        self.rebuild(items)
+
+    def sort_keys(self, item):
+        return tuple(None if col in self.live_columns else key(item) for col, key in enumerate(self.columns))
+
+    def rebuild(self, items):
+        self.items = {self.key_of(item): item for item in items}
+        self.keys = {item_id: self.sort_keys(item) for item_id, item in self.items.items()}
+        self.sorted = [[] if col in self.live_columns else
+                       sorted((keys[col], item_id) for item_id, keys in self.keys.items())
+                       for col in range(len(self.columns))]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def add(self, item):
+        """加入或更新一个条目，每列 O(log n) 定位"""
+        item_id = self.key_of(item)
+        self.remove(item_id)
+        keys = self.sort_keys(item)
+        self.items[item_id] = item
+        self.keys[item_id] = keys
+        for col, key in enumerate(keys):
+            if col not in self.live_columns:
+                insort(self.sorted[col], (key, item_id))
+
+    def remove(self, item_id):
+        keys = self.keys.pop(item_id, None)
+        if keys is None:
+            return
+        del self.items[item_id]
+        for col, key in enumerate(keys):
+            if col not in self.live_columns:
+                entries = self.sorted[col]
+                del entries[bisect_left(entries, (key, item_id))]
+
+    def refresh(self, item_id):
+        """条目依赖的外部状态（如可借数量）变化后重新计算排序键"""
+        item = self.items.get(item_id)
+        if item is not None:
+            self.add(item)
+
+    def ordered(self, column, descending=False, visible=None):
+        """按某列排序的条目列表；visible 为可见条目的主键集合，None 表示全部"""
+        if column in self.live_columns:
+            items = self.items.values() if visible is None else (self.items[i] for i in visible if i in self.items)
+            return sorted(items, key=self.columns[column], reverse=descending)
+        entries = self.sorted[column]
+        if visible is None:
+            ids = [item_id for _, item_id in entries]
+        elif len(visible) * SUBSET_RATIO < len(entries):
+            ids = sorted((i for i in visible if i in self.keys), key=lambda i: (self.keys[i][column], i))
+        else:
+            ids = [item_id for _, item_id in entries if item_id in visible]
+        if descending:
+            ids.reverse()
+        return [self.items[item_id] for item_id in ids]
+
+    def range(self, column, low, high):
+        """排序键在 [low, high) 内的条目，按该列升序；两次二分查找定位，耗时 O(log n + k)"""
+        entries = self.sorted[column]
+        start = bisect_left(entries, (low,))
+        end = bisect_left(entries, (high,), start)
+        return [self.items[item_id] for _, item_id in entries[start:end]]
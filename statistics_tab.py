@@ -0,0 +1,72 @@
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QGroupBox)
+import datetime
+import heapq
+from circulation_stats import get_circulation_stats
+
+RECENT_DAYS = 30
+
+
+class StatisticsTab(QWidget):
+    def __init__(self, user):
+        super().__init__()
+        self.user = user
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        # 汇总指标
+        summary_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        self.refresh_btn = QPushButton("刷新")
+        self.refresh_btn.clicked.connect(self.load_stats)
+        summary_layout.addWidget(self.summary_label)
+        summary_layout.addStretch()
+        summary_layout.addWidget(self.refresh_btn)
+        layout.addLayout(summary_layout)
+
+        tables_layout = QHBoxLayout()
+        self.top_table = self.create_table(tables_layout, "借阅排行", ["图书编号", "书名", "借阅次数"])
+        self.category_table = self.create_table(tables_layout, "分类借阅", ["分类", "借阅次数"])
+        self.borrower_table = self.create_table(tables_layout, "借阅人排行", ["借阅人", "借阅次数"])
+        self.day_table = self.create_table(tables_layout, f"近{RECENT_DAYS}天借阅", ["日期", "借阅次数"])
+        layout.addLayout(tables_layout)
+
+        self.setLayout(layout)
+
+    def create_table(self, parent_layout, title, headers):
+        group = QGroupBox(title)
+        group_layout = QVBoxLayout()
+        table = QTableWidget()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        group_layout.addWidget(table)
+        group.setLayout(group_layout)
+        parent_layout.addWidget(group)
+        return table
+
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                table.setItem(row, col, QTableWidgetItem(str(value)))
+
+    def load_stats(self):
+        """读取物化的统计结果"""
+        stats = get_circulation_stats()
+        summary = stats.summary()
+        self.summary_label.setText(
+            f"累计借阅: {summary['total_loans']} 次    当前在借: {summary['open_loans']} 本    "
+            f"已归还: {summary['returned_loans']} 次    平均借阅时长: {summary['average_loan_days']:.1f} 天    "
+            f"涉及图书: {summary['books']} 本    借阅人: {summary['borrowers']} 位")
+
+        self.fill_table(self.top_table, stats.top_books())
+        self.fill_table(self.category_table,
+                        sorted(((c or "未分类", n) for c, n in stats.per_category.items()), key=lambda r: -r[1]))
+        self.fill_table(self.borrower_table,
+                        heapq.nlargest(20, stats.per_borrower.items(), key=lambda r: r[1]))
+        today = datetime.date.today()
+        days = [(today - datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(RECENT_DAYS)]
+        self.fill_table(self.day_table, [(day, stats.per_day.get(day, 0)) for day in days])
@@ -0,0 +1,23 @@
+# conftest.py
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """把数据目录切换到临时目录，测试结束后恢复"""
+    for name in ("DATA_DIR", "BOOKS_FILE", "USERS_FILE", "BORROW_RECORDS_FILE", "HOLDS_FILE", "BACKUP_DIR"):
+        monkeypatch.setattr(data_utils, name, getattr(data_utils, name))
+    data_utils.set_data_dir(str(tmp_path))
+    os.makedirs(data_utils.DATA_DIR)
+    return tmp_path
+
+
+def make_record(book_id, borrow_time, borrower="reader", due_time="2026-02-01 10:00:00", actual_return_time=""):
+    return {"borrower": borrower, "book_id": book_id, "book_title": f"图书{book_id}", "borrow_time": borrow_time,
+            "due_time": due_time, "actual_return_time": actual_return_time}
@@ -0,0 +1,56 @@
+# test_file_lock.py
+import os
+import sys
+import signal
+import subprocess
+import threading
+import pytest
+from data_utils import file_lock
+
+HOLDER = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from data_utils import file_lock
+with file_lock(sys.argv[2]):
+    print("locked", flush=True)
+    time.sleep(60)
+"""
+
+
+def test_long_holder_is_not_taken_over(tmp_path):
+    path = str(tmp_path / "data.json")
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with file_lock(path):
+            acquired.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    acquired.wait(5)
+    os.utime(path + ".lock", (0, 0))  # 锁文件看起来很旧也不会被接管
+    with pytest.raises(TimeoutError):
+        with file_lock(path, timeout=0.2):
+            pass
+    release.set()
+    holder.join()
+    with file_lock(path, timeout=1):
+        pass
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="需要 SIGKILL")
+def test_lock_released_when_holder_dies(tmp_path):
+    path = str(tmp_path / "data.json")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "-c", HOLDER, root, path], stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout.readline().strip() == "locked"
+        with pytest.raises(TimeoutError):
+            with file_lock(path, timeout=0.2):
+                pass
+    finally:
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+    with file_lock(path, timeout=1):
+        pass
@@ -0,0 +1,67 @@
+# test_hold_queue.py
+import json
+import datetime
+import pytest
+from hold_queue import HoldQueue, HOLD_PICKUP_DAYS
+
+NOW = datetime.datetime(2026, 1, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def holds(tmp_path):
+    holds = HoldQueue(str(tmp_path / "holds.json"))
+    for borrower in ("alice", "bob", "carol"):
+        holds.place("B1", borrower, NOW)
+    return holds
+
+
+def test_each_returned_copy_assigns_next_patron(holds):
+    assert holds.on_return("B1", NOW, available=1)["borrower"] == "alice"
+    assert holds.on_return("B1", NOW, available=2)["borrower"] == "bob"
+    assert holds.reserved_for("B1") == ["alice", "bob"]
+    assert holds.position("B1", "bob") == 0
+    assert holds.position("B1", "carol") == 1
+
+
+def test_ready_holds_limited_to_free_copies(holds):
+    holds.on_return("B1", NOW, available=1)
+    assert holds.on_return("B1", NOW, available=1) is None
+    assert holds.reserved_for("B1") == ["alice"]
+    assert holds.queue_length("B1") == 2
+
+
+def test_fulfil_and_cancel(holds):
+    holds.on_return("B1", NOW, available=1)
+    holds.on_return("B1", NOW, available=2)
+    assert holds.fulfil("B1", "bob")
+    assert not holds.fulfil("B1", "carol")
+    assert holds.cancel("B1", "alice", NOW)["borrower"] == "carol"
+    assert holds.reserved_for("B1") == ["carol"]
+    assert holds.queue_length("B1") == 0
+
+
+def test_expire_moves_to_next_patron(holds):
+    holds.on_return("B1", NOW, available=1)
+    holds.on_return("B1", NOW, available=2)
+    later = NOW + datetime.timedelta(days=HOLD_PICKUP_DAYS, seconds=1)
+    expired = holds.expire(later)
+    assert [(hold["borrower"], assigned and assigned["borrower"]) for _, hold, assigned in expired] == \
+        [("alice", "carol"), ("bob", None)]
+    assert holds.reserved_for("B1") == ["carol"]
+    assert holds.expire(later) == []
+
+
+def test_changes_are_shared_through_file(holds):
+    holds.on_return("B1", NOW, available=1)
+    other = HoldQueue(holds.file_path)
+    assert other.reserved_for("B1") == ["alice"]
+
+
+def test_reads_single_ready_hold_format(tmp_path):
+    path = tmp_path / "holds.json"
+    hold = {"borrower": "alice", "placed_time": "2026-01-01 09:00:00", "ready_time": "2026-01-01 10:00:00",
+            "expire_time": "2026-01-04 10:00:00"}
+    path.write_text(json.dumps({"queues": {}, "ready": {"B1": hold}}), encoding='utf-8')
+    holds = HoldQueue(str(path))
+    assert holds.reserved_for("B1") == ["alice"]
+    assert holds.fulfil("B1", "alice")
@@ -0,0 +1,63 @@
+# test_reconcile.py
+import csv
+import data_utils
+from record_store import RecordStore
+from reconcile import reconcile_records, resolve
+from conftest import make_record
+
+BORROW = "2026-01-01 10:00:00"
+
+
+def test_resolve_borrower_mismatch_is_conflict():
+    outcome, reason = resolve(make_record("B1", BORROW, borrower="alice"), make_record("B1", BORROW, borrower="bob"))
+    assert outcome == "conflict" and "alice" in reason
+
+
+def test_resolve_return_times():
+    returned = make_record("B1", BORROW, actual_return_time="2026-01-05 10:00:00")
+    assert resolve(returned, dict(returned)) == ("unchanged", None)
+    assert resolve(returned, make_record("B1", BORROW))[0] == "stale"
+    assert resolve(returned, make_record("B1", BORROW, actual_return_time="2026-01-06 10:00:00"))[0] == "conflict"
+
+
+def test_resolve_incoming_return_carries_renewal():
+    current = make_record("B1", BORROW)
+    incoming = make_record("B1", BORROW, due_time="2026-02-16 10:00:00", actual_return_time="2026-02-10 10:00:00")
+    assert resolve(current, incoming) == ("update", {"actual_return_time": "2026-02-10 10:00:00",
+                                                     "due_time": "2026-02-16 10:00:00"})
+
+
+def test_resolve_due_times_of_open_loans():
+    current = make_record("B1", BORROW)
+    assert resolve(current, make_record("B1", BORROW, due_time="2026-02-16 10:00:00")) == \
+        ("update", {"due_time": "2026-02-16 10:00:00"})
+    assert resolve(current, make_record("B1", BORROW, due_time="2026-01-20 10:00:00")) == ("stale", None)
+    assert resolve(current, dict(current)) == ("unchanged", None)
+
+
+def test_reconcile_records(data_dir, tmp_path):
+    store = RecordStore(data_utils.BORROW_RECORDS_FILE)
+    store.append_many([make_record("B1", BORROW), make_record("B2", BORROW, borrower="alice")])
+    incoming = [
+        make_record("B1", BORROW, actual_return_time="2026-01-03 10:00:00"),
+        make_record("B1", BORROW),  # 同一笔借阅的旧版本，合并掉
+        make_record("B2", BORROW, borrower="bob"),
+        make_record("B3", BORROW),
+        make_record("", BORROW),
+    ]
+    path = tmp_path / "import.csv"
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=data_utils.RECORD_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(incoming)
+
+    preview = reconcile_records(str(path), store=store, apply=False, run_size=2)
+    assert len(store) == 2
+    summary = reconcile_records(str(path), store=store, run_size=2)
+    for result in (preview, summary):
+        assert (result["inserted"], result["updated"], result["duplicates"], result["invalid"],
+                result["conflicts"]) == (1, 1, 1, 1, 1)
+    assert store.get("B1", BORROW)["actual_return_time"] == "2026-01-03 10:00:00"
+    assert store.get("B2", BORROW)["borrower"] == "alice"
+    assert store.get("B3", BORROW) is not None
+    store.close_map()
@@ -0,0 +1,63 @@
+# test_record_listeners.py
+import json
+import datetime
+import data_utils
+from record_store import RecordStore
+from holdings import Holdings
+from circulation_stats import CirculationStats
+from due_scheduler import DueScheduler
+from conftest import make_record
+
+BORROW = "2026-01-01 10:00:00"
+DUE = "2026-01-31 10:00:00"
+RETURN = "2026-01-05 10:00:00"
+BOOKS = [{"id": "B1", "title": "图书B1", "author": "", "category": "小说",
+          "copies": [{"barcode": "B1-1", "status": "正常"}, {"barcode": "B1-2", "status": "正常"}]}]
+
+
+def make_listeners(data_dir):
+    with open(data_utils.BOOKS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(BOOKS, f, ensure_ascii=False)
+    store = RecordStore(data_utils.BORROW_RECORDS_FILE)
+    # 空的记录存储为假值，各组件会改用全局实例，先写入一条无关的已归还记录
+    store.append(make_record("X1", "2025-12-01 10:00:00", actual_return_time="2025-12-02 10:00:00"))
+    holdings = Holdings(store, BOOKS)
+    stats = CirculationStats(store, str(data_dir / "stats.json"), data_utils.BOOKS_FILE)
+    scheduler = DueScheduler(store, sinks=[], state_path=str(data_dir / "notify_state.json"))
+    return store, holdings, stats, scheduler
+
+
+def test_return_then_reopen(data_dir):
+    store, holdings, stats, scheduler = make_listeners(data_dir)
+    store.append(make_record("B1-1", BORROW, due_time=DUE))
+    assert holdings.available_count("B1") == 1
+
+    store.update("B1-1", BORROW, actual_return_time=RETURN)
+    assert holdings.available_count("B1") == 2
+    assert (stats.open_loans, stats.returned_loans) == (0, 2)
+    assert ("B1-1", BORROW) not in scheduler.loans
+
+    store.update("B1-1", BORROW, actual_return_time="")
+    assert holdings.available_count("B1") == 1
+    assert holdings.pick_copy("B1") == "B1-2"
+    assert (stats.open_loans, stats.returned_loans, stats.total_loan_seconds) == (1, 1, 86400)
+    assert scheduler.loans[("B1-1", BORROW)] == DUE
+
+
+def test_reopened_loan_reminded_once(data_dir):
+    store, holdings, stats, scheduler = make_listeners(data_dir)
+    scheduler.save_last_checked(BORROW)
+    store.append(make_record("B1-1", BORROW, due_time=DUE))
+    store.update("B1-1", BORROW, actual_return_time=RETURN)
+    store.update("B1-1", BORROW, actual_return_time="")
+    fired = scheduler.poll(datetime.datetime(2026, 2, 1))
+    assert [event["kind"] for event in fired] == ["due_soon", "overdue"]
+
+
+def test_changed_return_time_adjusts_average(data_dir):
+    store, holdings, stats, scheduler = make_listeners(data_dir)
+    store.append(make_record("B1-1", BORROW, due_time=DUE))
+    store.update("B1-1", BORROW, actual_return_time=RETURN)
+    store.update("B1-1", BORROW, actual_return_time="2026-01-03 10:00:00")
+    assert (stats.open_loans, stats.returned_loans) == (0, 2)
+    assert stats.total_loan_seconds == 3 * 86400
@@ -0,0 +1,103 @@
+# test_record_store.py
+import os
+import pytest
+import data_utils
+from record_store import RecordStore
+from conftest import make_record
+
+
+@pytest.fixture
+def store(data_dir):
+    store = RecordStore(data_utils.BORROW_RECORDS_FILE)
+    yield store
+    store.close_map()
+
+
+def record_events(store):
+    events = []
+    store.subscribe(lambda event, record, old: events.append((event, record and record["book_id"])))
+    return events
+
+
+def test_append_and_get(store):
+    store.append(make_record("B1", "2026-01-01 10:00:00", borrower="alice"))
+    store.append_many([make_record("B2", "2026-01-02 10:00:00", borrower="alice"),
+                       make_record("B3", "2026-01-03 10:00:00", borrower="bob")])
+    assert len(store) == 3
+    assert store.get("B2", "2026-01-02 10:00:00")["borrower"] == "alice"
+    assert store.get("B9", "2026-01-02 10:00:00") is None
+    assert [r["book_id"] for r in store.records_for_borrower("alice")] == ["B1", "B2"]
+    assert store.patron_summary("alice")["current_loans"] == 2
+
+
+def test_update_shifts_later_records(store):
+    store.append_many([make_record(f"B{i}", f"2026-01-0{i} 10:00:00") for i in range(1, 4)])
+    store.update("B1", "2026-01-01 10:00:00", actual_return_time="2026-01-05 09:30:00")
+    store.update("B2", "2026-01-02 10:00:00", due_time="2026-02-16 10:00:00")
+    assert store.get("B1", "2026-01-01 10:00:00")["actual_return_time"] == "2026-01-05 09:30:00"
+    assert store.get("B2", "2026-01-02 10:00:00")["due_time"] == "2026-02-16 10:00:00"
+    assert store.get("B3", "2026-01-03 10:00:00")["book_id"] == "B3"
+    assert [r["book_id"] for r in store.open_records()] == ["B2", "B3"]
+    with open(store.file_path, 'r', encoding='utf-8') as f:
+        assert f.read().count("\n") == 4
+
+
+def test_update_many(store):
+    store.append_many([make_record(f"B{i}", f"2026-01-0{i} 10:00:00") for i in range(1, 4)])
+    store.update_many({("B1", "2026-01-01 10:00:00"): {"actual_return_time": "2026-01-04 10:00:00"},
+                       ("B3", "2026-01-03 10:00:00"): {"due_time": "2026-03-01 10:00:00"}})
+    assert store.get("B1", "2026-01-01 10:00:00")["actual_return_time"] == "2026-01-04 10:00:00"
+    assert store.get("B2", "2026-01-02 10:00:00")["actual_return_time"] == ""
+    assert store.get("B3", "2026-01-03 10:00:00")["due_time"] == "2026-03-01 10:00:00"
+
+
+def test_sync_replays_other_store_changes(store):
+    store.append(make_record("B1", "2026-01-01 10:00:00"))
+    other = RecordStore(store.file_path)
+    events = record_events(store)
+    other.append(make_record("B2", "2026-01-02 10:00:00"))
+    other.update("B1", "2026-01-01 10:00:00", actual_return_time="2026-01-03 10:00:00")
+    other.close_map()
+    store.sync()
+    assert events == [("append", "B2"), ("update", "B1")]
+    assert store.get("B1", "2026-01-01 10:00:00")["actual_return_time"] == "2026-01-03 10:00:00"
+    assert store.get("B2", "2026-01-02 10:00:00")["borrower"] == "reader"
+    assert store.loaned == {"B2": 1}
+
+
+def test_sync_resets_after_external_rewrite(store):
+    store.append(make_record("B1", "2026-01-01 10:00:00"))
+    events = record_events(store)
+    with open(store.file_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(data_utils.RECORD_FIELDNAMES) + "\n")
+        f.write("someone,B7,图书B7,2026-01-07 10:00:00,2026-02-07 10:00:00,\n")
+    store.sync()
+    assert events == [("reset", None)]
+    assert store.get("B1", "2026-01-01 10:00:00") is None
+    assert store.get("B7", "2026-01-07 10:00:00")["borrower"] == "someone"
+
+
+def test_reopen_from_index_and_journal(store):
+    store.append(make_record("B1", "2026-01-01 10:00:00"))
+    store.close()
+    writer = RecordStore(store.file_path)
+    writer.append(make_record("B2", "2026-01-02 10:00:00"))
+    writer.update("B1", "2026-01-01 10:00:00", actual_return_time="2026-01-02 12:00:00")
+    writer.close_map()
+    reopened = RecordStore(store.file_path)
+    assert os.path.exists(reopened.index_path)
+    assert len(reopened) == 2
+    assert reopened.get("B1", "2026-01-01 10:00:00")["actual_return_time"] == "2026-01-02 12:00:00"
+    reopened.close_map()
+
+
+def test_lend_rejects_copy_on_loan(store):
+    assert store.lend(make_record("B1", "2026-01-01 10:00:00")) is not None
+    other = RecordStore(store.file_path)
+    assert other.lend(make_record("B1", "2026-01-01 11:00:00")) is None
+    other.update("B1", "2026-01-01 10:00:00", actual_return_time="2026-01-01 12:00:00")
+    assert other.lend(make_record("B1", "2026-01-01 10:00:00")) is None  # 主键重复
+    assert other.lend(make_record("B1", "2026-01-01 13:00:00")) is not None
+    other.close_map()
+    assert store.lend(make_record("B1", "2026-01-01 14:00:00")) is None
+    assert len(store) == 2
@@ -0,0 +1,47 @@
+# test_search_index.py
+from search_index import SearchIndex, edit_distance, max_edit_distance
+
+BOOKS = [
+    {"id": "1", "title": "Python Programming", "author": "Guido", "isbn": "9787111111111"},
+    {"id": "2", "title": "Algorithms", "author": "Sedgewick", "isbn": ""},
+    {"id": "3", "title": "三体", "author": "刘慈欣", "isbn": ""},
+]
+
+
+def test_edit_distance_within_limit():
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("python", "python", 1) == 0
+    assert edit_distance("pyhton", "python", 2) == 2
+
+
+def test_edit_distance_stops_past_limit():
+    assert edit_distance("kitten", "sitting", 2) == 3
+    assert edit_distance("a", "abcdef", 2) == 3  # 长度差超过上限直接返回
+    assert edit_distance("abcdef", "uvwxyz", 1) == 2
+
+
+def test_max_edit_distance_by_query_length():
+    assert [max_edit_distance(q) for q in ("ab", "abcd", "abcde")] == [0, 1, 2]
+
+
+def test_substring_before_fuzzy_hits():
+    index = SearchIndex(BOOKS)
+    assert index.search("gram") == ["1"]
+    assert index.search("三体") == ["3"]
+    assert index.search("algoritms") == ["2"]
+    assert index.search("algoritms", fuzzy=False) == []
+    assert index.search("sedgwick") == ["2"]
+
+
+def test_short_queries_are_not_fuzzy():
+    assert SearchIndex(BOOKS).search("zz") == []
+
+
+def test_incremental_update_and_remove():
+    index = SearchIndex(BOOKS)
+    index.add({"id": "2", "title": "Data Structures", "author": "Sedgewick", "isbn": ""})
+    assert index.search("algorithms") == []
+    assert index.search("structures") == ["2"]
+    index.remove("2")
+    assert index.search("sedgewick") == []
+    assert index.search("python") == ["1"]
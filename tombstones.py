@@ -0,0 +1,196 @@
+# tombstones.py
+import os
+import json
+import datetime
+import threading
+from data_utils import file_lock, read_json, write_json
+from change_log import KEY_FIELDS, logged_kind, log_changes, put_entry, delete_entry
+
+TOMBSTONE_SUFFIX = ".deleted.jsonl"  # books.json -> books.deleted.jsonl
+COMPACT_MAX_BYTES = 256 * 1024  # 墓碑日志超过该大小时压缩
+COMPACT_RATIO = 0.2  # 已删除行占数据文件行数的比例达到该值时压缩
+COMPACT_MIN_COUNT = 20  # 按比例压缩时至少积累的删除条数，保证误删后有撤销的机会
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def tombstone_path(file_path):
+    return os.path.splitext(file_path)[0] + TOMBSTONE_SUFFIX
+
+
+def replay_deletes(lines):
+    """按顺序重放墓碑日志的各行，返回 {主键: 删除条目}（已撤销的不含在内）"""
+    deleted = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("op") == "delete":
+            deleted[entry.get("key")] = entry
+        elif entry.get("op") == "undo":
+            deleted.pop(entry.get("key"), None)
+    return deleted
+
+
+class TombstoneLog:
+    """图书/用户的删除墓碑：删除只在墓碑日志末尾追加一行，数据文件不变
+
+    读取数据文件时过滤掉已删除的行，因此删除立即生效；被删除的行在压缩前仍留在
+    数据文件中，可以撤销。墓碑数量或日志大小超过阈值后由后台线程压缩：数据文件
+    去掉已删除的行后原子替换，墓碑日志换成新的空日志。日志首行为带时间的起始标记，
+    其他进程据此发现日志已被压缩替换。数据文件和墓碑日志的写入共用数据文件的写锁。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = os.path.abspath(file_path)
+        self.path = tombstone_path(self.file_path)
+        self.kind = logged_kind(self.file_path)
+        self.key_field = KEY_FIELDS[self.kind]
+        self.deleted = {}  # 主键 -> 删除条目 {"key", "row", "ts", "actor"}
+        self.header = b""
+        self.offset = 0
+        self.row_count = 0  # 最近一次读取时数据文件的行数（含已删除的），用于计算压缩比例
+        self.lock = threading.Lock()
+        self.compact_thread = None
+
+    def refresh(self):
+        """读取墓碑日志新追加的部分，返回新读到的变化 [(操作, 主键, 行)]"""
+        with self.lock:
+            try:
+                f = open(self.path, 'rb')
+            except OSError:
+                self.reset()
+                return []
+            with f:
+                if self.offset and f.read(len(self.header)) != self.header:
+                    self.reset()  # 日志已被压缩替换，从头读取
+                f.seek(self.offset)
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # 其他进程正在写入的半行下次再读
+            changes = []
+            for line in data[:end].splitlines():
+                if not self.header:
+                    self.header = line + b"\n"
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                key = entry.get("key")
+                if entry.get("op") == "delete":
+                    self.deleted[key] = entry
+                    changes.append(("delete", key, entry.get("row")))
+                elif entry.get("op") == "undo" and key in self.deleted:
+                    changes.append(("undo", key, self.deleted.pop(key).get("row")))
+            self.offset += end
+            return changes
+
+    def reset(self):
+        self.deleted = {}
+        self.header = b""
+        self.offset = 0
+
+    def live(self, rows):
+        """过滤掉已删除的行"""
+        self.refresh()
+        self.row_count = len(rows)
+        if not self.deleted:
+            return rows
+        return [row for row in rows if row.get(self.key_field) not in self.deleted]
+
+    def append(self, entries):
+        """追加墓碑日志（调用方持有数据文件的写锁），日志不存在时先写起始标记"""
+        ts = datetime.datetime.now().strftime(TIME_FORMAT)
+        lines = [json.dumps(dict(entry, ts=ts), ensure_ascii=False) + "\n" for entry in entries]
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            lines.insert(0, json.dumps({"op": "start", "ts": ts}) + "\n")
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+
+    def delete(self, rows, actor=""):
+        """标记删除若干行，每行只追加一条墓碑，不读写数据文件"""
+        self.refresh()
+        rows = [row for row in rows if row.get(self.key_field) not in self.deleted]
+        if not rows:
+            return
+        with file_lock(self.file_path):
+            self.append({"op": "delete", "key": row.get(self.key_field), "row": row, "actor": actor} for row in rows)
+        log_changes([delete_entry(self.kind, row.get(self.key_field)) for row in rows])
+        self.refresh()
+        if self.needs_compaction():
+            self.compact_in_background()
+
+    def undelete(self, keys, actor=""):
+        """撤销删除，返回恢复的行；压缩后已从数据文件中移除的无法撤销"""
+        with file_lock(self.file_path):
+            self.refresh()
+            rows = [self.deleted[key]["row"] for key in keys if key in self.deleted]
+            if not rows:
+                return []
+            self.append({"op": "undo", "key": row.get(self.key_field), "actor": actor} for row in rows)
+            self.refresh()
+            # 正常情况下被删除的行仍在数据文件中；压缩中途退出时可能已被移除，按墓碑中的内容补回
+            stored = read_json(self.file_path)
+            present = {row.get(self.key_field) for row in stored}
+            missing = [row for row in rows if row.get(self.key_field) not in present]
+            if missing:
+                write_json(self.file_path, stored + missing)
+        log_changes([put_entry(self.kind, row.get(self.key_field), row) for row in rows])
+        return rows
+
+    def save(self, rows):
+        """整体保存数据文件（调用方持有写锁）：保留尚未压缩的已删除行，调用方重新写入的主键撤销其墓碑"""
+        self.refresh()
+        keys = {row.get(self.key_field) for row in rows}
+        revived = [key for key in self.deleted if key in keys]
+        if revived:
+            self.append({"op": "undo", "key": key} for key in revived)
+            self.refresh()
+        write_json(self.file_path, list(rows) + [entry["row"] for entry in self.deleted.values()])
+
+    def needs_compaction(self):
+        count = len(self.deleted)
+        if not count:
+            return False
+        return self.offset >= COMPACT_MAX_BYTES or (count >= COMPACT_MIN_COUNT and count >= COMPACT_RATIO * self.row_count)
+
+    def compact(self):
+        """从数据文件中移除已删除的行并清空墓碑日志，返回移除的行数"""
+        with file_lock(self.file_path):
+            self.refresh()
+            if not self.deleted:
+                return 0
+            rows = read_json(self.file_path)
+            live = [row for row in rows if row.get(self.key_field) not in self.deleted]
+            # 先替换数据文件再替换日志：中途退出时只会留下多余的墓碑，不会让已删除的行重新出现
+            write_json(self.file_path, live)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"op": "start", "ts": datetime.datetime.now().strftime(TIME_FORMAT)}) + "\n")
+            os.replace(tmp_path, self.path)
+            self.refresh()
+            self.row_count = len(live)
+        return len(rows) - len(live)
+
+    def compact_in_background(self):
+        with self.lock:
+            if self.compact_thread is not None and self.compact_thread.is_alive():
+                return
+            self.compact_thread = threading.Thread(target=self.run_compaction, name=f"compact-{self.kind}", daemon=True)
+            self.compact_thread.start()
+
+    def run_compaction(self):
+        try:
+            self.compact()
+        except OSError:
+            pass  # 压缩失败不影响数据，下次删除时再尝试
+
+
+_tombstones = {}
+
+
+def get_tombstones(file_path):
+    """获取数据文件（图书或用户）在进程内共享的墓碑日志实例"""
+    path = os.path.abspath(file_path)
+    if path not in _tombstones:
+        _tombstones[path] = TombstoneLog(path)
+    return _tombstones[path]
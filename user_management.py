@@ -1,7 +1,12 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
                              QTableWidgetItem, QHeaderView, QPushButton,
                              QMessageBox)
+from PyQt5.QtCore import Qt
 from data_utils import load_json, save_json
+from sort_index import SortIndex, SortState, collation_key
+from audit_log import audit
+from tombstones import get_tombstones
+from recycle_bin import RecycleBinDialog
 
 USERS_FILE = 'data/users.json'
 
@@ -10,6 +15,9 @@ class UserManagementTab(QWidget):
         super().__init__()
         self.handle_current_user_deleted = handle_current_user_deleted
         self.users = []
+        self.sort = SortState()
+        self.sort_index = SortIndex([lambda u: collation_key(u.get("username", "")),
+                                     lambda u: u.get("role", "")], lambda u: u.get("username", ""))
         self.init_ui()
         self.current_user = current_suer
 
@@ -21,6 +29,7 @@ class UserManagementTab(QWidget):
         self.user_table.setColumnCount(2)
         self.user_table.setHorizontalHeaderLabels(["用户名", "角色"])
         self.user_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.user_table.horizontalHeader().sectionClicked.connect(self.sort_users)
         layout.addWidget(self.user_table)
 
         # 操作按钮
@@ -28,6 +37,9 @@ class UserManagementTab(QWidget):
         self.delete_btn = QPushButton("删除选中用户")
         self.delete_btn.clicked.connect(self.delete_user)
         btn_layout.addWidget(self.delete_btn)
+        self.recycle_btn = QPushButton("回收站")
+        self.recycle_btn.clicked.connect(self.show_recycle_bin)
+        btn_layout.addWidget(self.recycle_btn)
         layout.addLayout(btn_layout)
 
         self.setLayout(layout)
@@ -35,15 +47,50 @@ class UserManagementTab(QWidget):
     def load_users(self):
         """加载用户数据"""
         self.users = load_json(USERS_FILE)
+        self.sort_index.rebuild(self.users)
+        self.update_user_table(self.users)
+
+    def sort_users(self, column):
+        """点击表头按该列排序，再次点击切换升降序"""
+        self.sort.click(column)
+        header = self.user_table.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(column, Qt.DescendingOrder if self.sort.descending else Qt.AscendingOrder)
         self.update_user_table(self.users)
 
     def update_user_table(self, users):
-        """更新用户表格"""
+        """更新用户表格，已选择排序列时按该列的有序索引输出"""
+        if self.sort.column is not None:
+            users = self.sort_index.ordered(self.sort.column, self.sort.descending)
         self.user_table.setRowCount(len(users))
         for row, user in enumerate(users):
             self.user_table.setItem(row, 0, QTableWidgetItem(user["username"]))
             self.user_table.setItem(row, 1, QTableWidgetItem(user["role"]))
 
+    def show_recycle_bin(self):
+        """回收站：撤销尚未压缩的用户删除"""
+        dialog = RecycleBinDialog(USERS_FILE, [("用户名", "username"), ("角色", "role")],
+                                  self.current_user["username"], "用户回收站", self)
+        dialog.restored.connect(self.on_users_restored)
+        dialog.exec_()
+
+    def on_users_restored(self, users):
+        for user in users:
+            audit(self.current_user["username"], "undelete_user", user["username"], after=user)
+        self.apply_user_delta(users, [], [])
+
+    def apply_user_delta(self, added, changed, removed):
+        """应用外部修改产生的用户增量"""
+        removed_names = {u.get("username", "") for u in removed}
+        updated = {u.get("username", ""): u for u in added + changed}
+        users = [updated.pop(u["username"], u) for u in self.users if u["username"] not in removed_names]
+        self.users = users + list(updated.values())
+        for username in removed_names:
+            self.sort_index.remove(username)
+        for user in added + changed:
+            self.sort_index.add(user)
+        self.update_user_table(self.users)
+
     def delete_user(self):
         """删除选中用户"""
         selected_rows = set(item.row() for item in self.user_table.selectedItems())
@@ -57,16 +104,19 @@ class UserManagementTab(QWidget):
             return
 
         # 执行删除
-        usernames = [self.users[row]["username"] for row in selected_rows]
+        usernames = {self.user_table.item(row, 0).text() for row in selected_rows}  # 排序后行号与列表下标不一致
         if self.current_user["username"] in usernames:
             if QMessageBox.question(self, "确认删除自身",
                                     "确定要删除当前登录的用户吗？删除后将自动退出登录",
                                     QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
                 return
-        self.users = [u for u in self.users if u["username"] not in usernames]
-        save_json(USERS_FILE, self.users)
-        self.load_users()
-        QMessageBox.information(self, "成功", "用户删除成功")
+        deleted = [u for u in self.users if u["username"] in usernames]
+        # 只追加墓碑，不重写用户文件
+        get_tombstones(USERS_FILE).delete(deleted, self.current_user["username"])
+        for user in deleted:
+            audit(self.current_user["username"], "delete_user", user["username"], before=user)
+        self.apply_user_delta([], [], deleted)
+        QMessageBox.information(self, "成功", "用户删除成功，可在回收站中撤销")
         if self.current_user["username"] in usernames:
             self.handle_current_user_deleted()
         #